@@ -0,0 +1,344 @@
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+# Price / GSR / vault-value threshold alerts (the Elite "alerts" feature).
+#
+#   stats = process_tick(conn, {"gold": g, "silver": s, "gsr": g / s}, source="cron")
+#
+# Rules are edge-triggered: a rule fires when the value crosses its threshold
+# between the previous tick and this one, never while it merely stays past it.
+#
+#   above     prev <= t < new          (t in [prev, new) of the "up" list)
+#   below     new < t <= prev          (t in (new, prev] of the "down" list)
+#   crosses   either of the above
+#
+# Active rules are kept in memory as sorted threshold arrays per metric and
+# direction, so a tick costs two bisects per metric plus the slice of rules
+# that actually fired, however many rules exist. vault_value rules are
+# per user: the user's holdings (fine oz per metal) are valued at the
+# previous and new prices and bisected against that user's own thresholds.
+#
+# The index is rebuilt only when alert_rules changes (count / max id / max
+# updated_at). Fired rules are claimed and written to alert_outbox in one
+# statement; the claim skips rules still inside ALERT_COOLDOWN_SECONDS, so
+# two instances seeing the same tick queue each alert once.
+
+METRICS = ("gold", "silver", "platinum", "gsr", "vault_value")
+OPS = ("above", "below", "crosses")
+PRICE_METALS = ("gold", "silver", "platinum")
+
+GRAMS_PER_TROY_OZ = 31.1034768
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int((os.getenv(name) or "").strip() or default)
+    except Exception:
+        return default
+
+
+COOLDOWN_SECONDS = max(0, _env_int("ALERT_COOLDOWN_SECONDS", 3600))
+MAX_RULES_PER_USER = max(1, _env_int("ALERT_MAX_RULES_PER_USER", 50))
+
+
+def ensure_alert_tables(conn):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        create table if not exists alert_rules (
+          id bigserial primary key,
+          user_id text not null,
+          metric text not null check (metric in ('gold','silver','platinum','gsr','vault_value')),
+          op text not null check (op in ('above','below','crosses')),
+          threshold double precision not null,
+          note text null,
+          active boolean not null default true,
+          last_fired_at timestamptz null,
+          created_at timestamptz not null default now(),
+          updated_at timestamptz not null default now()
+        );
+        """
+    )
+    cur.execute("create index if not exists alert_rules_user_idx on alert_rules (user_id);")
+    cur.execute(
+        """
+        create table if not exists alert_outbox (
+          id bigserial primary key,
+          rule_id bigint not null,
+          user_id text not null,
+          metric text not null,
+          op text not null,
+          threshold double precision not null,
+          prev_value double precision not null,
+          value double precision not null,
+          source text null,
+          fired_at timestamptz not null default now(),
+          delivered_at timestamptz null
+        );
+        """
+    )
+    cur.execute(
+        "create index if not exists alert_outbox_pending_idx on alert_outbox (id) where delivered_at is null;"
+    )
+    cur.execute("create index if not exists alert_outbox_user_idx on alert_outbox (user_id, fired_at desc);")
+    cur.execute(
+        """
+        create table if not exists alert_ticks (
+          metric text primary key,
+          value double precision not null,
+          updated_at timestamptz not null default now()
+        );
+        """
+    )
+    conn.commit()
+
+
+# ----------------------------
+# In-memory index
+# ----------------------------
+def _sorted_side(pairs):
+    pairs.sort()
+    return [t for t, _ in pairs], [i for _, i in pairs]
+
+
+def _crossed(side, prev: float, new: float):
+    """
+    Rule ids in a (thresholds, ids) side crossed by prev -> new; "up" sides
+    are only passed for rising values and "down" sides for falling ones.
+    """
+    ths, ids = side
+    if new > prev:
+        return ids[bisect_left(ths, prev):bisect_left(ths, new)]
+    return ids[bisect_right(ths, new):bisect_right(ths, prev)]
+
+
+class AlertIndex:
+    """
+    rows: (id, user_id, metric, op, threshold) for active rules.
+    """
+
+    def __init__(self, rows):
+        up, down, vault = {}, {}, {}
+        n = 0
+        for rule_id, user_id, metric, op, threshold in rows:
+            if metric not in METRICS or op not in OPS:
+                continue
+            t = float(threshold)
+            if metric == "vault_value":
+                u, d = vault.setdefault(user_id, ([], []))
+            else:
+                u, d = up.setdefault(metric, []), down.setdefault(metric, [])
+            if op != "below":
+                u.append((t, rule_id))
+            if op != "above":
+                d.append((t, rule_id))
+            n += 1
+
+        self.size = n
+        self.up = {m: _sorted_side(p) for m, p in up.items()}
+        self.down = {m: _sorted_side(p) for m, p in down.items()}
+        self.vault = {uid: (_sorted_side(u), _sorted_side(d)) for uid, (u, d) in vault.items()}
+
+    def vault_users(self):
+        return list(self.vault)
+
+    def fired(self, prev: dict, new: dict, holdings: dict = None):
+        """
+        Returns [(rule_id, prev_value, value)] for every rule crossed between
+        the prev and new metric values. holdings: {user_id: {metal: fine_oz}}
+        for vault_value rules; metals missing from a tick keep their prev price.
+        """
+        out = []
+        for metric in self.up.keys() | self.down.keys():
+            p, v = prev.get(metric), new.get(metric)
+            if p is None or v is None or p == v:
+                continue
+            side = self.up.get(metric) if v > p else self.down.get(metric)
+            if side:
+                out.extend((rule_id, p, v) for rule_id in _crossed(side, p, v))
+
+        if self.vault and holdings:
+            p_px = {m: prev.get(m) for m in PRICE_METALS}
+            n_px = {m: new.get(m, p_px[m]) for m in PRICE_METALS}
+            for user_id, (u, d) in self.vault.items():
+                oz = holdings.get(user_id)
+                if not oz:
+                    continue
+                p = v = 0.0
+                for metal, qty in oz.items():
+                    if p_px.get(metal) is None or n_px.get(metal) is None:
+                        p = v = None
+                        break
+                    p += qty * p_px[metal]
+                    v += qty * n_px[metal]
+                if p is None or p == v:
+                    continue
+                out.extend((rule_id, p, v) for rule_id in _crossed(u if v > p else d, p, v))
+        return out
+
+
+_INDEX = {"version": None, "index": None}
+_INDEX_LOCK = threading.Lock()
+
+
+def _rules_version(cur):
+    cur.execute("select count(*), coalesce(max(id), 0), max(updated_at) from alert_rules;")
+    return tuple(cur.fetchone() or ())
+
+
+def load_index(conn) -> AlertIndex:
+    """
+    Cached AlertIndex; reloads the active rules only when alert_rules changed.
+    """
+    cur = conn.cursor()
+    version = _rules_version(cur)
+    idx = _INDEX["index"]
+    if idx is not None and _INDEX["version"] == version:
+        return idx
+    with _INDEX_LOCK:
+        if _INDEX["index"] is not None and _INDEX["version"] == version:
+            return _INDEX["index"]
+        cur.execute("select id, user_id, metric, op, threshold from alert_rules where active;")
+        idx = AlertIndex(cur.fetchall() or [])
+        _INDEX["index"], _INDEX["version"] = idx, version
+    return idx
+
+
+def load_holdings(conn, user_ids) -> dict:
+    """
+    {user_id: {metal: fine troy oz}} from vault_items.
+    """
+    if not user_ids:
+        return {}
+    cur = conn.cursor()
+    cur.execute(
+        """
+        select user_id, metal,
+               sum(case when weight_unit = 'g' then weight_value / %s else weight_value end
+                   * purity * coalesce(qty, 1))
+        from vault_items
+        where user_id = any(%s)
+        group by 1, 2;
+        """,
+        (GRAMS_PER_TROY_OZ, list(user_ids)),
+    )
+    out = {}
+    for user_id, metal, oz in cur.fetchall() or []:
+        out.setdefault(user_id, {})[metal] = float(oz or 0)
+    return out
+
+
+# ----------------------------
+# Tick processing
+# ----------------------------
+def _swap_ticks(cur, new: dict) -> dict:
+    """
+    Stores this tick's values and returns the previous ones. Row locks keep
+    concurrent ticks from both reading the same previous value.
+    """
+    metrics = sorted(new)
+    cur.execute(
+        "select metric, value from alert_ticks where metric = any(%s) for update;",
+        (metrics,),
+    )
+    prev = {m: float(v) for m, v in (cur.fetchall() or [])}
+    cur.execute(
+        """
+        insert into alert_ticks (metric, value, updated_at)
+        select m, v, now() from unnest(%s::text[], %s::float8[]) as t(m, v)
+        on conflict (metric) do update set value = excluded.value, updated_at = excluded.updated_at;
+        """,
+        (metrics, [float(new[m]) for m in metrics]),
+    )
+    # Prices absent from this tick (platinum from the cron) keep their last value
+    cur.execute("select metric, value from alert_ticks where metric <> all(%s);", (metrics,))
+    for m, v in cur.fetchall() or []:
+        prev[m] = float(v)
+        new.setdefault(m, float(v))
+    return prev
+
+
+def enqueue(cur, fired, source: str = None) -> int:
+    """
+    Claims fired rules (active, outside the cooldown) and writes one outbox
+    row each, in a single statement. Returns the number queued.
+    """
+    if not fired:
+        return 0
+    cur.execute(
+        """
+        with fired as (
+          select * from unnest(%s::bigint[], %s::float8[], %s::float8[]) as f(rule_id, prev_value, value)
+        ),
+        claimed as (
+          update alert_rules r set last_fired_at = now()
+          from fired f
+          where r.id = f.rule_id
+            and r.active
+            and (r.last_fired_at is null or r.last_fired_at <= now() - make_interval(secs => %s::float8))
+          returning r.id, r.user_id, r.metric, r.op, r.threshold
+        )
+        insert into alert_outbox (rule_id, user_id, metric, op, threshold, prev_value, value, source)
+        select c.id, c.user_id, c.metric, c.op, c.threshold, f.prev_value, f.value, %s
+        from claimed c join fired f on f.rule_id = c.id;
+        """,
+        (
+            [int(r[0]) for r in fired],
+            [float(r[1]) for r in fired],
+            [float(r[2]) for r in fired],
+            COOLDOWN_SECONDS,
+            source,
+        ),
+    )
+    return max(0, cur.rowcount or 0)
+
+
+def process_tick(conn, prices: dict, source: str = None) -> dict:
+    """
+    Evaluates every active rule against a new price tick and queues the
+    alerts that fired. prices: any of gold / silver / platinum / gsr.
+    Commits its own work.
+    """
+    t0 = time.perf_counter()
+    new = {m: float(v) for m, v in (prices or {}).items() if m in METRICS and v is not None}
+    if not new:
+        return {"rules": 0, "fired": 0, "queued": 0, "eval_ms": 0.0, "ms": 0.0}
+
+    ensure_alert_tables(conn)
+    cur = conn.cursor()
+    try:
+        idx = load_index(conn)
+        prev = _swap_ticks(cur, new)
+        holdings = load_holdings(conn, idx.vault_users()) if idx.vault else None
+        t_eval = time.perf_counter()
+        fired = idx.fired(prev, new, holdings)
+        eval_ms = (time.perf_counter() - t_eval) * 1000.0
+        queued = enqueue(cur, fired, source)
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+
+    return {
+        "rules": idx.size,
+        "fired": len(fired),
+        "queued": queued,
+        "eval_ms": round(eval_ms, 3),
+        "ms": round((time.perf_counter() - t0) * 1000.0, 3),
+    }
+
+
+def on_tick(conn, prices: dict, source: str = None) -> dict:
+    """
+    process_tick() for the quote writers (cron, latest self-heal): a failure
+    is reported in the result and never fails the caller's request.
+    """
+    try:
+        return process_tick(conn, prices, source=source)
+    except Exception as e:
+        return {"error": str(e)}
@@ -0,0 +1,424 @@
+import json
+import os
+import time
+import base64
+import hmac
+import hashlib
+
+# Import fallback to avoid Vercel module-path edge cases
+try:
+    from ._utils import db_connect
+except Exception:
+    from api._utils import db_connect
+
+
+# =============================================================================
+# Step 1 (Stripe tier gating) helpers
+# =============================================================================
+
+# Required env var for signing login tokens (set in Vercel):
+# AUTH_SECRET = long random string
+_AUTH_SECRET = os.getenv("AUTH_SECRET", "").encode("utf-8")
+
+
+def ensure_users_table(conn):
+    """
+    Stores subscription tier entitlements.
+    """
+    cur = conn.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+          email TEXT PRIMARY KEY,
+          stripe_customer_id TEXT,
+          tier TEXT NOT NULL DEFAULT 'free',
+          status TEXT NOT NULL DEFAULT 'inactive',
+          ent_version INTEGER NOT NULL DEFAULT 0,
+          last_event_ts BIGINT NOT NULL DEFAULT 0,
+          updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """
+    )
+    # Older DBs: entitlement version counter (bumped on every upsert)
+    cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS ent_version INTEGER NOT NULL DEFAULT 0")
+    # Older DBs: created time (unix s) of the newest Stripe event applied
+    cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS last_event_ts BIGINT NOT NULL DEFAULT 0")
+    conn.commit()
+
+
+def upsert_user(conn, email: str, stripe_customer_id: str, tier: str, status: str) -> int:
+    """
+    Writes the user's tier and bumps ent_version so previously issued
+    entitlement tokens for this email stop being trusted.
+    Returns the new ent_version.
+    """
+    tier = _norm_tier(tier)
+
+    status = (status or "inactive").lower()
+
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO users (email, stripe_customer_id, tier, status, ent_version, updated_at)
+        VALUES (%s, %s, %s, %s, 1, now())
+        ON CONFLICT (email) DO UPDATE SET
+          stripe_customer_id = EXCLUDED.stripe_customer_id,
+          tier = EXCLUDED.tier,
+          status = EXCLUDED.status,
+          ent_version = users.ent_version + 1,
+          updated_at = now()
+        RETURNING ent_version
+        """,
+        (email, stripe_customer_id, tier, status),
+    )
+    row = cur.fetchone()
+    conn.commit()
+
+    ver = int(row[0]) if row and row[0] is not None else 0
+    _cache_entitlement(email, tier, ver)
+    return ver
+
+
+def _dedupe_last(rows, key_idx: int = 0):
+    # ON CONFLICT DO UPDATE cannot touch the same row twice in one statement
+    out = {}
+    for r in rows:
+        out[r[key_idx]] = r
+    return list(out.values())
+
+
+def upsert_users_batch(conn, rows, commit: bool = True) -> int:
+    """
+    Multi-row upsert_user: rows are (email, stripe_customer_id, tier, status,
+    event_ts). One statement per call; the last row wins for a repeated email.
+    A row older than the user's last_event_ts is skipped, so a late Stripe
+    delivery never overwrites a newer tier.
+    """
+    rows = _dedupe_last(
+        [(e, c, _norm_tier(t), (st or "inactive").lower(), int(ts or 0)) for (e, c, t, st, ts) in rows if e]
+    )
+    if not rows:
+        return 0
+
+    values = ", ".join(["(%s, %s, %s, %s, %s, 1, now())"] * len(rows))
+    params = [v for r in rows for v in r]
+
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        INSERT INTO users (email, stripe_customer_id, tier, status, last_event_ts, ent_version, updated_at)
+        VALUES {values}
+        ON CONFLICT (email) DO UPDATE SET
+          stripe_customer_id = COALESCE(EXCLUDED.stripe_customer_id, users.stripe_customer_id),
+          tier = EXCLUDED.tier,
+          status = EXCLUDED.status,
+          last_event_ts = EXCLUDED.last_event_ts,
+          ent_version = users.ent_version + 1,
+          updated_at = now()
+        WHERE users.last_event_ts <= EXCLUDED.last_event_ts
+        RETURNING email, tier, ent_version
+        """,
+        tuple(params),
+    )
+    written = cur.fetchall() or []
+    if commit:
+        conn.commit()
+
+    for email, tier, ver in written:
+        _cache_entitlement(email, tier, ver)
+    return len(written)
+
+
+def update_users_by_customer_batch(conn, rows, commit: bool = True) -> int:
+    """
+    For Stripe events that only carry a customer id: rows are
+    (stripe_customer_id, tier, status, event_ts). Unknown customers and rows
+    older than the user's last_event_ts are skipped.
+    """
+    rows = _dedupe_last(
+        [(c, _norm_tier(t), (st or "inactive").lower(), int(ts or 0)) for (c, t, st, ts) in rows if c]
+    )
+    if not rows:
+        return 0
+
+    values = ", ".join(["(%s, %s, %s, %s::bigint)"] * len(rows))
+    params = [v for r in rows for v in r]
+
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        UPDATE users AS u SET
+          tier = v.tier,
+          status = v.status,
+          last_event_ts = v.ts,
+          ent_version = u.ent_version + 1,
+          updated_at = now()
+        FROM (VALUES {values}) AS v(customer, tier, status, ts)
+        WHERE u.stripe_customer_id = v.customer AND u.last_event_ts <= v.ts
+        RETURNING u.email, u.tier, u.ent_version
+        """,
+        tuple(params),
+    )
+    written = cur.fetchall() or []
+    if commit:
+        conn.commit()
+
+    for email, tier, ver in written:
+        _cache_entitlement(email, tier, ver)
+    return len(written)
+
+
+def _read_entitlement(conn, email: str):
+    """
+    Returns (tier, ent_version) for email from the users table.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT tier, ent_version FROM users WHERE email = %s", (email,))
+        row = cur.fetchone()
+    except Exception as e:
+        # Deployments whose users table predates ent_version (added by
+        # ensure_users_table on the next webhook / reconcile): read the tier
+        # alone rather than failing every paying user down to "free"
+        if "ent_version" not in str(e):
+            raise
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        cur = conn.cursor()
+        cur.execute("SELECT tier FROM users WHERE email = %s", (email,))
+        row = cur.fetchone()
+        row = (row[0], 0) if row else None
+    if not row:
+        return "free", 0
+    return _norm_tier(row[0]), int(row[1] or 0)
+
+
+def get_user_tier(conn, email: str) -> str:
+    cached = _cached_entitlement(email)
+    if cached:
+        return cached["tier"]
+
+    tier, ver = _read_entitlement(conn, email)
+    _cache_entitlement(email, tier, ver)
+    return tier
+
+
+# ---- Entitlements (tier + feature flags)
+#
+# Resolution order (first hit wins):
+#   1) signed entitlement token (sign_entitlement_token), if it was issued to
+#      the caller's verified Clerk user id, its claims are still fresh and its
+#      version is not older than one this instance has seen
+#   2) per-instance TTL cache keyed by email
+#   3) users table (one query), which refills the cache
+#
+# upsert_user bumps users.ent_version, so tokens minted before a tier change
+# are rejected by any instance that has observed the newer version, and by
+# every instance once ENTITLEMENT_TTL_SECONDS has passed.
+
+TIERS = ("free", "pro", "elite")
+
+TIER_FEATURES = {
+    "free": {"virtual_shelf": True, "images": False, "history": False, "alerts": False},
+    "pro": {"virtual_shelf": True, "images": True, "history": True, "alerts": False},
+    "elite": {"virtual_shelf": True, "images": True, "history": True, "alerts": True},
+}
+
+try:
+    ENTITLEMENT_TTL_SECONDS = max(1, int(os.getenv("ENTITLEMENT_TTL_SECONDS", "300") or "300"))
+except Exception:
+    ENTITLEMENT_TTL_SECONDS = 300
+
+# email -> {"tier": str, "ver": int, "exp": float}
+_ENT_CACHE = {}
+
+
+def _norm_tier(tier) -> str:
+    t = (tier or "free").strip().lower()
+    return t if t in TIERS else "free"
+
+
+def features_for_tier(tier: str) -> dict:
+    return dict(TIER_FEATURES[_norm_tier(tier)])
+
+
+def _cached_entitlement(email: str):
+    ent = _ENT_CACHE.get(email or "")
+    if not ent or ent["exp"] < time.time():
+        return None
+    return ent
+
+
+def _cache_entitlement(email: str, tier: str, ver: int):
+    if not email:
+        return
+    prev = _ENT_CACHE.get(email)
+    # Never let an older version overwrite a newer one (e.g. a slow DB read
+    # racing an upsert in the same instance).
+    if prev and prev["ver"] > int(ver or 0):
+        return
+    _ENT_CACHE[email] = {
+        "tier": _norm_tier(tier),
+        "ver": int(ver or 0),
+        "exp": time.time() + ENTITLEMENT_TTL_SECONDS,
+    }
+
+
+def invalidate_entitlement(email: str):
+    _ENT_CACHE.pop(email or "", None)
+
+
+def sign_entitlement_token(email: str, tier: str, ver: int = 0, days: int = 30, user_id: str = None) -> str:
+    """
+    sign_token() with tier/feature claims embedded, bound to the Clerk user id
+    it was issued to (uid). The claims are trusted for ENTITLEMENT_TTL_SECONDS
+    (ent_exp); the token itself lives for `days`.
+    """
+    tier = _norm_tier(tier)
+    return sign_token(
+        {
+            "sub": email,
+            "uid": user_id,
+            "tier": tier,
+            "features": features_for_tier(tier),
+            "ver": int(ver or 0),
+            "ent_exp": int(time.time()) + ENTITLEMENT_TTL_SECONDS,
+        },
+        days=days,
+    )
+
+
+def _entitlement(tier: str, ver: int, source: str, email: str = None, user_id: str = None) -> dict:
+    tier = _norm_tier(tier)
+    return {
+        "email": email,
+        "user_id": user_id,
+        "tier": tier,
+        "features": features_for_tier(tier),
+        "ver": int(ver or 0),
+        "source": source,
+    }
+
+
+def resolve_entitlements(token: str = None, email: str = None, conn=None, user_id: str = None) -> dict:
+    """
+    Returns {"email", "user_id", "tier", "features", "ver", "source"} where
+    source is one of "token", "cache", "db" or "default". user_id is the
+    caller's verified Clerk sub: a token is only honoured when it was issued
+    to that user id (and to email, when known), so a token replayed by
+    another caller, or by one whose identity is unknown, is ignored. Only
+    touches the DB on a full miss (an email is known but neither the token
+    nor the cache can answer); when conn is None a short-lived connection is
+    opened for that single query.
+    """
+    email = (email or "").strip() or None
+    user_id = (user_id or "").strip() or None
+
+    claims = verify_token(token) if (token and user_id) else None
+    if claims and claims.get("tier") and claims.get("uid") == user_id:
+        sub = (claims.get("sub") or "").strip() or None
+        fresh = int(claims.get("ent_exp", 0) or 0) >= int(time.time())
+        if sub and sub == (email or sub):
+            if fresh:
+                known = _ENT_CACHE.get(sub)
+                if not known or known["ver"] <= int(claims.get("ver", 0) or 0):
+                    return _entitlement(claims.get("tier"), claims.get("ver"), "token", sub, user_id)
+            # Issued to this user: its email is theirs even once the claims are stale
+            email = sub
+
+    if not email:
+        return _entitlement("free", 0, "default", None, user_id)
+
+    cached = _cached_entitlement(email)
+    if cached:
+        return _entitlement(cached["tier"], cached["ver"], "cache", email, user_id)
+
+    own_conn = conn is None
+    if own_conn:
+        conn = db_connect("read")
+    try:
+        tier, ver = _read_entitlement(conn, email)
+    finally:
+        if own_conn:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    _cache_entitlement(email, tier, ver)
+    return _entitlement(tier, ver, "db", email, user_id)
+
+
+# ---- Token signing (stdlib only; no extra deps)
+
+def _b64url(b: bytes) -> str:
+    return base64.urlsafe_b64encode(b).decode("utf-8").rstrip("=")
+
+
+def _b64url_decode(s: str) -> bytes:
+    pad = "=" * ((4 - len(s) % 4) % 4)
+    return base64.urlsafe_b64decode((s + pad).encode("utf-8"))
+
+
+def sign_token(payload: dict, days: int = 30) -> str:
+    """
+    Creates a compact signed token: base64url(json).base64url(hmac)
+    """
+    if not _AUTH_SECRET:
+        raise RuntimeError("AUTH_SECRET env var is missing")
+
+    p = dict(payload or {})
+    p["exp"] = int(time.time()) + int(days) * 24 * 3600
+
+    body = _b64url(json.dumps(p, separators=(",", ":")).encode("utf-8"))
+    sig = hmac.new(_AUTH_SECRET, body.encode("utf-8"), hashlib.sha256).digest()
+    return body + "." + _b64url(sig)
+
+
+def verify_token(token: str) -> dict:
+    """
+    Returns decoded payload dict if valid; otherwise returns None.
+    """
+    try:
+        if not token or "." not in token or not _AUTH_SECRET:
+            return None
+
+        body, sig = token.split(".", 1)
+        expected = hmac.new(_AUTH_SECRET, body.encode("utf-8"), hashlib.sha256).digest()
+        if not hmac.compare_digest(_b64url(expected), sig):
+            return None
+
+        payload = json.loads(_b64url_decode(body).decode("utf-8"))
+        exp = int(payload.get("exp", 0) or 0)
+        if exp and exp < int(time.time()):
+            return None
+
+        return payload
+    except Exception:
+        return None
+
+
+# ---- Operator endpoints (metrics, profiling): CRON_SECRET via header or ?secret=
+
+def has_cron_secret(handler_obj, qs=None) -> bool:
+    """
+    True when the request carries CRON_SECRET as Authorization: Bearer <secret>,
+    X-Cron-Secret: <secret>, or ?secret=<secret>.
+    """
+    cron_secret = (os.getenv("CRON_SECRET") or "").strip()
+    if not cron_secret:
+        return False
+
+    headers = handler_obj.headers
+    auth_header = (headers.get("Authorization") or "").strip()
+    bearer = auth_header.split(" ", 1)[1].strip() if auth_header.lower().startswith("bearer ") else ""
+    provided = (headers.get("X-Cron-Secret") or "").strip()
+    if qs:
+        provided = provided or (qs.get("secret", [""])[0] or "").strip()
+
+    return any(
+        v and hmac.compare_digest(v.encode("utf-8"), cron_secret.encode("utf-8"))
+        for v in (bearer, provided)
+    )
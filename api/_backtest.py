@@ -0,0 +1,536 @@
+import datetime
+import hashlib
+import itertools
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    from .backfill_gsr import GOLD_CSV, SILVER_CSV, _read_close_map
+    from ._schema import write_stamp
+except Exception:
+    from api.backfill_gsr import GOLD_CSV, SILVER_CSV, _read_close_map
+    from api._schema import write_stamp
+
+# Ratio-swap backtests: hold one metal, swap all of it for the other when the
+# GSR crosses a threshold.
+#
+#   series = load_db(conn)            # gsr_daily (cached on its write stamp)
+#   series = load_csv()               # data/xauusd.csv + data/xagusd.csv
+#   out = run(series, {"enter": [80, 85], "exit": [50, 55], "fee_pct": [0, 1]})
+#
+# Rules per run: holding gold and gsr >= enter -> swap into silver (silver is
+# cheap); holding silver and gsr <= exit -> swap back into gold. Every swap
+# loses fee_pct + premium_pct (applied as (1 - fee) * (1 - premium)).
+#
+# Grids are evaluated per (enter, exit) pair: the swap days and the zero-cost
+# ounce path do not depend on costs, so the pair is walked once and each
+# (fee, premium) combination is a scalar factor ** swaps_so_far on that path,
+# evaluated over per-stretch summaries in O(trades).
+# Large grids spread pairs over a process pool (BACKTEST_WORKERS) that is
+# started once per process and reused, so only the first large grid pays
+# the spawn start-up; results are cached on (parameter hash, data version).
+
+GRID_KEYS = ("enter", "exit", "fee_pct", "premium_pct")
+DEFAULTS = {"enter": [80.0], "exit": [50.0], "fee_pct": [0.5], "premium_pct": [2.0]}
+START_METALS = ("gold", "silver")
+
+
+def _env_int(name, default):
+    try:
+        return max(0, int(os.getenv(name, str(default)) or default))
+    except Exception:
+        return default
+
+
+MAX_RUNS = _env_int("BACKTEST_MAX_RUNS", 5000)
+MAX_CURVE_POINTS = _env_int("BACKTEST_CURVE_POINTS", 500)
+PARALLEL_MIN_PAIRS = _env_int("BACKTEST_PARALLEL_MIN_PAIRS", 64)
+WORKERS = _env_int("BACKTEST_WORKERS", os.cpu_count() or 1)
+CACHE_SIZE = _env_int("BACKTEST_CACHE_SIZE", 64)
+
+
+class Series:
+    def __init__(self, dates, gold, silver, version):
+        self.dates = list(dates)
+        self.gold = [float(v) for v in gold]
+        self.silver = [float(v) for v in silver]
+        self.gsr = [g / s for g, s in zip(self.gold, self.silver)]
+        self.version = version
+
+    def window(self, start=None, end=None):
+        """
+        Rows with start <= d <= end as a new Series (dates are ISO strings or
+        datetime.date, compared as strings).
+        """
+        if start is None and end is None:
+            return self
+        keep = [
+            i for i, d in enumerate(self.dates)
+            if (start is None or str(d) >= str(start)) and (end is None or str(d) <= str(end))
+        ]
+        return Series(
+            [self.dates[i] for i in keep],
+            [self.gold[i] for i in keep],
+            [self.silver[i] for i in keep],
+            f"{self.version}|{start or ''}..{end or ''}",
+        )
+
+
+# ---- data
+
+_DB_SERIES = {"stamp": None, "series": None}
+_DB_LOCK = threading.Lock()
+
+
+def load_db(conn) -> Series:
+    """
+    gsr_daily as a Series; reloaded only when its write stamp
+    (_schema.write_stamp, index probes only) changes.
+    """
+    cur = conn.cursor()
+    stamp = write_stamp(cur)
+    with _DB_LOCK:
+        if _DB_SERIES["stamp"] == stamp and _DB_SERIES["series"] is not None:
+            return _DB_SERIES["series"]
+        cur.execute("select d, gold_usd, silver_usd from gsr_daily order by d asc;")
+        rows = [r for r in (cur.fetchall() or []) if r[2]]
+        version = "db:" + hashlib.sha256(repr(stamp).encode("utf-8")).hexdigest()[:16]
+        series = Series([str(r[0]) for r in rows], [r[1] for r in rows], [r[2] for r in rows], version)
+        _DB_SERIES.update({"stamp": stamp, "series": series})
+        return series
+
+
+def load_csv(gold_path: str = GOLD_CSV, silver_path: str = SILVER_CSV) -> Series:
+    """
+    Closes on the dates both CSVs have; versioned by file size + mtime.
+    """
+    gold = _read_close_map(gold_path)
+    silver = _read_close_map(silver_path)
+    dates = sorted(d for d in set(gold) & set(silver) if silver[d] > 0)
+    st = [os.stat(p) for p in (gold_path, silver_path)]
+    version = "csv:" + hashlib.sha256(
+        repr([(s.st_size, s.st_mtime_ns) for s in st]).encode("utf-8")
+    ).hexdigest()[:16]
+    return Series(dates, [gold[d] for d in dates], [silver[d] for d in dates], version)
+
+
+# ---- parameters
+
+def _floats(value, name):
+    if value is None:
+        return list(DEFAULTS[name])
+    if isinstance(value, str):
+        value = [v for v in value.split(",") if v.strip()]
+    if not isinstance(value, (list, tuple)):
+        value = [value]
+    out = []
+    for v in value:
+        try:
+            f = float(v)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a number or a list of numbers")
+        if not math.isfinite(f):
+            raise ValueError(f"{name} must be finite")
+        out.append(f)
+    return sorted(set(out)) or list(DEFAULTS[name])
+
+
+def normalize(params: dict) -> dict:
+    """
+    Canonical parameters (sorted, de-duplicated lists); raises ValueError.
+    """
+    params = params or {}
+    out = {k: _floats(params.get(k), k) for k in GRID_KEYS}
+    for k in ("fee_pct", "premium_pct"):
+        if any(v < 0 or v >= 100 for v in out[k]):
+            raise ValueError(f"{k} must be in [0, 100)")
+    if any(v <= 0 for v in out["enter"] + out["exit"]):
+        raise ValueError("enter / exit thresholds must be positive")
+    start = str(params.get("start") or "gold").strip().lower()
+    if start not in START_METALS:
+        raise ValueError("start must be 'gold' or 'silver'")
+    out["start"] = start
+    out["from"] = str(params["from"]) if params.get("from") else None
+    out["to"] = str(params["to"]) if params.get("to") else None
+    try:
+        out["top"] = max(0, min(int(params.get("top", 5)), 50))
+    except (TypeError, ValueError):
+        raise ValueError("top must be an integer")
+    return out
+
+
+def param_hash(params: dict) -> str:
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def grid_pairs(params: dict):
+    """
+    (enter, exit) pairs with exit < enter; the only combinations that trade.
+    """
+    return [(a, b) for a, b in itertools.product(params["enter"], params["exit"]) if b < a]
+
+
+def grid_size(params: dict) -> int:
+    return len(grid_pairs(params)) * len(params["fee_pct"]) * len(params["premium_pct"])
+
+
+# ---- simulation
+
+def _walk(series, enter, exit_, start_gold):
+    """
+    Zero-cost path for one threshold pair, per day: in_gold, swaps so far and
+    growth (value of one starting ounce over its starting price).
+    """
+    gsr, gold, silver = series.gsr, series.gold, series.silver
+    n = len(gsr)
+    held = [False] * n
+    swaps = [0] * n
+    growth = [0.0] * n
+    in_gold = start_gold
+    base = gold[0] if start_gold else silver[0]
+    oz, k = 1.0, 0
+    for i, r in enumerate(gsr):
+        if in_gold and r >= enter:
+            oz, in_gold, k = oz * r, False, k + 1
+        elif not in_gold and r <= exit_:
+            oz, in_gold, k = oz / r, True, k + 1
+        held[i], swaps[i] = in_gold, k
+        growth[i] = oz * (gold[i] if in_gold else silver[i]) / base
+    return held, swaps, growth
+
+
+def _segments(path):
+    """
+    One (swaps, max growth, min growth, drawdown within) per stretch between
+    swaps. Costs scale a whole stretch by factor ** swaps, so a run's max
+    drawdown follows from these in O(trades) instead of O(days).
+    """
+    held, swaps, growth = path
+    out = []
+    start = 0
+    n = len(growth)
+    for i in range(1, n + 1):
+        if i < n and swaps[i] == swaps[start]:
+            continue
+        peak, lo, dd = 0.0, float("inf"), 0.0
+        for g in growth[start:i]:
+            if g > peak:
+                peak = g
+            elif (peak - g) / peak > dd:
+                dd = (peak - g) / peak
+            if g < lo:
+                lo = g
+        out.append((swaps[start], peak, lo, dd))
+        start = i
+    return out
+
+
+def _summary(series, path, start_gold):
+    """
+    The cost-independent part of a threshold pair's runs.
+    """
+    held, swaps, growth = path
+    hold = (series.gold[-1] / series.gold[0]) if start_gold else (series.silver[-1] / series.silver[0])
+    return {
+        "trades": swaps[-1],
+        "end_metal": "gold" if held[-1] else "silver",
+        "growth": growth[-1],
+        "hold": hold,
+        "in_gold": sum(held) / len(held),
+        "segments": _segments(path),
+    }
+
+
+def _stats(summary, factor, years):
+    peak, max_dd = 0.0, 0.0
+    for k, hi, lo, dd in summary["segments"]:
+        scale = factor ** k
+        if peak:
+            dd = max(dd, 1.0 - lo * scale / peak)
+        max_dd = max(max_dd, dd)
+        peak = max(peak, hi * scale)
+
+    value = summary["growth"] * factor ** summary["trades"]
+    hold = summary["hold"]
+    return {
+        "trades": summary["trades"],
+        "end_metal": summary["end_metal"],
+        # ounces of the start metal the position is worth now (1.0 = no gain)
+        "start_metal_oz": value / hold,
+        "return_pct": (value - 1.0) * 100.0,
+        "hold_return_pct": (hold - 1.0) * 100.0,
+        "cagr_pct": ((value ** (1.0 / years) - 1.0) * 100.0) if years > 0 and value > 0 else None,
+        "max_drawdown_pct": max_dd * 100.0,
+        "time_in_gold_pct": summary["in_gold"] * 100.0,
+    }
+
+
+def _years(series):
+    try:
+        d0 = datetime.date.fromisoformat(str(series.dates[0]))
+        d1 = datetime.date.fromisoformat(str(series.dates[-1]))
+        return (d1 - d0).days / 365.25
+    except Exception:
+        return 0.0
+
+
+def _curve(series, path, factor):
+    """
+    Growth of one starting ounce (1.0 = start value) downsampled to
+    MAX_CURVE_POINTS, with the metal held.
+    """
+    held, swaps, growth = path
+    n = len(growth)
+    step = max(1, math.ceil(n / MAX_CURVE_POINTS)) if MAX_CURVE_POINTS else n
+    idx = list(range(0, n, step))
+    if idx[-1] != n - 1:
+        idx.append(n - 1)
+    return [
+        {
+            "date": str(series.dates[i]),
+            "growth": round(growth[i] * factor ** swaps[i], 6),
+            "metal": "gold" if held[i] else "silver",
+        }
+        for i in idx
+    ]
+
+
+def _factor(fee, premium):
+    return (1.0 - fee / 100.0) * (1.0 - premium / 100.0)
+
+
+def _eval_pairs(series, pairs, costs, start_gold):
+    out = []
+    years = _years(series)
+    for enter, exit_ in pairs:
+        summary = _summary(series, _walk(series, enter, exit_, start_gold), start_gold)
+        for fee, premium in costs:
+            out.append({
+                "enter": enter, "exit": exit_, "fee_pct": fee, "premium_pct": premium,
+                **_stats(summary, _factor(fee, premium), years),
+            })
+    return out
+
+
+# Worker-process state: the last series a worker saw, by version, so a
+# worker that already holds it is not sent it again
+_WORKER = {}
+_POOL = {"pool": None, "failed": False, "shipped": set()}
+_POOL_LOCK = threading.Lock()
+
+
+def _worker_eval(version, series, pairs, costs, start_gold):
+    if series is not None:
+        _WORKER["series"] = series
+    held = _WORKER.get("series")
+    if held is None or held.version != version:
+        return None  # this worker never got the series: the caller retries with it
+    return _eval_pairs(held, pairs, costs, start_gold)
+
+
+def _pool():
+    """
+    The shared process pool, started on first use; None where processes
+    can't be started (e.g. a serverless sandbox), remembered per process.
+    """
+    with _POOL_LOCK:
+        if _POOL["pool"] is None and not _POOL["failed"]:
+            try:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                # spawn: forking a threaded server (server.py) can copy held locks
+                ctx = multiprocessing.get_context("spawn")
+                _POOL["pool"] = ProcessPoolExecutor(WORKERS, ctx)
+            except Exception:
+                _POOL["failed"] = True
+        return _POOL["pool"]
+
+
+def _drop_pool():
+    with _POOL_LOCK:
+        pool, _POOL["pool"] = _POOL["pool"], None
+        _POOL["shipped"] = set()
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _evaluate(series, pairs, costs, start_gold):
+    """
+    Returns (runs, workers_used).
+    """
+    # A run costs O(trades); the per-pair walk over every day is what scales
+    workers = min(WORKERS, len(pairs))
+    pool = _pool() if (len(pairs) >= PARALLEL_MIN_PAIRS and workers > 1) else None
+    if pool is not None:
+        try:
+            # The series goes along until this version has been sent once per
+            # worker; after that tasks carry only the pairs
+            shipped = series.version in _POOL["shipped"]
+            chunks = [pairs[i::workers] for i in range(workers)]
+            futures = [
+                pool.submit(_worker_eval, series.version, None if shipped else series, chunk, costs, start_gold)
+                for chunk in chunks
+            ]
+            parts = [f.result() for f in futures]
+            for i, part in enumerate(parts):
+                if part is None:
+                    parts[i] = pool.submit(_worker_eval, series.version, series, chunks[i], costs, start_gold).result()
+            if not shipped:
+                _POOL["shipped"].add(series.version)
+            if all(part is not None for part in parts):
+                return [r for part in parts for r in part], workers
+        except Exception:
+            # Broken pool: run this grid inline and stay inline in this process
+            _drop_pool()
+            _POOL["failed"] = True
+    return _eval_pairs(series, pairs, costs, start_gold), 1
+
+
+def _round(run):
+    return {k: (round(v, 6) if isinstance(v, float) else v) for k, v in run.items()}
+
+
+def backtest(series: Series, params: dict, max_runs: int = MAX_RUNS) -> dict:
+    """
+    Evaluates the normalized grid; stats for every run, equity curves for
+    the `top` runs by return. max_runs=0 lifts the grid size cap.
+    """
+    data = series.window(params["from"], params["to"])
+    if len(data.dates) < 2:
+        raise ValueError("Not enough history in the requested range")
+    pairs = grid_pairs(params)
+    if not pairs:
+        raise ValueError("No (enter, exit) pair with exit < enter")
+    size = grid_size(params)
+    if max_runs and size > max_runs:
+        raise ValueError(f"Grid has {size} runs (max {max_runs})")
+
+    start_gold = params["start"] == "gold"
+    costs = list(itertools.product(params["fee_pct"], params["premium_pct"]))
+    runs, workers = _evaluate(data, pairs, costs, start_gold)
+    runs.sort(key=lambda r: (-r["return_pct"], r["enter"], r["exit"], r["fee_pct"], r["premium_pct"]))
+
+    top = []
+    for r in runs[:params["top"]]:
+        path = _walk(data, r["enter"], r["exit"], start_gold)
+        top.append({**_round(r), "equity": _curve(data, path, _factor(r["fee_pct"], r["premium_pct"]))})
+
+    return {
+        "range": {"from": str(data.dates[0]), "to": str(data.dates[-1]), "days": len(data.dates)},
+        "start": params["start"],
+        "runs": len(runs),
+        "workers": workers,
+        "best": top[0] if top else _round(runs[0]),
+        "top": top,
+        "results": [_round(r) for r in runs],
+    }
+
+
+# ---- result cache: in process, then backtest_cache (shared across instances)
+
+_CACHE = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def ensure_backtest_cache_table(conn):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        create table if not exists backtest_cache (
+          param_hash text not null,
+          data_version text not null,
+          result jsonb not null,
+          created_at timestamptz not null default now(),
+          primary key (param_hash, data_version)
+        );
+        """
+    )
+    conn.commit()
+
+
+def _db_get(conn, key):
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "select result from backtest_cache where param_hash = %s and data_version = %s;",
+            key,
+        )
+        row = cur.fetchone()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return None
+    if not row:
+        return None
+    return row[0] if isinstance(row[0], dict) else json.loads(row[0])
+
+
+def _db_put(conn, key, result):
+    try:
+        ensure_backtest_cache_table(conn)
+        cur = conn.cursor()
+        cur.execute(
+            """
+            insert into backtest_cache (param_hash, data_version, result)
+            values (%s, %s, %s::jsonb)
+            on conflict (param_hash, data_version) do nothing;
+            """,
+            (*key, json.dumps(result)),
+        )
+        cur.execute("delete from backtest_cache where created_at < now() - interval '30 days';")
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+
+
+def _store(conn, connect_write, key, result):
+    if connect_write is None:
+        return _db_put(conn, key, result)
+    try:
+        wconn = connect_write()
+    except Exception:
+        return  # the shared cache is an optimisation
+    try:
+        _db_put(wconn, key, result)
+    finally:
+        try:
+            wconn.close()
+        except Exception:
+            pass
+
+
+def run(series: Series, params: dict, conn=None, max_runs: int = MAX_RUNS, connect_write=None) -> dict:
+    """
+    Cached backtest(): returns the result plus "cache" ("memory" | "db" |
+    "miss") and the key it was stored under. conn enables the shared table;
+    with connect_write (opens a write connection) conn is only read from and
+    a write connection is opened just to store a miss.
+    """
+    params = normalize(params)
+    key = (param_hash(params), series.version)
+    with _CACHE_LOCK:
+        hit = _CACHE.get(key)
+        if hit is not None:
+            _CACHE.move_to_end(key)
+    how = "memory"
+    if hit is None and conn is not None:
+        hit, how = _db_get(conn, key), "db"
+    if hit is None:
+        hit, how = backtest(series, params, max_runs), "miss"
+        if conn is not None:
+            _store(conn, connect_write, key, hit)
+    if CACHE_SIZE:
+        with _CACHE_LOCK:
+            _CACHE[key] = hit
+            while len(_CACHE) > CACHE_SIZE:
+                _CACHE.popitem(last=False)
+    return {**hit, "params": params, "cache": how, "key": {"params": key[0][:16], "data": key[1]}}
@@ -0,0 +1,336 @@
+import os
+import threading
+import time
+
+# Per-provider circuit breakers for upstream price sources.
+#
+#   px = guarded("stooq", lambda: _fetch_stooq_last("gc.f"))   # may raise BreakerOpen
+#
+# closed     calls go through; BREAKER_FAILURES consecutive failures open it
+# open       calls fail immediately with BreakerOpen for BREAKER_OPEN_SECONDS
+# half_open  one probe call is let through; success closes, failure re-opens
+#
+# State is per instance but shared through the provider_health table: an
+# instance publishes each transition, and every BREAKER_SYNC_SECONDS adopts
+# transitions published by other instances, so a provider that is down gets
+# skipped everywhere after a few failures instead of each cold instance
+# paying the full urlopen timeout. Both directions run on a daemon worker
+# thread (connect timeout BREAKER_DB_TIMEOUT, default 2 s), never on the
+# request path; guarded() only queues a snapshot or flags a sync as due.
+# While the database is unreachable the worker backs off for
+# BREAKER_SYNC_SECONDS and the queued snapshots wait. On a frozen serverless
+# instance the worker resumes with the next invocation. Without a database
+# URL the breakers are purely in-process. Transitions and rejections are counted in _metrics
+# (breaker:<provider>:open|close|rejected).
+
+try:
+    from ._utils import METRICS_ENABLED, _pick_database_url, db_connect
+except Exception:
+    from api._utils import METRICS_ENABLED, _pick_database_url, db_connect
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float((os.getenv(name) or "").strip() or default)
+    except Exception:
+        return default
+
+
+FAILURE_THRESHOLD = max(1, int(_env_float("BREAKER_FAILURES", 3)))
+OPEN_SECONDS = max(1.0, _env_float("BREAKER_OPEN_SECONDS", 60))
+SYNC_SECONDS = max(0.0, _env_float("BREAKER_SYNC_SECONDS", 30))
+DB_TIMEOUT = max(0.5, _env_float("BREAKER_DB_TIMEOUT", 2))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class BreakerOpen(RuntimeError):
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(f"{provider} circuit open; retry in {int(retry_in)}s")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+def _count(provider: str, event: str):
+    if METRICS_ENABLED:
+        try:
+            from . import _metrics
+        except Exception:
+            from api import _metrics
+        _metrics.incr(f"breaker:{provider}:{event}")
+
+
+class Breaker:
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_until = 0.0
+        self.changed_at = 0.0
+        self.last_error = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.time()
+            if self.state == OPEN and now < self.opened_until:
+                return False
+            # Open window elapsed (or already half-open): one probe at a time
+            if self._probing:
+                return False
+            self.state = HALF_OPEN
+            self._probing = True
+            return True
+
+    def success(self):
+        with self._lock:
+            changed = self.state != CLOSED
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+            if changed:
+                self.changed_at = time.time()
+        if changed:
+            _count(self.provider, "close")
+            _publish(self)
+
+    def failure(self, err: Exception):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(err)[:300]
+            self._probing = False
+            opened = self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= FAILURE_THRESHOLD)
+            if opened:
+                self.state = OPEN
+                self.changed_at = time.time()
+                self.opened_until = self.changed_at + OPEN_SECONDS
+        if opened:
+            _count(self.provider, "open")
+            _publish(self)
+
+    def adopt(self, state: str, opened_until: float, failures: int, last_error, changed_at: float):
+        with self._lock:
+            if changed_at <= self.changed_at:
+                return
+            self.state = HALF_OPEN if (state == OPEN and opened_until <= time.time()) else state
+            self.opened_until = opened_until
+            self.failures = failures
+            self.last_error = last_error
+            self.changed_at = changed_at
+            self._probing = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            state = self.state
+            if state == OPEN and time.time() >= self.opened_until:
+                state = HALF_OPEN  # next call will probe
+            out = {"state": state, "failures": self.failures}
+            if self.state != CLOSED:
+                out["retry_in_s"] = max(0, int(self.opened_until - time.time()))
+                out["last_error"] = self.last_error
+            return out
+
+
+_BREAKERS = {}
+_REG_LOCK = threading.Lock()
+# ts: last sync scheduled; due: a sync is waiting for the worker; table:
+# provider_health ensured by this process; retry_at: DB back-off deadline
+_SYNC = {"ts": 0.0, "due": False, "table": False, "retry_at": 0.0}
+_PENDING = {}  # provider -> newest snapshot not yet published
+_WAKE = threading.Event()
+_WORKER = {"thread": None}
+
+
+def breaker(provider: str) -> Breaker:
+    b = _BREAKERS.get(provider)
+    if b is None:
+        with _REG_LOCK:
+            b = _BREAKERS.setdefault(provider, Breaker(provider))
+    return b
+
+
+def guarded(provider: str, fn):
+    """
+    Runs fn() behind the provider's breaker; raises BreakerOpen without
+    calling fn while the breaker is open.
+    """
+    _maybe_sync()
+    b = breaker(provider)
+    if not b.allow():
+        _count(provider, "rejected")
+        raise BreakerOpen(provider, b.opened_until - time.time())
+    try:
+        value = fn()
+    except Exception as e:
+        b.failure(e)
+        raise
+    b.success()
+    return value
+
+
+def health(*providers) -> dict:
+    return {p: breaker(p).snapshot() for p in providers}
+
+
+# ----------------------------
+# Shared state (provider_health)
+# ----------------------------
+def _shared() -> bool:
+    return SYNC_SECONDS > 0 and bool(_pick_database_url())
+
+
+def ensure_health_table(conn):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        create table if not exists provider_health (
+          provider text primary key,
+          state text not null,
+          failures integer not null default 0,
+          opened_until double precision not null default 0,
+          changed_at double precision not null,
+          last_error text null
+        );
+        """
+    )
+    conn.commit()
+
+
+def provider_health(conn) -> dict:
+    """
+    Shared breaker state as last published by any instance.
+    """
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "select provider, state, failures, opened_until, changed_at, last_error from provider_health order by provider;"
+        )
+        rows = cur.fetchall() or []
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return {}
+    now = time.time()
+    return {
+        provider: {
+            "state": HALF_OPEN if (state == OPEN and float(opened_until) <= now) else state,
+            "failures": int(failures),
+            "retry_in_s": max(0, int(float(opened_until) - now)),
+            "changed_at": changed_at,
+            "last_error": last_error,
+        }
+        for provider, state, failures, opened_until, changed_at, last_error in rows
+    }
+
+
+def _publish(b: Breaker):
+    """
+    Queues the breaker's current state for the worker; the newest snapshot
+    per provider wins.
+    """
+    if not _shared():
+        return
+    with b._lock:
+        snap = (b.provider, b.state, b.failures, b.opened_until, b.changed_at, b.last_error)
+    with _REG_LOCK:
+        _PENDING[b.provider] = snap
+    _wake()
+
+
+def _maybe_sync():
+    now = time.time()
+    if not _shared() or now - _SYNC["ts"] < SYNC_SECONDS:
+        return
+    with _REG_LOCK:
+        if now - _SYNC["ts"] < SYNC_SECONDS:
+            return
+        _SYNC["ts"] = now
+        _SYNC["due"] = True
+    _wake()
+
+
+def _wake():
+    with _REG_LOCK:
+        if _WORKER["thread"] is None:
+            t = threading.Thread(target=_worker, name="breaker-sync", daemon=True)
+            _WORKER["thread"] = t
+            t.start()
+    _WAKE.set()
+
+
+def _worker():
+    while True:
+        _WAKE.wait(max(SYNC_SECONDS, 1.0))
+        _WAKE.clear()
+        try:
+            _sync_shared()
+        except Exception:
+            pass
+
+
+def _sync_shared():
+    """
+    One round against provider_health: publish queued snapshots, then adopt
+    other instances' transitions when a sync is due. Runs on the worker only.
+    """
+    if time.time() < _SYNC["retry_at"]:
+        return
+    with _REG_LOCK:
+        pending = list(_PENDING.values())
+        _PENDING.clear()
+        due = _SYNC["due"]
+        _SYNC["due"] = False
+    if not pending and not due:
+        return
+
+    rows = []
+    conn = None
+    try:
+        conn = db_connect(timeout=DB_TIMEOUT)
+        if not _SYNC["table"]:
+            ensure_health_table(conn)
+            _SYNC["table"] = True
+        cur = conn.cursor()
+        for snap in pending:
+            cur.execute(
+                """
+                insert into provider_health (provider, state, failures, opened_until, changed_at, last_error)
+                values (%s, %s, %s, %s, %s, %s)
+                on conflict (provider) do update set
+                  state = excluded.state,
+                  failures = excluded.failures,
+                  opened_until = excluded.opened_until,
+                  changed_at = excluded.changed_at,
+                  last_error = excluded.last_error
+                where provider_health.changed_at < excluded.changed_at;
+                """,
+                snap,
+            )
+        conn.commit()
+        if due:
+            cur.execute(
+                "select provider, state, failures, opened_until, changed_at, last_error from provider_health;"
+            )
+            rows = cur.fetchall() or []
+    except Exception:
+        # DB unreachable: keep the unpublished snapshots (unless a newer one
+        # was queued meanwhile) and leave the DB alone for SYNC_SECONDS.
+        # Shared state is an optimisation; the local breakers still work.
+        with _REG_LOCK:
+            for snap in pending:
+                _PENDING.setdefault(snap[0], snap)
+        _SYNC["retry_at"] = time.time() + max(SYNC_SECONDS, 1.0)
+    finally:
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    for provider, state, failures, opened_until, changed_at, last_error in rows:
+        breaker(provider).adopt(state, float(opened_until), int(failures), last_error, float(changed_at))
@@ -0,0 +1,148 @@
+import datetime
+import mmap
+import os
+import struct
+import sys
+import threading
+
+# Frozen history segment: gsr_daily rows older than a cutoff, compiled by
+# scripts/build_segment.py into data/gsr_frozen.bin and shipped with the
+# functions. /api/latest reads only the rows after the segment from Neon.
+#
+#   seg = segment()                   # None when the file is missing / invalid
+#   seg.last_date                     # newest frozen day
+#   seg.tail(n)                       # newest n frozen rows, oldest first
+#
+# Layout (little-endian), memory-mapped read-only:
+#   header   <4sHHiiiq> magic b"GSRF", version, decimals, count,
+#            first / last date ordinal, built_at (unix), padded to 32 bytes
+#   int32    date ordinals [count]       (padded to 8 bytes)
+#   int64    gold_usd  x 10**decimals [count]
+#   int64    silver_usd x 10**decimals [count]
+#   int64    gsr       x 10**decimals [count]
+
+MAGIC = b"GSRF"
+VERSION = 1
+DECIMALS = 6
+_HEADER = struct.Struct("<4sHHiiiq")
+HEADER_SIZE = 32
+_SCALE = float(10 ** DECIMALS)
+
+DEFAULT_PATH = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "data", "gsr_frozen.bin"))
+# Empty GSR_FROZEN_PATH turns the segment off (every row from gsr_daily)
+FROZEN_PATH = os.getenv("GSR_FROZEN_PATH", DEFAULT_PATH)
+
+
+def _pad8(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def to_fixed(value) -> int:
+    """
+    1366.3333333 -> 1366333333 (rounded to DECIMALS places).
+    """
+    return int(round(float(value) * 10 ** DECIMALS))
+
+
+def pack(rows, built_at: int = 0) -> bytes:
+    """
+    rows: [(date, gold, silver, gsr)] in date order -> segment bytes.
+    """
+    n = len(rows)
+    ords = [r[0].toordinal() for r in rows]
+    head = _HEADER.pack(MAGIC, VERSION, DECIMALS, n, ords[0] if n else 0, ords[-1] if n else 0, int(built_at))
+    parts = [head.ljust(HEADER_SIZE, b"\0")]
+    date_bytes = struct.pack(f"<{n}i", *ords)
+    parts.append(date_bytes.ljust(_pad8(len(date_bytes)), b"\0"))
+    for col in (1, 2, 3):
+        parts.append(struct.pack(f"<{n}q", *(to_fixed(r[col]) for r in rows)))
+    return b"".join(parts)
+
+
+class Segment:
+    def __init__(self, buf, path=None):
+        magic, version, decimals, n, first, last, built_at = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION or decimals != DECIMALS:
+            raise ValueError("not a GSR frozen segment (or an incompatible version)")
+        date_end = HEADER_SIZE + _pad8(4 * n)
+        if len(buf) < date_end + 3 * 8 * n:
+            raise ValueError("truncated segment")
+        view = memoryview(buf)
+        self.path = path
+        self.n = n
+        self.built_at = built_at
+        self.first_date = datetime.date.fromordinal(first) if n else None
+        self.last_date = datetime.date.fromordinal(last) if n else None
+        self.ordinals = view[HEADER_SIZE:HEADER_SIZE + 4 * n].cast("i")
+        cols = [view[date_end + 8 * n * i:date_end + 8 * n * (i + 1)].cast("q") for i in range(3)]
+        self.gold, self.silver, self.gsr = cols
+        self._rows = None
+        self._json = None
+
+    def rows(self):
+        """
+        Every row, oldest first, shaped like the gsr_daily history query:
+        (date, gold_usd, silver_usd, gsr) with the prices as strings. Decoded
+        once per process (~15k rows: a few MB, ~40 ms); str(v / 10**DECIMALS)
+        is exactly the fixed-point value for price-sized v (< 2**53).
+        """
+        if self._rows is None:
+            fromordinal = datetime.date.fromordinal
+            self._rows = [
+                (fromordinal(o), str(g / _SCALE), str(s / _SCALE), str(r / _SCALE))
+                for o, g, s, r in zip(self.ordinals, self.gold, self.silver, self.gsr)
+            ]
+        return self._rows
+
+    def tail(self, count: int):
+        """
+        Newest `count` rows, oldest first.
+        """
+        return self.rows()[max(0, self.n - max(0, count)):]
+
+    def json_tail(self, count: int) -> str:
+        """
+        tail(count) as the comma-joined JSON objects of /api/latest history
+        items (no brackets), for splicing in front of a json_agg array. The
+        per-row fragments are built once per process.
+        """
+        if self._json is None:
+            self._json = [
+                f'{{"date": "{d}", "gold_usd": "{g}", "silver_usd": "{s}", "gsr": "{r}"}}'
+                for d, g, s, r in self.rows()
+            ]
+        return ", ".join(self._json[max(0, self.n - max(0, count)):])
+
+    def info(self) -> dict:
+        return {
+            "rows": self.n,
+            "from": str(self.first_date) if self.n else None,
+            "to": str(self.last_date) if self.n else None,
+            "built_at": self.built_at,
+        }
+
+
+_STATE = {"path": None, "segment": None}
+_LOCK = threading.Lock()
+
+
+def segment():
+    """
+    The memory-mapped segment at FROZEN_PATH (mapped once per process), or
+    None when it is turned off, missing or unreadable.
+    """
+    path = FROZEN_PATH
+    if _STATE["path"] == path:
+        return _STATE["segment"]
+    with _LOCK:
+        if _STATE["path"] != path:
+            seg = None
+            # memoryview.cast reads native order; the file is little-endian
+            if path and sys.byteorder == "little":
+                try:
+                    with open(path, "rb") as f:
+                        seg = Segment(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), path)
+                except (OSError, ValueError, struct.error):
+                    seg = None
+            _STATE.update({"path": path, "segment": seg})
+    return _STATE["segment"]
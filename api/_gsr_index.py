@@ -0,0 +1,198 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+try:
+    from ._schema import write_stamp
+except Exception:
+    from api._schema import write_stamp
+
+# In-memory analytics index over gsr_daily (one per warm instance).
+#
+#   out, how = read(conn, lambda idx: idx.percentile(82.5))
+#                                  # how: "cached" | "incremental" | "rebuilt"
+#   idx.percentile(82.5)           # O(log n) rank against all history
+#   idx.as_of(date)                # O(log n) last row on or before a date
+#   idx.range_stats(d0, d1)        # O(1) min/max/mean over any date range
+#
+# Structures:
+#   dates / values   rows in date order (bisect for as-of and range bounds)
+#   sorted_values    every GSR sorted (bisect for percentile rank)
+#   prefix           running sums (range mean)
+#   argmin / argmax  sparse tables: level k holds, for each i, the index of
+#                    the min / max of values[i : i + 2**k]; any range is
+#                    covered by two overlapping power-of-two windows
+#
+# Keeping it current: _schema.write_stamp() (max(fetched_at_utc), min(d),
+# max(d): index probes, no scan) per request detects any write to gsr_daily.
+# The rows written since the last stamp are then read through the
+# fetched_at_utc index. The common changes, today's row being refreshed or
+# the cron appending a day, are applied in place in O(log n) per row (only
+# the sparse-table windows ending at the tail move). Anything else (a
+# backfill rewriting old rows, a changed first day) rebuilds from scratch.
+
+
+class GsrIndex:
+    def __init__(self, rows):
+        self.dates = [r[0] for r in rows]
+        self.values = [float(r[1]) for r in rows]
+        self.sorted_values = sorted(self.values)
+        self.prefix = [0.0]
+        for v in self.values:
+            self.prefix.append(self.prefix[-1] + v)
+        self.argmin = self._build(min)
+        self.argmax = self._build(max)
+
+    @property
+    def n(self) -> int:
+        return len(self.values)
+
+    # ---- construction / maintenance
+    def _build(self, pick):
+        v = self.values
+        key = v.__getitem__
+        levels = [list(range(len(v)))]
+        width = 1
+        while width * 2 <= len(v):
+            prev = levels[-1]
+            levels.append([pick(a, b, key=key) for a, b in zip(prev, prev[width:])])
+            width *= 2
+        return levels
+
+    def _fix_tail(self, levels, pick):
+        """
+        Recomputes the one window per level that ends at the last row.
+        """
+        n = len(self.values)
+        key = self.values.__getitem__
+        if len(levels[0]) < n:
+            levels[0].append(n - 1)
+        k, width = 1, 1
+        while width * 2 <= n:
+            if len(levels) == k:
+                levels.append([])
+            i = n - width * 2
+            cand = pick(levels[k - 1][i], levels[k - 1][i + width], key=key)
+            if i < len(levels[k]):
+                levels[k][i] = cand
+            else:
+                levels[k].append(cand)
+            k, width = k + 1, width * 2
+
+    def set_last(self, value: float):
+        value = float(value)
+        old = self.values[-1]
+        if old == value:
+            return
+        del self.sorted_values[bisect_left(self.sorted_values, old)]
+        insort(self.sorted_values, value)
+        self.values[-1] = value
+        self.prefix[-1] = self.prefix[-2] + value
+        self._fix_tail(self.argmin, min)
+        self._fix_tail(self.argmax, max)
+
+    def append(self, d, value: float):
+        value = float(value)
+        self.dates.append(d)
+        self.values.append(value)
+        insort(self.sorted_values, value)
+        self.prefix.append(self.prefix[-1] + value)
+        self._fix_tail(self.argmin, min)
+        self._fix_tail(self.argmax, max)
+
+    # ---- queries
+    def percentile(self, value: float) -> float:
+        """
+        Percentile rank (0-100) of value among all rows; ties count half.
+        """
+        if not self.n:
+            return None
+        s = self.sorted_values
+        below = bisect_left(s, value)
+        equal = bisect_right(s, value) - below
+        return (below + 0.5 * equal) / self.n * 100.0
+
+    def as_of(self, d):
+        """
+        (index, date, gsr) of the last row on or before d, or None.
+        """
+        i = bisect_right(self.dates, d) - 1
+        if i < 0:
+            return None
+        return i, self.dates[i], self.values[i]
+
+    def _query(self, levels, pick, lo: int, hi: int) -> int:
+        k = (hi - lo + 1).bit_length() - 1
+        return pick(levels[k][lo], levels[k][hi - (1 << k) + 1], key=self.values.__getitem__)
+
+    def range_stats(self, start=None, end=None):
+        """
+        Stats over rows with start <= d <= end (either bound optional), or
+        None when no row falls in the range.
+        """
+        lo = 0 if start is None else bisect_left(self.dates, start)
+        hi = self.n - 1 if end is None else bisect_right(self.dates, end) - 1
+        if lo > hi:
+            return None
+        i_min = self._query(self.argmin, min, lo, hi)
+        i_max = self._query(self.argmax, max, lo, hi)
+        first, last = self.values[lo], self.values[hi]
+        return {
+            "from": self.dates[lo],
+            "to": self.dates[hi],
+            "rows": hi - lo + 1,
+            "first": first,
+            "last": last,
+            "change_pct": ((last - first) / first * 100.0) if first else None,
+            "mean": (self.prefix[hi + 1] - self.prefix[lo]) / (hi - lo + 1),
+            "min": {"date": self.dates[i_min], "gsr": self.values[i_min]},
+            "max": {"date": self.dates[i_max], "gsr": self.values[i_max]},
+        }
+
+
+_STATE = {"index": None, "stamp": None}
+_LOCK = threading.Lock()
+
+
+def _load(cur):
+    cur.execute("select d, gsr from gsr_daily order by d asc;")
+    return GsrIndex(cur.fetchall() or [])
+
+
+def _sync(cur):
+    stamp = write_stamp(cur)
+    _, first, last = stamp
+
+    idx = _STATE["index"]
+    if idx is not None and _STATE["stamp"] == stamp:
+        return idx, "cached"
+
+    how = "rebuilt"
+    since = (_STATE["stamp"] or (None,))[0]
+    if idx is not None and idx.n and since is not None and first == idx.dates[0]:
+        cur.execute("select d, gsr from gsr_daily where fetched_at_utc > %s order by d asc;", (since,))
+        changed = cur.fetchall() or []
+        # Only today's row and new days past it can be patched in place
+        if changed and changed[0][0] >= idx.dates[-1]:
+            if changed[0][0] == idx.dates[-1]:
+                idx.set_last(changed[0][1])
+                changed = changed[1:]
+            for d, v in changed:
+                idx.append(d, v)
+            if idx.dates[-1] == last:
+                how = "incremental"
+
+    if how == "rebuilt":
+        idx = _STATE["index"] = _load(cur)
+    _STATE["stamp"] = stamp
+    return idx, how
+
+
+def read(conn, fn):
+    """
+    Brings the index up to date with gsr_daily and returns (fn(index), how).
+    fn runs under the index lock, so keep it to lookups.
+    """
+    cur = conn.cursor()
+    with _LOCK:
+        idx, how = _sync(cur)
+        return fn(idx), how
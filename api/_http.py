@@ -0,0 +1,234 @@
+import http.client
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import zlib
+
+# Shared upstream HTTP client.
+#
+#   data = get_json(url, headers={...})
+#   text = get_text(url, headers={...})
+#
+# - keep-alive: idle connections are pooled per (scheme, host, port) at module
+#   level, so warm invocations skip the TCP + TLS handshake
+# - TLS session reuse: the last session per host is offered when a new
+#   connection has to be opened (abbreviated handshake)
+# - Accept-Encoding: gzip, decoded transparently
+# - bounded time: `timeout` per attempt and `deadline` for the whole call
+#   (retries included)
+# - retries with full jitter on connection errors, 429 and 5xx (GET only);
+#   a pooled connection the server already closed is retried at once on a
+#   fresh one without using up a retry
+# - redirects (301/302/303/307/308) are followed like urlopen did, up to
+#   MAX_REDIRECTS hops within the same deadline; Authorization is dropped
+#   when the host changes
+#
+# Errors are raised as urllib.error.HTTPError / URLError so existing
+# `except (HTTPError, URLError, ValueError)` handlers keep working.
+
+POOL_PER_HOST = 4
+IDLE_SECONDS = 50.0  # below the usual 60 s server keep-alive timeout
+
+try:
+    DEFAULT_TIMEOUT = max(0.5, float(os.getenv("UPSTREAM_TIMEOUT_SECONDS", "8") or "8"))
+except Exception:
+    DEFAULT_TIMEOUT = 8.0
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_AFTER_MAX = 2.0
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+
+_POOLS = {}  # (scheme, host, port) -> [(conn, idle_since), ...]
+_TLS_SESSIONS = {}  # host -> ssl.SSLSession
+_LOCK = threading.Lock()
+_SSL_CTX = None
+
+
+def _ssl_context():
+    global _SSL_CTX
+    if _SSL_CTX is None:
+        import ssl
+
+        _SSL_CTX = ssl.create_default_context()
+    return _SSL_CTX
+
+
+class _HTTPSConnection(http.client.HTTPSConnection):
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        session = _TLS_SESSIONS.get(self.host)
+        self.sock = self._context.wrap_socket(self.sock, server_hostname=self.host, session=session)
+
+
+class Response:
+    __slots__ = ("status", "reason", "headers", "body", "reused")
+
+    def __init__(self, status, reason, headers, body, reused):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.reused = reused
+
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.body.decode("utf-8", errors="replace"))
+
+
+def _key(u):
+    port = u.port or (443 if u.scheme == "https" else 80)
+    return (u.scheme, u.hostname, port)
+
+
+def _checkout(key, timeout: float):
+    now = time.monotonic()
+    with _LOCK:
+        idle = _POOLS.get(key) or []
+        while idle:
+            conn, since = idle.pop()
+            if now - since < IDLE_SECONDS:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+            conn.close()
+
+    scheme, host, port = key
+    if scheme == "https":
+        return _HTTPSConnection(host, port, timeout=timeout, context=_ssl_context()), False
+    return http.client.HTTPConnection(host, port, timeout=timeout), False
+
+
+def _checkin(key, conn):
+    sock = conn.sock
+    session = getattr(sock, "session", None)
+    if session is not None:
+        _TLS_SESSIONS[key[1]] = session
+    with _LOCK:
+        idle = _POOLS.setdefault(key, [])
+        if len(idle) < POOL_PER_HOST:
+            idle.append((conn, time.monotonic()))
+            return
+    conn.close()
+
+
+def close_all():
+    with _LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for idle in pools:
+        for conn, _ in idle:
+            conn.close()
+
+
+def _once(method, u, key, headers, body, timeout):
+    """
+    One request/response on a pooled connection; returns Response.
+    """
+    path = u.path or "/"
+    if u.query:
+        path += "?" + u.query
+
+    for _ in range(2):
+        conn, reused = _checkout(key, timeout)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            raw = resp.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError, http.client.BadStatusLine):
+            conn.close()
+            if reused:
+                continue  # server dropped an idle keep-alive connection
+            raise
+        except BaseException:
+            conn.close()
+            raise
+
+        if (resp.getheader("Content-Encoding") or "").lower() == "gzip":
+            raw = zlib.decompress(raw, 16 + zlib.MAX_WBITS)
+        if resp.will_close:
+            conn.close()
+        else:
+            _checkin(key, conn)
+        return Response(resp.status, resp.reason, resp.msg, raw, reused)
+    raise urllib.error.URLError("connection closed by upstream")
+
+
+def request(method: str, url: str, headers=None, body=None, timeout: float = None,
+            retries: int = 1, deadline: float = None, backoff: float = 0.25) -> Response:
+    """
+    Returns Response for any status < 300 (after following redirects);
+    raises urllib.error.HTTPError for other statuses (including a 3xx that
+    can't be followed) and urllib.error.URLError for connection failures /
+    timeouts.
+    """
+    timeout = timeout or DEFAULT_TIMEOUT
+    u = urllib.parse.urlsplit(url)
+    if u.scheme not in ("http", "https") or not u.hostname:
+        raise ValueError(f"Unsupported URL: {url}")
+    key = _key(u)
+
+    hdrs = {"Accept-Encoding": "gzip", "Connection": "keep-alive"}
+    hdrs.update(headers or {})
+    if method != "GET":
+        retries = 0
+
+    end = time.monotonic() + (deadline or timeout * (retries + 1))
+    attempt = 0
+    hops = 0
+    while True:
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            raise urllib.error.URLError(f"deadline exceeded for {key[1]}")
+        try:
+            resp = _once(method, u, key, hdrs, body, min(timeout, remaining))
+        except (OSError, http.client.HTTPException) as e:
+            err = e if isinstance(e, urllib.error.URLError) else urllib.error.URLError(e)
+            resp = None
+        else:
+            if resp.status < 300:
+                return resp
+            location = resp.headers.get("Location") if resp.status in REDIRECT_STATUSES else None
+            if location and hops < MAX_REDIRECTS:
+                hops += 1
+                url = urllib.parse.urljoin(url, location)
+                nu = urllib.parse.urlsplit(url)
+                if nu.scheme not in ("http", "https") or not nu.hostname:
+                    raise ValueError(f"Unsupported redirect URL: {url}")
+                if nu.hostname != u.hostname:
+                    hdrs = {k: v for k, v in hdrs.items() if k.lower() != "authorization"}
+                if resp.status == 303 or (resp.status in (301, 302) and method not in ("GET", "HEAD")):
+                    method, body = "GET", None
+                    hdrs = {k: v for k, v in hdrs.items() if not k.lower().startswith("content-")}
+                u, key = nu, _key(nu)
+                continue
+            err = urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, None)
+
+        if attempt >= retries or (resp is not None and resp.status not in RETRY_STATUSES):
+            raise err
+
+        attempt += 1
+        delay = random.uniform(0, backoff * (2 ** attempt))
+        if resp is not None and resp.status == 429:
+            try:
+                delay = max(delay, min(RETRY_AFTER_MAX, float(resp.headers.get("Retry-After") or 0)))
+            except ValueError:
+                pass
+        if time.monotonic() + delay >= end:
+            raise err
+        time.sleep(delay)
+
+
+def get_text(url: str, headers=None, **kw) -> str:
+    return request("GET", url, headers=headers, **kw).text()
+
+
+def get_json(url: str, headers=None, **kw):
+    return request("GET", url, headers=headers, **kw).json()
@@ -0,0 +1,235 @@
+import datetime
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+
+# Rolling indicators over gsr_daily.gsr, stored per day in gsr_indicators.
+#
+#   update_indicators(conn)                 # after a gsr_daily write (cron, self-heal)
+#   update_indicators(conn, since=date)     # after rewriting older rows (backfill)
+#
+# Every indicator is maintained in O(1) (percentile: O(log w)) per row:
+#   sma_<w>            running sums over the last w ratios
+#   ema_<span>         ema = a * x + (1 - a) * ema_prev, a = 2 / (span + 1)
+#   std_20 / z_20      running sum of squares; z = (x - sma_20) / std_20
+#   band_upper/lower   sma_20 +/- BAND_K * std_20 (Bollinger-style)
+#   pctl_365           rank of x within the last 365 ratios (sorted window)
+#
+# An update recomputes from the last stored day (today's row may have been
+# refreshed since) or from `since`, seeded with the MAX_WINDOW ratios before
+# that day and the EMA values stored for the day before, so a daily append
+# touches ~MAX_WINDOW rows instead of the whole history. Windowed values are
+# null until their window is full; EMAs start from the first ratio.
+
+SMA_WINDOWS = (20, 50, 200)
+EMA_SPANS = (20, 50)
+BAND_WINDOW = 20
+BAND_K = 2.0
+PCTL_WINDOW = 365
+
+MAX_WINDOW = max(SMA_WINDOWS + (BAND_WINDOW, PCTL_WINDOW))
+_SUM_WINDOWS = tuple(sorted(set(SMA_WINDOWS + (BAND_WINDOW,))))
+
+COLUMNS = (
+    tuple(f"sma_{w}" for w in SMA_WINDOWS)
+    + tuple(f"ema_{s}" for s in EMA_SPANS)
+    + (f"std_{BAND_WINDOW}", f"z_{BAND_WINDOW}", "band_upper", "band_lower", f"pctl_{PCTL_WINDOW}")
+)
+
+# Shorthands accepted by /api/latest?indicators=
+GROUPS = {
+    "sma": tuple(c for c in COLUMNS if c.startswith("sma_")),
+    "ema": tuple(c for c in COLUMNS if c.startswith("ema_")),
+    "bands": ("band_upper", "band_lower"),
+    "z": (f"z_{BAND_WINDOW}",),
+    "pctl": (f"pctl_{PCTL_WINDOW}",),
+    "all": COLUMNS,
+}
+
+
+def parse_names(raw: str):
+    """
+    "sma_50,bands" -> ("sma_50", "band_upper", "band_lower"); raises
+    ValueError on an unknown name.
+    """
+    out = []
+    for name in (raw or "").split(","):
+        name = name.strip().lower()
+        if not name:
+            continue
+        cols = GROUPS.get(name) or ((name,) if name in COLUMNS else None)
+        if cols is None:
+            raise ValueError(f"Unknown indicator '{name}' (use {', '.join(list(GROUPS) + list(COLUMNS))})")
+        out.extend(c for c in cols if c not in out)
+    return tuple(out)
+
+
+def ensure_indicators_table(conn):
+    cols = ",\n          ".join(f"{c} double precision null" for c in COLUMNS)
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        create table if not exists gsr_indicators (
+          d date primary key,
+          gsr double precision not null,
+          {cols},
+          updated_at timestamptz not null default now()
+        );
+        """
+    )
+    conn.commit()
+
+
+class RollingIndicators:
+    """
+    history: ratios before the first pushed row, oldest first (the last
+    MAX_WINDOW are kept). ema: {span: value} for the row before, if known.
+    """
+
+    def __init__(self, history=(), ema=None):
+        self.window = deque(list(history)[-MAX_WINDOW:], maxlen=MAX_WINDOW + 1)
+        w = list(self.window)
+        self.sums = {n: sum(w[-n:]) for n in _SUM_WINDOWS}
+        self.sumsq = sum(x * x for x in w[-BAND_WINDOW:])
+        self.ranked = sorted(w[-PCTL_WINDOW:])
+        self.ema = {s: (ema or {}).get(s) for s in EMA_SPANS}
+        if w:
+            for s in EMA_SPANS:
+                if self.ema[s] is None:
+                    self.ema[s] = self._replay_ema(w, s)
+
+    @staticmethod
+    def _replay_ema(values, span):
+        a = 2.0 / (span + 1)
+        e = values[0]
+        for x in values[1:]:
+            e = a * x + (1 - a) * e
+        return e
+
+    def push(self, x: float) -> dict:
+        x = float(x)
+        win = self.window
+        win.append(x)
+        n = len(win)
+
+        out = {}
+        for w in _SUM_WINDOWS:
+            self.sums[w] += x
+            if n > w:
+                self.sums[w] -= win[-w - 1]
+        for w in SMA_WINDOWS:
+            out[f"sma_{w}"] = self.sums[w] / w if n >= w else None
+
+        for s in EMA_SPANS:
+            prev = self.ema[s]
+            a = 2.0 / (s + 1)
+            self.ema[s] = x if prev is None else a * x + (1 - a) * prev
+            out[f"ema_{s}"] = self.ema[s]
+
+        self.sumsq += x * x
+        if n > BAND_WINDOW:
+            self.sumsq -= win[-BAND_WINDOW - 1] ** 2
+        std = z = upper = lower = None
+        if n >= BAND_WINDOW:
+            mean = self.sums[BAND_WINDOW] / BAND_WINDOW
+            std = max(0.0, self.sumsq / BAND_WINDOW - mean * mean) ** 0.5
+            z = (x - mean) / std if std > 0 else 0.0
+            upper, lower = mean + BAND_K * std, mean - BAND_K * std
+        out[f"std_{BAND_WINDOW}"] = std
+        out[f"z_{BAND_WINDOW}"] = z
+        out["band_upper"] = upper
+        out["band_lower"] = lower
+
+        insort(self.ranked, x)
+        if n > PCTL_WINDOW:
+            old = win[-PCTL_WINDOW - 1]
+            del self.ranked[bisect_left(self.ranked, old)]
+        pctl = None
+        if len(self.ranked) >= PCTL_WINDOW:
+            below = bisect_left(self.ranked, x)
+            equal = bisect_right(self.ranked, x) - below
+            pctl = (below + 0.5 * equal) / len(self.ranked) * 100.0
+        out[f"pctl_{PCTL_WINDOW}"] = pctl
+        return out
+
+
+def compute(rows, history=(), ema=None):
+    """
+    rows: [(d, gsr)] in date order -> [(d, gsr, {column: value})].
+    """
+    ind = RollingIndicators(history, ema)
+    return [(d, float(v), ind.push(v)) for d, v in rows]
+
+
+def _store(cur, computed):
+    if not computed:
+        return 0
+    arrays = [[d for d, _, _ in computed], [v for _, v, _ in computed]]
+    arrays += [[vals[c] for _, _, vals in computed] for c in COLUMNS]
+    casts = ", ".join(["%s::date[]", "%s::float8[]"] + ["%s::float8[]"] * len(COLUMNS))
+    cols = ", ".join(("d", "gsr") + COLUMNS)
+    sets = ", ".join(f"{c} = excluded.{c}" for c in ("gsr",) + COLUMNS)
+    cur.execute(
+        f"""
+        insert into gsr_indicators ({cols}, updated_at)
+        select *, now() from unnest({casts})
+        on conflict (d) do update set {sets}, updated_at = excluded.updated_at;
+        """,
+        tuple(arrays),
+    )
+    return len(computed)
+
+
+def update_indicators(conn, since=None) -> dict:
+    """
+    Recomputes gsr_indicators from the last stored day (or `since`, when
+    older) through the newest gsr_daily row. Commits its own work.
+    """
+    if isinstance(since, str):
+        since = datetime.date.fromisoformat(since)
+    ensure_indicators_table(conn)
+    cur = conn.cursor()
+
+    cur.execute("select max(d) from gsr_indicators;")
+    row = cur.fetchone()
+    last = row[0] if row else None
+    start = last if since is None else (min(since, last) if last else None)
+
+    history, ema = [], None
+    if start is not None:
+        cur.execute(
+            "select gsr from gsr_daily where d < %s order by d desc limit %s;",
+            (start, MAX_WINDOW),
+        )
+        history = [float(r[0]) for r in reversed(cur.fetchall() or [])]
+        ema_cols = ", ".join(f"ema_{s}" for s in EMA_SPANS)
+        cur.execute(f"select {ema_cols} from gsr_indicators where d < %s order by d desc limit 1;", (start,))
+        prev = cur.fetchone()
+        if prev:
+            ema = dict(zip(EMA_SPANS, (float(v) if v is not None else None for v in prev)))
+        elif history:
+            start, history = None, []  # EMA state unknown: recompute everything
+
+    if start is None:
+        cur.execute("select d, gsr from gsr_daily order by d asc;")
+    else:
+        cur.execute("select d, gsr from gsr_daily where d >= %s order by d asc;", (start,))
+    rows = cur.fetchall() or []
+
+    written = _store(cur, compute(rows, history, ema))
+    conn.commit()
+    return {"from": str(rows[0][0]) if rows else None, "rows": written, "full": start is None}
+
+
+def on_write(conn, since=None) -> dict:
+    """
+    update_indicators() for gsr_daily writers: a failure is reported in the
+    result and never fails the caller's request.
+    """
+    try:
+        return update_indicators(conn, since=since)
+    except Exception as e:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return {"error": str(e)}
@@ -0,0 +1,233 @@
+import datetime
+import functools
+import os
+
+# Market calendar for freshness TTLs.
+#
+#   ttl = freshness_ttl("gold", "silver")          # seconds, computed at fetch time
+#   info = session()                               # {"state": ..., "next_change_utc": ...}
+#
+# Sessions (all pure arithmetic on UTC; no tz database needed):
+#   COMEX/NYMEX Globex   Sun 18:00 - Fri 17:00 ET, daily break 17:00-18:00 ET
+#                        closed: New Year's Day, Good Friday, Christmas
+#                        early halt 13:00 ET: MLK, Presidents, Memorial, Juneteenth,
+#                        Independence, Labor, Thanksgiving
+#   LBMA (London)        08:00-16:00 London on UK business days
+#   COMEX day session    08:20-13:30 ET
+#
+# States: "peak" (Globex open + London or NY day session), "open" (Globex
+# overnight), "break" (daily settlement break / holiday halt), "closed"
+# (weekend / full holiday). TTLs are short at peak, longer overnight and run
+# until the reopen when closed (capped by MARKET_CLOSED_TTL_MAX_SECONDS), and
+# an open-market TTL never runs more than CLOSE_GRACE_SECONDS past the close
+# so the settlement print is picked up.
+
+OPEN_TTL_SECONDS = {"gold": 60, "silver": 60, "platinum": 120}
+DEFAULT_OPEN_TTL_SECONDS = 60
+OVERNIGHT_MULTIPLIER = 3
+CLOSE_GRACE_SECONDS = 60
+
+try:
+    CLOSED_TTL_MAX_SECONDS = max(60, int(os.getenv("MARKET_CLOSED_TTL_MAX_SECONDS", "21600") or "21600"))
+except Exception:
+    CLOSED_TTL_MAX_SECONDS = 21600
+
+_H = datetime.time
+GLOBEX_CLOSE = _H(17, 0)
+GLOBEX_OPEN = _H(18, 0)
+EARLY_HALT = _H(13, 0)
+NY_DAY = (_H(8, 20), _H(13, 30))
+LONDON_DAY = (_H(8, 0), _H(16, 0))
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> datetime.date:
+    """
+    n-th (1-based) weekday of a month; n=-1 for the last one.
+    """
+    if n > 0:
+        d = datetime.date(year, month, 1)
+        d += datetime.timedelta(days=(weekday - d.weekday()) % 7)
+        return d + datetime.timedelta(weeks=n - 1)
+    nxt = datetime.date(year + (month == 12), month % 12 + 1, 1)
+    d = nxt - datetime.timedelta(days=1)
+    return d - datetime.timedelta(days=(d.weekday() - weekday) % 7)
+
+
+def _easter(year: int) -> datetime.date:
+    # Anonymous Gregorian algorithm
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l_ = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l_) // 451
+    month, day = divmod(h + l_ - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def _observed(d: datetime.date) -> datetime.date:
+    if d.weekday() == 5:
+        return d - datetime.timedelta(days=1)
+    if d.weekday() == 6:
+        return d + datetime.timedelta(days=1)
+    return d
+
+
+@functools.lru_cache(maxsize=8)
+def us_holidays(year: int) -> dict:
+    """
+    {date: "closed" | "early"} for the CME metals calendar.
+    """
+    out = {
+        _observed(datetime.date(year, 1, 1)): "closed",
+        _easter(year) - datetime.timedelta(days=2): "closed",
+        _observed(datetime.date(year, 12, 25)): "closed",
+    }
+    for d in (
+        _nth_weekday(year, 1, 0, 3),          # MLK
+        _nth_weekday(year, 2, 0, 3),          # Presidents
+        _nth_weekday(year, 5, 0, -1),         # Memorial
+        _observed(datetime.date(year, 6, 19)),
+        _observed(datetime.date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),          # Labor
+        _nth_weekday(year, 11, 3, 4),         # Thanksgiving
+    ):
+        out.setdefault(d, "early")
+    return out
+
+
+@functools.lru_cache(maxsize=8)
+def uk_holidays(year: int) -> frozenset:
+    easter = _easter(year)
+    xmas = datetime.date(year, 12, 25)
+    boxing = datetime.date(year, 12, 26)
+    if xmas.weekday() >= 5:
+        xmas_obs, boxing_obs = xmas + datetime.timedelta(days=2), boxing + datetime.timedelta(days=2)
+    elif boxing.weekday() >= 5:
+        xmas_obs, boxing_obs = xmas, boxing + datetime.timedelta(days=2)
+    else:
+        xmas_obs, boxing_obs = xmas, boxing
+    new_year = datetime.date(year, 1, 1)
+    while new_year.weekday() >= 5:
+        new_year += datetime.timedelta(days=1)
+    return frozenset((
+        new_year,
+        easter - datetime.timedelta(days=2),
+        easter + datetime.timedelta(days=1),
+        _nth_weekday(year, 5, 0, 1),
+        _nth_weekday(year, 5, 0, -1),
+        _nth_weekday(year, 8, 0, -1),
+        xmas_obs,
+        boxing_obs,
+    ))
+
+
+def _et_offset(now: datetime.datetime) -> datetime.timedelta:
+    # US DST: second Sunday of March 07:00 UTC -> first Sunday of November 06:00 UTC
+    y = now.year
+    start = datetime.datetime.combine(_nth_weekday(y, 3, 6, 2), _H(7), datetime.timezone.utc)
+    end = datetime.datetime.combine(_nth_weekday(y, 11, 6, 1), _H(6), datetime.timezone.utc)
+    return datetime.timedelta(hours=-4 if start <= now < end else -5)
+
+
+def _london_offset(now: datetime.datetime) -> datetime.timedelta:
+    # UK BST: last Sunday of March 01:00 UTC -> last Sunday of October 01:00 UTC
+    y = now.year
+    start = datetime.datetime.combine(_nth_weekday(y, 3, 6, -1), _H(1), datetime.timezone.utc)
+    end = datetime.datetime.combine(_nth_weekday(y, 10, 6, -1), _H(1), datetime.timezone.utc)
+    return datetime.timedelta(hours=1 if start <= now < end else 0)
+
+
+def _utc(now):
+    if now is None:
+        return datetime.datetime.now(datetime.timezone.utc)
+    if now.tzinfo is None:
+        return now.replace(tzinfo=datetime.timezone.utc)
+    return now.astimezone(datetime.timezone.utc)
+
+
+def _globex_state(now: datetime.datetime) -> str:
+    et = (now + _et_offset(now)).replace(tzinfo=None)
+    t = et.time()
+    # Globex trade date rolls at 18:00 ET
+    trade_date = et.date() + datetime.timedelta(days=1) if t >= GLOBEX_OPEN else et.date()
+    if trade_date.weekday() >= 5:
+        return "closed"
+    hol = us_holidays(trade_date.year).get(trade_date)
+    if hol == "closed":
+        return "closed"
+    if GLOBEX_CLOSE <= t < GLOBEX_OPEN:
+        return "closed" if et.weekday() == 4 else "break"
+    if hol == "early" and et.date() == trade_date and EARLY_HALT <= t:
+        return "break"
+    return "open"
+
+
+def market_state(now=None) -> str:
+    now = _utc(now)
+    state = _globex_state(now)
+    if state != "open":
+        return state
+
+    et = (now + _et_offset(now)).replace(tzinfo=None)
+    if et.weekday() < 5 and NY_DAY[0] <= et.time() < NY_DAY[1]:
+        return "peak"
+    ldn = (now + _london_offset(now)).replace(tzinfo=None)
+    if ldn.weekday() < 5 and ldn.date() not in uk_holidays(ldn.year) and LONDON_DAY[0] <= ldn.time() < LONDON_DAY[1]:
+        return "peak"
+    return "open"
+
+
+def _next_globex_change(now: datetime.datetime):
+    """
+    Next instant the Globex open/closed status flips (searched over the
+    13:00 / 17:00 / 18:00 ET boundaries of the coming 10 days).
+    """
+    is_open = _globex_state(now) == "open"
+    et_now = (now + _et_offset(now)).replace(tzinfo=None)
+    for day in range(0, 11):
+        d = et_now.date() + datetime.timedelta(days=day)
+        for t in (EARLY_HALT, GLOBEX_CLOSE, GLOBEX_OPEN):
+            local = datetime.datetime.combine(d, t)
+            if local <= et_now:
+                continue
+            # Convert ET wall time back to UTC with the offset in force then
+            guess = (local - _et_offset(now)).replace(tzinfo=datetime.timezone.utc)
+            cand = (local - _et_offset(guess)).replace(tzinfo=datetime.timezone.utc)
+            if (_globex_state(cand) == "open") != is_open:
+                return cand
+    return None
+
+
+def session(now=None) -> dict:
+    now = _utc(now)
+    nxt = _next_globex_change(now)
+    return {
+        "state": market_state(now),
+        "next_change_utc": nxt.isoformat() if nxt else None,
+    }
+
+
+def freshness_ttl(*symbols, now=None, base_seconds: int = None) -> int:
+    """
+    Seconds a quote fetched at `now` stays fresh for the given symbols (the
+    shortest across them). base_seconds overrides the per-symbol peak TTL.
+    """
+    now = _utc(now)
+    base = base_seconds or min((OPEN_TTL_SECONDS.get(s, DEFAULT_OPEN_TTL_SECONDS) for s in symbols),
+                               default=DEFAULT_OPEN_TTL_SECONDS)
+    state = market_state(now)
+    nxt = _next_globex_change(now)
+    until = (nxt - now).total_seconds() if nxt else None
+
+    if state in ("peak", "open"):
+        ttl = base if state == "peak" else base * OVERNIGHT_MULTIPLIER
+        if until is not None:
+            ttl = min(ttl, until + CLOSE_GRACE_SECONDS)
+        return int(max(1, ttl))
+
+    ttl = CLOSED_TTL_MAX_SECONDS if until is None else min(until, CLOSED_TTL_MAX_SECONDS)
+    return int(max(base, ttl))
@@ -0,0 +1,279 @@
+import atexit
+import json
+import math
+import os
+import socket
+import threading
+import time
+
+# In-process latency histograms and counters, flushed in bulk to metrics_rollup.
+#
+# Histograms are log-bucketed: bucket i covers [2^(i/8), 2^((i+1)/8)) microseconds,
+# i.e. ~9% relative error, and they merge by adding counts, so rows from many
+# instances and flushes combine exactly. Kinds used:
+#   route     per-endpoint latency (route name: "latest", "spot", ...)
+#   span      per-phase latency (route:phase), from _utils.span
+#   upstream  per-provider latency (span names starting with "upstream")
+#   counter   plain counts (cache:<name>:hit|miss, db:connects, db:queries)
+#
+# Enabled with METRICS_ENABLED=1; flushed at most every METRICS_FLUSH_SECONDS
+# (checked after each response, written by a daemon thread so no request waits
+# on the insert) and at process exit. Rows older than RETENTION_MINUTES, the
+# widest window /api/metrics serves, are deleted at most every PRUNE_SECONDS.
+
+SUB_BUCKETS = 8
+
+try:
+    FLUSH_SECONDS = max(5.0, float(os.getenv("METRICS_FLUSH_SECONDS", "60") or "60"))
+except Exception:
+    FLUSH_SECONDS = 60.0
+
+RETENTION_MINUTES = 7 * 24 * 60
+PRUNE_SECONDS = 3600.0
+
+INSTANCE = f"{socket.gethostname()}:{os.getpid()}"
+
+_LOCK = threading.Lock()
+_STATE = {"hist": {}, "counters": {}, "last_flush": time.monotonic(), "flushing": False, "last_prune": 0.0}
+
+
+def bucket_of(ms: float) -> int:
+    us = ms * 1000.0
+    if us <= 1.0:
+        return 0
+    return int(math.floor(math.log2(us) * SUB_BUCKETS))
+
+
+def bucket_value_ms(idx: int) -> float:
+    # Geometric midpoint of the bucket
+    return (2.0 ** ((int(idx) + 0.5) / SUB_BUCKETS)) / 1000.0
+
+
+def observe(kind: str, name: str, ms: float):
+    b = bucket_of(ms)
+    with _LOCK:
+        h = _STATE["hist"].get((kind, name))
+        if h is None:
+            h = _STATE["hist"][(kind, name)] = {"count": 0, "sum_ms": 0.0, "buckets": {}}
+        h["count"] += 1
+        h["sum_ms"] += ms
+        h["buckets"][b] = h["buckets"].get(b, 0) + 1
+
+
+def incr(name: str, n: int = 1):
+    with _LOCK:
+        _STATE["counters"][name] = _STATE["counters"].get(name, 0) + n
+
+
+def cache_event(cache: str, hit: bool):
+    incr(f"cache:{cache}:{'hit' if hit else 'miss'}")
+
+
+def percentiles(buckets: dict, qs=(0.5, 0.95, 0.99)) -> dict:
+    """
+    buckets: {bucket_idx: count}. Returns {"p50": ms, ...} (None when empty).
+    """
+    items = sorted((int(k), int(v)) for k, v in buckets.items() if int(v) > 0)
+    total = sum(v for _, v in items)
+    out = {}
+    for q in qs:
+        key = f"p{int(round(q * 100))}"
+        if not total:
+            out[key] = None
+            continue
+        rank = q * total
+        seen = 0
+        val = items[-1][0]
+        for idx, cnt in items:
+            seen += cnt
+            if seen >= rank:
+                val = idx
+                break
+        out[key] = round(bucket_value_ms(val), 3)
+    return out
+
+
+# ----------------------------
+# Flush to Postgres
+# ----------------------------
+def ensure_metrics_table(conn):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        create table if not exists metrics_rollup (
+          id bigserial primary key,
+          ts timestamptz not null default now(),
+          instance text not null,
+          kind text not null,
+          name text not null,
+          count bigint not null,
+          sum_ms double precision not null default 0,
+          buckets jsonb not null default '{}'::jsonb
+        );
+        """
+    )
+    cur.execute("create index if not exists metrics_rollup_ts_idx on metrics_rollup (ts desc, kind);")
+    conn.commit()
+
+
+def _take_snapshot():
+    with _LOCK:
+        hist, counters = _STATE["hist"], _STATE["counters"]
+        _STATE["hist"], _STATE["counters"] = {}, {}
+        _STATE["last_flush"] = time.monotonic()
+    return hist, counters
+
+
+def _restore_snapshot(hist, counters):
+    # Put unflushed data back so a DB hiccup doesn't lose it
+    for (kind, name), h in hist.items():
+        with _LOCK:
+            cur = _STATE["hist"].setdefault((kind, name), {"count": 0, "sum_ms": 0.0, "buckets": {}})
+            cur["count"] += h["count"]
+            cur["sum_ms"] += h["sum_ms"]
+            for b, c in h["buckets"].items():
+                cur["buckets"][b] = cur["buckets"].get(b, 0) + c
+    for name, n in counters.items():
+        incr(name, n)
+
+
+def _prune(cur):
+    now = time.monotonic()
+    if _STATE["last_prune"] and now - _STATE["last_prune"] < PRUNE_SECONDS:
+        return
+    _STATE["last_prune"] = now
+    cur.execute(
+        "delete from metrics_rollup where ts < now() - (%s * interval '1 minute')",
+        (RETENTION_MINUTES,),
+    )
+
+
+def flush(conn=None) -> int:
+    """
+    Writes everything accumulated since the last flush as one multi-row insert
+    (and prunes expired rows when due). Returns the number of rows written.
+    """
+    hist, counters = _take_snapshot()
+    rows = [
+        (INSTANCE, kind, name, h["count"], h["sum_ms"], json.dumps({str(k): v for k, v in h["buckets"].items()}))
+        for (kind, name), h in hist.items()
+    ]
+    rows += [(INSTANCE, "counter", name, n, 0.0, "{}") for name, n in counters.items()]
+    if not rows:
+        return 0
+
+    own_conn = conn is None
+    try:
+        if own_conn:
+            try:
+                from ._utils import db_connect
+            except Exception:
+                from api._utils import db_connect
+            conn = db_connect()
+        ensure_metrics_table(conn)
+        values = ", ".join(["(%s, %s, %s, %s, %s, %s::jsonb)"] * len(rows))
+        cur = conn.cursor()
+        cur.execute(
+            f"insert into metrics_rollup (instance, kind, name, count, sum_ms, buckets) values {values}",
+            tuple(v for r in rows for v in r),
+        )
+        _prune(cur)
+        conn.commit()
+        return len(rows)
+    except Exception:
+        _restore_snapshot(hist, counters)
+        raise
+    finally:
+        if own_conn and conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def _flush_quietly():
+    try:
+        flush()
+    except Exception:
+        pass
+
+
+def _flush_in_background():
+    try:
+        _flush_quietly()
+    finally:
+        with _LOCK:
+            _STATE["flushing"] = False
+
+
+def maybe_flush():
+    """
+    Starts a flush on a daemon thread when one is due; returns at once.
+    """
+    if time.monotonic() - _STATE["last_flush"] < FLUSH_SECONDS:
+        return
+    with _LOCK:
+        if _STATE["flushing"]:
+            return
+        _STATE["flushing"] = True
+    threading.Thread(target=_flush_in_background, name="metrics-flush", daemon=True).start()
+
+
+# Long-lived processes (server.py) flush what's left on shutdown
+atexit.register(_flush_quietly)
+
+
+# ----------------------------
+# Read side (merge across instances)
+# ----------------------------
+def summarize(conn, window_minutes: int, kind: str = None) -> dict:
+    cur = conn.cursor()
+    where = "ts >= now() - (%s * interval '1 minute')"
+    params = [int(window_minutes)]
+    if kind:
+        where += " and kind in (%s, 'counter')"
+        params.append(kind)
+    cur.execute(
+        f"select kind, name, count, sum_ms, buckets, instance from metrics_rollup where {where}",
+        tuple(params),
+    )
+
+    merged = {}
+    counters = {}
+    instances = set()
+    for k, name, count, sum_ms, buckets, instance in cur.fetchall() or []:
+        instances.add(instance)
+        if k == "counter":
+            counters[name] = counters.get(name, 0) + int(count)
+            continue
+        if isinstance(buckets, str):
+            buckets = json.loads(buckets)
+        m = merged.setdefault((k, name), {"count": 0, "sum_ms": 0.0, "buckets": {}})
+        m["count"] += int(count)
+        m["sum_ms"] += float(sum_ms or 0)
+        for b, c in (buckets or {}).items():
+            m["buckets"][b] = m["buckets"].get(b, 0) + int(c)
+
+    out = {}
+    for (k, name), m in sorted(merged.items()):
+        stats = {"count": m["count"], "mean_ms": round(m["sum_ms"] / m["count"], 3) if m["count"] else None}
+        stats.update(percentiles(m["buckets"]))
+        out.setdefault(k, {})[name] = stats
+
+    caches = {}
+    for name, n in counters.items():
+        if name.startswith("cache:"):
+            _, cache, outcome = name.split(":", 2)
+            c = caches.setdefault(cache, {"hit": 0, "miss": 0})
+            c[outcome] = c.get(outcome, 0) + n
+    for c in caches.values():
+        total = c["hit"] + c["miss"]
+        c["hit_ratio"] = round(c["hit"] / total, 4) if total else None
+
+    return {
+        "window_minutes": int(window_minutes),
+        "instances": len(instances),
+        "histograms": out,
+        "counters": counters,
+        "caches": caches,
+    }
@@ -1,11 +1,12 @@
 from http.server import BaseHTTPRequestHandler
-from ._utils import db_connect, send_json
+from ._schema import price_text
+from ._utils import RawJSON, db_connect, send_json
 
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
         try:
-            conn = db_connect()
+            conn = db_connect("read")
             try:
                 cur = conn.cursor()
 
@@ -20,15 +21,19 @@ class handler(BaseHTTPRequestHandler):
                 )
                 row = cur.fetchone()
 
-                # Full history for charts (ASC by date)
+                # Full history for charts (ASC by date), encoded by Postgres
                 cur.execute(
                     """
-                    select d, gold_usd, silver_usd, gsr
-                    from gsr_daily
-                    order by d asc;
+                    select coalesce(json_agg(json_build_object(
+                             'date', to_char(d, 'YYYY-MM-DD'),
+                             'gold_usd', gold_usd::numeric::text,
+                             'silver_usd', silver_usd::numeric::text,
+                             'gsr', gsr::numeric::text
+                           ) order by d), '[]')::text
+                    from gsr_daily;
                     """
                 )
-                history = cur.fetchall() or []
+                history = RawJSON(cur.fetchone()[0])
             finally:
                 try:
                     conn.close()
@@ -44,27 +49,17 @@ class handler(BaseHTTPRequestHandler):
 
             latest = {
                 "date": str(row[0]),
-                "gold_usd": str(row[1]),
-                "silver_usd": str(row[2]),
-                "gsr": str(row[3]),
+                "gold_usd": price_text(row[1]),
+                "silver_usd": price_text(row[2]),
+                "gsr": price_text(row[3]),
                 "fetched_at_utc": str(row[4]),
                 "source": row[5],  # jsonb is fine to return directly
             }
 
-            hist = [
-                {
-                    "date": str(d),
-                    "gold_usd": str(g),
-                    "silver_usd": str(s),
-                    "gsr": str(gsr),
-                }
-                for (d, g, s, gsr) in history
-            ]
-
             return send_json(self, 200, {
                 "ok": True,
                 "latest": latest,
-                "history": hist,
+                "history": history,
             })
         except Exception as e:
             return send_json(self, 500, {"ok": False, "error": str(e)})
@@ -0,0 +1,167 @@
+import functools
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+# Opt-in sampled request profiler.
+#
+#   @profiled
+#   def do_GET(self): ...
+#
+# A request is profiled when random() < PROFILE_SAMPLE_RATE (default 0, i.e. off)
+# or when it carries X-Profile: <CRON_SECRET>. Profiled requests run with a
+# wall-clock sampler thread that snapshots the request thread's stack every
+# PROFILE_INTERVAL_MS and records collapsed stacks ("a;b;c <count>", the input
+# format of flamegraph.pl / speedscope). Output goes to PROFILE_DIR when set
+# (one .collapsed file per request), otherwise to the request_profiles table.
+# Unsampled requests pay one random() call and one header lookup.
+
+try:
+    SAMPLE_RATE = max(0.0, min(1.0, float(os.getenv("PROFILE_SAMPLE_RATE", "0") or "0")))
+except Exception:
+    SAMPLE_RATE = 0.0
+
+try:
+    INTERVAL_MS = max(1.0, float(os.getenv("PROFILE_INTERVAL_MS", "5") or "5"))
+except Exception:
+    INTERVAL_MS = 5.0
+
+PROFILE_DIR = (os.getenv("PROFILE_DIR") or "").strip()
+
+
+def _forced(handler) -> bool:
+    provided = (handler.headers.get("X-Profile") or "").strip()
+    if not provided:
+        return False
+    secret = (os.getenv("CRON_SECRET") or "").strip()
+    return bool(secret) and hmac.compare_digest(provided.encode("utf-8"), secret.encode("utf-8"))
+
+
+class _Sampler(threading.Thread):
+    """
+    Samples one thread's Python stack until stop(); stacks are trimmed at the
+    @profiled wrapper so http.server plumbing doesn't drown the handler.
+    """
+
+    def __init__(self, thread_id: int, stop_code, interval_s: float):
+        super().__init__(daemon=True, name="profile-sampler")
+        self.thread_id = thread_id
+        self.stop_code = stop_code
+        self.interval_s = interval_s
+        self.stacks = {}
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None and frame.f_code is not self.stop_code:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if not names or self._done.is_set():
+                continue
+            key = ";".join(reversed(names))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def stop(self):
+        self._done.set()
+        self.join(timeout=1.0)
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{k} {v}" for k, v in sorted(self.stacks.items()))
+
+
+def ensure_profiles_table(conn):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        create table if not exists request_profiles (
+          id bigserial primary key,
+          ts timestamptz not null default now(),
+          method text not null,
+          route text not null,
+          duration_ms double precision not null,
+          interval_ms double precision not null,
+          samples integer not null,
+          forced boolean not null default false,
+          collapsed text not null
+        );
+        """
+    )
+    cur.execute("create index if not exists request_profiles_route_ts_idx on request_profiles (route, ts desc);")
+    conn.commit()
+
+
+def _save(method: str, route: str, duration_ms: float, sampler: _Sampler, forced: bool):
+    collapsed = sampler.collapsed()
+    if not collapsed:
+        return
+
+    if PROFILE_DIR:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = f"{int(time.time() * 1000)}-{method}-{route.strip('/').replace('/', '_') or 'root'}.collapsed"
+        with open(os.path.join(PROFILE_DIR, name), "w", encoding="utf-8") as f:
+            f.write(collapsed + "\n")
+        return
+
+    try:
+        from ._utils import db_connect
+    except Exception:
+        from api._utils import db_connect
+
+    conn = db_connect()
+    try:
+        ensure_profiles_table(conn)
+        cur = conn.cursor()
+        cur.execute(
+            """
+            insert into request_profiles (method, route, duration_ms, interval_ms, samples, forced, collapsed)
+            values (%s, %s, %s, %s, %s, %s, %s)
+            """,
+            (method, route, duration_ms, INTERVAL_MS, sampler.samples, forced, collapsed),
+        )
+        conn.commit()
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def profiled(fn):
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        forced = _forced(self)
+        if not forced and (SAMPLE_RATE <= 0.0 or random.random() >= SAMPLE_RATE):
+            return fn(self, *args, **kwargs)
+
+        sampler = _Sampler(threading.get_ident(), wrapper.__code__, INTERVAL_MS / 1000.0)
+        sampler.start()
+        t0 = time.perf_counter()
+        try:
+            return fn(self, *args, **kwargs)
+        finally:
+            duration_ms = (time.perf_counter() - t0) * 1000.0
+            sampler.stop()
+            try:
+                _save(
+                    getattr(self, "command", "") or "",
+                    urlparse(getattr(self, "path", "") or "").path,
+                    duration_ms,
+                    sampler,
+                    forced,
+                )
+            except Exception:
+                # Profiling must never break the request
+                pass
+
+    return wrapper
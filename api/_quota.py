@@ -0,0 +1,151 @@
+import datetime
+import os
+
+# DB-backed call budget for keyed upstream APIs (shared by every instance).
+#
+#   d = acquire(conn, "metalpriceapi")
+#   if d["allowed"]:       call upstream, then record_value(conn, "metalpriceapi", px)
+#   elif d["last_value"]:  serve the ledger's last value (paced, not exhausted)
+#   else:                  fall back to a cheaper source
+#
+# One row per (provider, billing window). A call is granted only when
+#   calls < usable (limit minus a reserve) and
+#   last_call_at <= now - (window_end - now) / (usable - calls)
+# i.e. the remaining budget is spread evenly over the rest of the window, so
+# the refresh interval widens as calls are spent and narrows as the window
+# runs out. The check and the increment are one upsert, so concurrent
+# instances can't overspend.
+
+QUOTAS = {
+    # provider: (env for the limit, default limit, env for the billing day)
+    "metalpriceapi": ("METALPRICEAPI_MONTHLY_QUOTA", 100, "METALPRICEAPI_BILLING_DAY"),
+}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int((os.getenv(name) or "").strip() or default)
+    except Exception:
+        return default
+
+
+def limit_for(provider: str) -> int:
+    env, default, _ = QUOTAS[provider]
+    return max(0, _env_int(env, default))
+
+
+def reserve_for(provider: str) -> int:
+    """
+    Calls held back for forced refreshes / manual checks (QUOTA_RESERVE, default 5%).
+    """
+    limit = limit_for(provider)
+    return max(0, min(limit, _env_int("QUOTA_RESERVE", max(1, limit // 20))))
+
+
+def window_bounds(provider: str, now: datetime.datetime = None):
+    """
+    (start, end) of the monthly billing window containing now, anchored on
+    the provider's billing day (1-28, default 1).
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    day = min(28, max(1, _env_int(QUOTAS[provider][2], 1)))
+
+    def anchor(y, m):
+        return datetime.datetime(y, m, day, tzinfo=datetime.timezone.utc)
+
+    start = anchor(now.year, now.month)
+    if now < start:
+        start = anchor(now.year - (now.month == 1), (now.month - 2) % 12 + 1)
+    end = anchor(start.year + (start.month == 12), start.month % 12 + 1)
+    return start, end
+
+
+def ensure_quota_table(conn):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        create table if not exists upstream_quota (
+          provider text not null,
+          window_start timestamptz not null,
+          calls integer not null default 0,
+          last_call_at timestamptz null,
+          last_value double precision null,
+          last_value_at timestamptz null,
+          primary key (provider, window_start)
+        );
+        """
+    )
+    conn.commit()
+
+
+def acquire(conn, provider: str, now: datetime.datetime = None) -> dict:
+    """
+    Atomically claims one call if the budget and pacing allow it. Does not
+    commit the caller's other work; commits its own upsert.
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    start, end = window_bounds(provider, now)
+    limit = limit_for(provider)
+    usable = max(0, limit - reserve_for(provider))
+
+    cur = conn.cursor()
+    cur.execute(
+        """
+        insert into upstream_quota as q (provider, window_start, calls, last_call_at)
+        select %s, %s, 1, %s where %s > 0
+        on conflict (provider, window_start) do update set
+          calls = q.calls + 1,
+          last_call_at = excluded.last_call_at
+        where q.calls < %s
+          and (q.last_call_at is null
+               or q.last_call_at <= excluded.last_call_at - (%s - excluded.last_call_at) / greatest(1, %s - q.calls))
+        returning q.calls;
+        """,
+        (provider, start, now, usable, usable, end, usable),
+    )
+    granted = cur.fetchone()
+
+    cur.execute(
+        """
+        select calls, last_call_at, last_value, last_value_at
+        from upstream_quota
+        where provider = %s and window_start = %s;
+        """,
+        (provider, start),
+    )
+    row = cur.fetchone() or (0, None, None, None)
+    conn.commit()
+
+    calls, last_call_at, last_value, last_value_at = row
+    remaining = max(0, usable - calls)
+    interval_s = max(0.0, (end - now).total_seconds()) / max(1, remaining) if remaining else None
+    return {
+        "provider": provider,
+        "allowed": granted is not None,
+        "exhausted": remaining == 0,
+        "calls": calls,
+        "limit": limit,
+        "usable": usable,
+        "window_start": start.isoformat(),
+        "window_end": end.isoformat(),
+        "min_interval_seconds": int(interval_s) if interval_s is not None else None,
+        "last_value": last_value,
+        "last_value_at": last_value_at.isoformat() if last_value_at else None,
+    }
+
+
+def record_value(conn, provider: str, value: float, now: datetime.datetime = None):
+    """
+    Stores the last good upstream value so paced instances can serve it.
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    start, _ = window_bounds(provider, now)
+    cur = conn.cursor()
+    cur.execute(
+        """
+        update upstream_quota set last_value = %s, last_value_at = %s
+        where provider = %s and window_start = %s;
+        """,
+        (value, now, provider, start),
+    )
+    conn.commit()
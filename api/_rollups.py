@@ -0,0 +1,182 @@
+import datetime
+
+try:
+    from ._schema import layout, price_type
+except Exception:
+    from api._schema import layout, price_type
+
+# Weekly / monthly / yearly OHLC candles of gold, silver and GSR, stored in
+# gsr_ohlc (one row per interval + bucket start).
+#
+#   refresh_rollups(conn)                # after a gsr_daily write (cron, self-heal)
+#   refresh_rollups(conn, since=date)    # after rewriting older rows (backfill)
+#   read_candles(conn, "1M", limit)      # newest `limit` buckets, oldest first
+#
+# Buckets start on Monday (1w), the 1st (1M) and Jan 1 (1y), like Postgres
+# date_trunc. A refresh recomputes only from the newest stored bucket per
+# interval (the one still open) or from the bucket holding `since`, from the
+# gsr_daily rows since then; every older bucket is closed and stays as is.
+# Prices are stored in gsr_daily's own price type (api/_schema.py), so a
+# candle close compares exactly with the day it came from.
+
+INTERVALS = ("1w", "1M", "1y")
+SERIES = ("gold", "silver", "gsr")
+_DAILY = {"gold": "gold_usd", "silver": "silver_usd", "gsr": "gsr"}
+
+COLUMNS = tuple(f"{s}_{p}" for s in SERIES for p in ("open", "high", "low", "close"))
+
+
+def bucket_start(d: datetime.date, interval: str) -> datetime.date:
+    if interval == "1w":
+        return d - datetime.timedelta(days=d.weekday())
+    if interval == "1M":
+        return d.replace(day=1)
+    if interval == "1y":
+        return d.replace(month=1, day=1)
+    raise ValueError(f"interval must be one of {', '.join(INTERVALS)}")
+
+
+def ensure_rollup_table(conn, kind="numeric"):
+    cols = ",\n          ".join(f"{c} {kind} not null" for c in COLUMNS)
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        create table if not exists gsr_ohlc (
+          interval text not null,
+          bucket date not null,
+          first_d date not null,
+          last_d date not null,
+          days int not null,
+          {cols},
+          updated_at timestamptz not null default now(),
+          primary key (interval, bucket)
+        );
+        """
+    )
+    conn.commit()
+
+
+def rollup(rows, interval):
+    """
+    rows: [(d, gold, silver, gsr)] in date order -> one candle dict per bucket.
+    """
+    out = []
+    cur = None
+    for d, gold, silver, gsr in rows:
+        b = bucket_start(d, interval)
+        vals = {"gold": gold, "silver": silver, "gsr": gsr}
+        if cur is None or cur["bucket"] != b:
+            cur = {"bucket": b, "first_d": d, "last_d": d, "days": 0}
+            for s, v in vals.items():
+                cur.update({f"{s}_open": v, f"{s}_high": v, f"{s}_low": v})
+            out.append(cur)
+        cur["last_d"] = d
+        cur["days"] += 1
+        for s, v in vals.items():
+            if v > cur[f"{s}_high"]:
+                cur[f"{s}_high"] = v
+            if v < cur[f"{s}_low"]:
+                cur[f"{s}_low"] = v
+            cur[f"{s}_close"] = v
+    return out
+
+
+def _store(cur, interval, candles, kind="numeric"):
+    if not candles:
+        return 0
+    keys = ("bucket", "first_d", "last_d", "days") + COLUMNS
+    casts = ["%s::date[]"] * 3 + ["%s::int[]"] + [f"%s::{kind}[]"] * len(COLUMNS)
+    sets = ", ".join(f"{k} = excluded.{k}" for k in keys[1:])
+    cur.execute(
+        f"""
+        insert into gsr_ohlc (interval, {', '.join(keys)}, updated_at)
+        select %s, *, now() from unnest({', '.join(casts)})
+        on conflict (interval, bucket) do update set {sets}, updated_at = excluded.updated_at;
+        """,
+        (interval, *[[c[k] for c in candles] for k in keys]),
+    )
+    return len(candles)
+
+
+def refresh_rollups(conn, since=None) -> dict:
+    """
+    Recomputes the open bucket of every interval (plus everything from the
+    bucket holding `since`, when given). Commits its own work.
+    """
+    if isinstance(since, str):
+        since = datetime.date.fromisoformat(since)
+    cur = conn.cursor()
+    kind = price_type(layout(cur))
+    ensure_rollup_table(conn, kind)
+
+    cur.execute("select interval, max(bucket) from gsr_ohlc group by interval;")
+    newest = {r[0]: r[1] for r in (cur.fetchall() or [])}
+    starts = {}
+    for interval in INTERVALS:
+        start = newest.get(interval)
+        if start is not None and since is not None:
+            start = min(start, bucket_start(since, interval))
+        starts[interval] = start
+
+    # One scan of gsr_daily from the earliest bucket any interval needs
+    full = any(s is None for s in starts.values())
+    if full:
+        cur.execute("select d, gold_usd, silver_usd, gsr from gsr_daily order by d asc;")
+    else:
+        cur.execute(
+            "select d, gold_usd, silver_usd, gsr from gsr_daily where d >= %s order by d asc;",
+            (min(starts.values()),),
+        )
+    rows = cur.fetchall() or []
+
+    written = {}
+    for interval in INTERVALS:
+        start = starts[interval]
+        part = rows if start is None else [r for r in rows if r[0] >= start]
+        written[interval] = _store(cur, interval, rollup(part, interval), kind)
+    conn.commit()
+    return {"buckets": written, "full": full}
+
+
+def on_write(conn, since=None) -> dict:
+    """
+    refresh_rollups() for gsr_daily writers: a failure is reported in the
+    result and never fails the caller's request.
+    """
+    try:
+        return refresh_rollups(conn, since=since)
+    except Exception as e:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return {"error": str(e)}
+
+
+def read_candles(conn, interval: str, limit: int):
+    """
+    Newest `limit` candles of an interval, oldest first:
+    [(bucket, first_d, last_d, days, *COLUMNS)]. None when the table is not
+    there yet.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            f"""
+            SELECT bucket, first_d, last_d, days, {', '.join(COLUMNS)}
+            FROM gsr_ohlc
+            WHERE interval = %s
+            ORDER BY bucket DESC
+            LIMIT %s;
+            """,
+            (interval, limit),
+        )
+        rows = list(cur.fetchall() or [])
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return None
+    rows.reverse()
+    return rows
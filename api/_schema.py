@@ -0,0 +1,126 @@
+# gsr_daily comes in two layouts:
+#
+#   numeric  (sql/schema.sql)          gold_usd / silver_usd / gsr numeric; writers compute gsr
+#   compact  (sql/schema_compact.sql)  gold_usd / silver_usd double precision, gsr generated
+#                                      always as (gold_usd / silver_usd) stored
+#
+# scripts/migrate_compact.py converts a live table either way. Readers select
+# the same columns from both and get Decimal (numeric) or float (compact)
+# back; readers format prices with price_text() or float(). Writers go through
+# upsert_daily(), which leaves gsr to Postgres in the compact layout.
+#
+# write_stamp() is how caches of gsr_daily (api/_gsr_index.py,
+# api/_backtest.py) notice writes without scanning the table.
+#
+# The layout is read from the catalog once per LAYOUT_TTL seconds per
+# process, and again after a failed upsert, so a migration needs no redeploy.
+import time
+
+NUMERIC = "numeric"
+COMPACT = "compact"
+
+LAYOUT_TTL = 300.0
+
+_PRICE_TYPES = {NUMERIC: "numeric", COMPACT: "double precision"}
+
+# One statement per batch: the rows go in as one array per column
+_UPSERT = {
+    NUMERIC: """
+        INSERT INTO gsr_daily (d, gold_usd, silver_usd, gsr, fetched_at_utc, source)
+        SELECT * FROM unnest(%s::date[], %s::numeric[], %s::numeric[], %s::numeric[], %s::timestamptz[], %s::text[])
+        ON CONFLICT (d) DO UPDATE SET
+          gold_usd       = EXCLUDED.gold_usd,
+          silver_usd     = EXCLUDED.silver_usd,
+          gsr            = EXCLUDED.gsr,
+          fetched_at_utc = EXCLUDED.fetched_at_utc,
+          source         = EXCLUDED.source;
+        """,
+    COMPACT: """
+        INSERT INTO gsr_daily (d, gold_usd, silver_usd, fetched_at_utc, source)
+        SELECT * FROM unnest(%s::date[], %s::float8[], %s::float8[], %s::timestamptz[], %s::text[])
+        ON CONFLICT (d) DO UPDATE SET
+          gold_usd       = EXCLUDED.gold_usd,
+          silver_usd     = EXCLUDED.silver_usd,
+          fetched_at_utc = EXCLUDED.fetched_at_utc,
+          source         = EXCLUDED.source;
+        """,
+}
+
+_LAYOUT = {"kind": None, "at": 0.0}
+
+
+def layout(cur, max_age: float = LAYOUT_TTL) -> str:
+    """
+    COMPACT when gsr_daily.gsr is a generated column, else NUMERIC (also when
+    the table is not there yet: sql/schema.sql is the default). Cached for
+    `max_age` seconds; max_age=0 always asks the catalog.
+    """
+    now = time.monotonic()
+    if _LAYOUT["kind"] is not None and now - _LAYOUT["at"] < max_age:
+        return _LAYOUT["kind"]
+    cur.execute(
+        """
+        SELECT attgenerated <> ''
+        FROM pg_attribute
+        WHERE attrelid = to_regclass('gsr_daily') AND attname = 'gsr' AND NOT attisdropped;
+        """
+    )
+    row = cur.fetchone()
+    _LAYOUT.update({"kind": COMPACT if row and row[0] else NUMERIC, "at": now})
+    return _LAYOUT["kind"]
+
+
+def forget_layout():
+    """
+    Drops the cached layout: the next layout() call reads the catalog.
+    """
+    _LAYOUT["kind"] = None
+
+
+def price_type(kind: str) -> str:
+    """
+    SQL type of price columns under a layout ("numeric" / "double precision"),
+    for tables derived from gsr_daily.
+    """
+    return _PRICE_TYPES[kind]
+
+
+def price_text(value) -> str:
+    """
+    A price cell as text. Decimal (numeric layout) prints as is; a float
+    (compact) keeps 15 significant digits, what a float8 -> numeric cast
+    keeps, so 65.43 does not come out as 65.43000000000001.
+    """
+    return "%.15g" % value if isinstance(value, float) else str(value)
+
+
+def upsert_daily(cur, rows, kind=None) -> int:
+    """
+    rows: [(d, gold_usd, silver_usd, gsr, fetched_at_utc, source)], written
+    with one statement. gsr is dropped for the compact layout. The caller
+    commits. A failure forgets the cached layout (the table may have been
+    migrated since it was read).
+    """
+    if not rows:
+        return 0
+    kind = kind or layout(cur)
+    cols = [list(c) for c in zip(*rows)]
+    if kind == COMPACT:
+        del cols[3]
+    try:
+        cur.execute(_UPSERT[kind], tuple(cols))
+    except Exception:
+        forget_layout()
+        raise
+    return len(rows)
+
+
+def write_stamp(cur):
+    """
+    (max(fetched_at_utc), min(d), max(d)) of gsr_daily: three index probes
+    (gsr_daily_fetched_at_idx and the primary key) that change with every
+    write, since every writer stamps fetched_at_utc. Deleting a row inside
+    the date span goes unnoticed.
+    """
+    cur.execute("SELECT max(fetched_at_utc), min(d), max(d) FROM gsr_daily;")
+    return tuple(cur.fetchone() or (None, None, None))
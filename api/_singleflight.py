@@ -0,0 +1,71 @@
+import threading
+
+# In-process request coalescing for upstream refreshes.
+#
+#   value, shared = single_flight("spot", refresh)
+#
+# The first caller for a key runs refresh(); callers that arrive while it is
+# in flight block on it and get the same value (or the same exception) instead
+# of issuing their own upstream call. Nothing is cached after the call
+# finishes: the endpoints' own TTL caches / DB rows do that. This only
+# coalesces within one instance; latest.py keeps its advisory lock for the
+# cross-instance case.
+
+
+class _Call:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: str, fn, timeout: float = None):
+        """
+        Returns (value, shared); shared is True for callers that waited on
+        another caller's in-flight fn().
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            if not call.event.wait(timeout):
+                raise TimeoutError(f"single-flight wait timed out: {key}")
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.value, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+_GROUP = SingleFlight()
+
+
+def single_flight(key: str, fn, timeout: float = None):
+    """
+    single_flight on the process-wide group; see SingleFlight.do.
+    """
+    return _GROUP.do(key, fn, timeout)
@@ -0,0 +1,205 @@
+import json
+import os
+import threading
+import time
+
+# Server-Sent Events fan-out for live quotes (self-hosted server only).
+#
+#   hub = quote_hub()
+#   if hub.subscribe(sock):      # sends the full snapshot, then owns the socket
+#       server.detach(sock)
+#
+# One publisher thread per process polls the quote source every
+# STREAM_INTERVAL_SECONDS (default 5). The default source is spot.current(),
+# i.e. the same in-process quote cache /api/spot serves, so upstreams are
+# refreshed at most once per market-aware TTL however many clients listen.
+# When a field changed, one frame holding only the changed fields is built
+# and written to every subscriber socket; otherwise a comment line goes out
+# every STREAM_HEARTBEAT_SECONDS (default 15) to keep proxies from timing
+# the stream out and to notice closed clients.
+#
+# Subscribed sockets are detached from the worker pool, so an open stream
+# does not hold a request worker. They are switched to non-blocking, and
+# frames are written outside the hub lock: a subscriber whose send buffer
+# cannot take a whole frame at once is dropped (it reconnects and gets a
+# fresh snapshot), so one slow client never stalls the others or
+# subscribe(). The publisher stops when the last subscriber leaves.
+
+QUOTE_FIELDS = ("gold_usd", "silver_usd", "platinum_usd", "gsr", "fetched_at_utc")
+RETRY_MS = 5000
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float((os.getenv(name) or "").strip() or default)
+    except Exception:
+        return default
+
+
+INTERVAL_SECONDS = max(0.05, _env_float("STREAM_INTERVAL_SECONDS", 5))
+HEARTBEAT_SECONDS = max(1.0, _env_float("STREAM_HEARTBEAT_SECONDS", 15))
+MAX_SUBSCRIBERS = max(1, int(_env_float("STREAM_MAX_SUBSCRIBERS", 1000)))
+
+
+def _frame(event: str, version: int, data: dict) -> bytes:
+    body = json.dumps(data, separators=(",", ":"))
+    return f"id: {version}\nevent: {event}\ndata: {body}\n\n".encode("utf-8")
+
+
+def _send_now(sock, frame: bytes) -> bool:
+    """
+    Writes the whole frame to a non-blocking socket without waiting; False
+    when the socket is gone or its buffer is too full (a slow client).
+    """
+    try:
+        return sock.send(frame) == len(frame)
+    except OSError:  # BlockingIOError included
+        return False
+
+
+def _close(sock):
+    try:
+        sock.close()
+    except Exception:
+        pass
+
+
+class QuoteHub:
+    def __init__(self, source, interval: float = None, heartbeat: float = None, max_subscribers: int = None):
+        self.source = source
+        self.interval = interval or INTERVAL_SECONDS
+        self.heartbeat = heartbeat or HEARTBEAT_SECONDS
+        self.max_subscribers = max_subscribers or MAX_SUBSCRIBERS
+        self.version = 0
+        self.snapshot = None
+        self.stats = {"refreshes": 0, "frames": 0, "bytes": 0, "dropped": 0, "errors": 0}
+        self._subs = set()
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def __len__(self):
+        return len(self._subs)
+
+    def full(self) -> bool:
+        return len(self._subs) >= self.max_subscribers
+
+    # ---- quote source
+    def _poll(self):
+        """
+        Fetches one quote from the source; returns the changed fields (or None)
+        and bumps the version when anything changed.
+        """
+        with self._fetch_lock:
+            try:
+                payload = self.source() or {}
+            except Exception:
+                self.stats["errors"] += 1
+                return None
+            self.stats["refreshes"] += 1
+            quote = {f: payload.get(f) for f in QUOTE_FIELDS}
+            with self._lock:
+                prev = self.snapshot or {}
+                changed = {k: v for k, v in quote.items() if prev.get(k) != v}
+                if not changed and self.snapshot is not None:
+                    return None
+                self.snapshot = quote
+                self.version += 1
+                return changed
+
+    # ---- subscribers
+    def subscribe(self, sock) -> bool:
+        """
+        Sends the retry hint and the current snapshot, then keeps the socket
+        (now non-blocking) for broadcasts. Returns False (socket not kept by
+        the hub) when the hub is full or the first write fails. The snapshot
+        goes out under the lock so no broadcast slips in between; a fresh
+        socket's empty send buffer takes it at once, so this never blocks.
+        """
+        if self.snapshot is None:
+            self._poll()
+        with self._lock:
+            if len(self._subs) >= self.max_subscribers:
+                return False
+            frame = f"retry: {RETRY_MS}\n\n".encode("utf-8") + _frame("snapshot", self.version, self.snapshot or {})
+            try:
+                sock.setblocking(False)
+            except OSError:
+                return False
+            if not _send_now(sock, frame):
+                return False
+            self._subs.add(sock)
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="quote-stream", daemon=True)
+                self._thread.start()
+        return True
+
+    def _broadcast(self, frame: bytes):
+        # Only the publisher thread broadcasts; the lock guards the set, not the writes
+        with self._lock:
+            subs = list(self._subs)
+        slow = [sock for sock in subs if not _send_now(sock, frame)]
+        with self._lock:
+            for sock in slow:
+                self._subs.discard(sock)
+            self.stats["dropped"] += len(slow)
+            self.stats["frames"] += 1
+            self.stats["bytes"] += len(frame) * (len(subs) - len(slow))
+        for sock in slow:
+            _close(sock)
+
+    def _run(self):
+        last_sent = time.monotonic()
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                if not self._subs:
+                    self._thread = None
+                    return
+            changed = self._poll()
+            if changed:
+                self._broadcast(_frame("quote", self.version, changed))
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= self.heartbeat:
+                self._broadcast(b": ping\n\n")
+                last_sent = time.monotonic()
+        with self._lock:
+            self._thread = None
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            subs, self._subs = list(self._subs), set()
+            thread = self._thread
+        for sock in subs:
+            _close(sock)
+        if thread is not None:
+            thread.join(timeout=self.interval + 1)
+
+
+def _spot_source():
+    try:
+        from . import spot
+    except Exception:
+        from api import spot
+    return spot.current()
+
+
+_HUB = {"hub": None}
+_HUB_LOCK = threading.Lock()
+
+
+def quote_hub() -> QuoteHub:
+    if _HUB["hub"] is None:
+        with _HUB_LOCK:
+            if _HUB["hub"] is None:
+                _HUB["hub"] = QuoteHub(_spot_source)
+    return _HUB["hub"]
+
+
+def close_hub():
+    with _HUB_LOCK:
+        hub, _HUB["hub"] = _HUB["hub"], None
+    if hub is not None:
+        hub.close()
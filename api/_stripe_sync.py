@@ -0,0 +1,311 @@
+import json
+import os
+import time
+import hmac
+import hashlib
+
+# Import fallback to avoid Vercel module-path edge cases
+try:
+    from ._auth import upsert_users_batch, update_users_by_customer_batch
+except Exception:
+    from api._auth import upsert_users_batch, update_users_by_customer_batch
+
+
+# Subscription statuses that keep the paid tier
+ACTIVE_STATUSES = ("active", "trialing")
+
+TIER_RANK = {"free": 0, "pro": 1, "elite": 2}
+
+SUBSCRIPTION_EVENTS = (
+    "customer.subscription.created",
+    "customer.subscription.updated",
+    "customer.subscription.deleted",
+)
+
+# Max events applied per drain (one users write + one stripe_events write)
+DRAIN_LIMIT = 500
+
+
+# ----------------------------
+# Stripe helpers (stdlib only; the stripe SDK is never imported here)
+# ----------------------------
+# Price → tier mapping (set these env vars in Vercel):
+# STRIPE_PRICE_PRO, STRIPE_PRICE_ELITE, plus the checkout price ids
+# STRIPE_PRICE_ID_{PRO,ELITE}_{MONTHLY,YEARLY} used by create_checkout_session
+
+def _price_ids(plan: str):
+    names = [
+        f"STRIPE_PRICE_{plan}",
+        f"STRIPE_PRICE_ID_{plan}_MONTHLY",
+        f"STRIPE_PRICE_ID_{plan}_YEARLY",
+    ]
+    return {v for v in (os.getenv(n, "").strip() for n in names) if v}
+
+
+def tier_from_price_id(price_id: str) -> str:
+    if price_id and price_id in _price_ids("ELITE"):
+        return "elite"
+    if price_id and price_id in _price_ids("PRO"):
+        return "pro"
+    return "free"
+
+
+def verify_stripe_signature(payload: bytes, sig_header: str, secret: str, tolerance: int = 300) -> bool:
+    """
+    Checks a Stripe-Signature header (t=<ts>,v1=<hex hmac>[,v1=...]) the same
+    way stripe.Webhook.construct_event does, without importing the SDK.
+    """
+    if not (payload is not None and sig_header and secret):
+        return False
+
+    ts = None
+    sigs = []
+    for part in sig_header.split(","):
+        k, _, v = part.strip().partition("=")
+        if k == "t":
+            ts = v
+        elif k == "v1":
+            sigs.append(v)
+
+    try:
+        ts_int = int(ts)
+    except Exception:
+        return False
+    if not sigs:
+        return False
+    if tolerance and abs(int(time.time()) - ts_int) > tolerance:
+        return False
+
+    signed = ts.encode("utf-8") + b"." + payload
+    expected = hmac.new(secret.encode("utf-8"), signed, hashlib.sha256).hexdigest()
+    return any(hmac.compare_digest(expected, s) for s in sigs)
+
+
+# ----------------------------
+# DB bootstrap
+# ----------------------------
+def ensure_stripe_events_table(conn):
+    """
+    Append-only log of Stripe events, deduplicated by event id.
+    applied_at is null until the event's tier change has been written to users.
+    """
+    cur = conn.cursor()
+    cur.execute(
+        """
+        create table if not exists stripe_events (
+          id text primary key,
+          type text not null,
+          created timestamptz not null,
+          payload jsonb not null,
+          received_at timestamptz not null default now(),
+          applied_at timestamptz null
+        );
+        """
+    )
+    cur.execute(
+        "create index if not exists stripe_events_pending_idx on stripe_events (created) where applied_at is null;"
+    )
+    conn.commit()
+
+
+def record_event(conn, event: dict) -> bool:
+    """
+    Inserts the event unless its id was already seen. Returns True for a new event.
+    Does not commit.
+    """
+    cur = conn.cursor()
+    cur.execute(
+        """
+        insert into stripe_events (id, type, created, payload)
+        values (%s, %s, to_timestamp(%s), %s::jsonb)
+        on conflict (id) do nothing
+        returning id
+        """,
+        (
+            event["id"],
+            event.get("type") or "",
+            int(event.get("created") or 0),
+            json.dumps(event, separators=(",", ":")),
+        ),
+    )
+    return cur.fetchone() is not None
+
+
+# ----------------------------
+# Event → tier change
+# ----------------------------
+def _id_of(v):
+    # Stripe fields may be an id string or an expanded object
+    if isinstance(v, dict):
+        return v.get("id")
+    return v or None
+
+
+def _plan_tier(metadata) -> str:
+    plan = ((metadata or {}).get("plan") or "").strip().lower()
+    return plan if plan in ("pro", "elite") else "free"
+
+
+def subscription_change(sub: dict, ts: int = 0, deleted: bool = False):
+    """
+    Returns {"key", "email", "customer", "tier", "status", "ts"} for a Stripe
+    subscription object, or None when it can't be tied to a user.
+    """
+    customer = _id_of(sub.get("customer"))
+    cust_obj = sub.get("customer") if isinstance(sub.get("customer"), dict) else {}
+    metadata = sub.get("metadata") or {}
+    email = (metadata.get("email") or cust_obj.get("email") or "").strip() or None
+
+    if not (customer or email):
+        return None
+
+    status = (sub.get("status") or "").lower()
+
+    tier = "free"
+    for item in ((sub.get("items") or {}).get("data") or []):
+        price_id = _id_of((item or {}).get("price"))
+        t = tier_from_price_id(price_id)
+        if TIER_RANK[t] > TIER_RANK[tier]:
+            tier = t
+    if tier == "free":
+        tier = _plan_tier(metadata)
+
+    if deleted or status not in ACTIVE_STATUSES:
+        tier = "free"
+
+    return {
+        "key": customer or email,
+        "email": email,
+        "customer": customer,
+        "tier": tier,
+        "status": status or ("canceled" if deleted else "inactive"),
+        "ts": int(ts or sub.get("created") or 0),
+    }
+
+
+def change_from_event(event: dict):
+    etype = event.get("type") or ""
+    obj = ((event.get("data") or {}).get("object")) or {}
+    ts = int(event.get("created") or 0)
+
+    if etype == "checkout.session.completed":
+        if (obj.get("mode") or "") != "subscription":
+            return None
+        details = obj.get("customer_details") or {}
+        email = (details.get("email") or obj.get("customer_email") or "").strip() or None
+        customer = _id_of(obj.get("customer"))
+        if not (customer or email):
+            return None
+        return {
+            "key": customer or email,
+            "email": email,
+            "customer": customer,
+            "tier": _plan_tier(obj.get("metadata")),
+            "status": "active",
+            "ts": ts,
+        }
+
+    if etype in SUBSCRIPTION_EVENTS:
+        return subscription_change(obj, ts=ts, deleted=(etype == "customer.subscription.deleted"))
+
+    return None
+
+
+def collapse_changes(changes):
+    """
+    Keeps only the newest change per user key, so a burst of events for one
+    customer turns into a single row in the batch.
+    """
+    latest = {}
+    for ch in changes:
+        if not ch:
+            continue
+        prev = latest.get(ch["key"])
+        if prev is None or ch["ts"] >= prev["ts"]:
+            if prev and not ch["email"]:
+                ch = dict(ch, email=prev["email"])
+            latest[ch["key"]] = ch
+    return list(latest.values())
+
+
+def apply_changes(conn, changes) -> int:
+    """
+    Writes collapsed changes with at most two statements (by email / by customer).
+    A change older than the user's last applied event is skipped.
+    Does not commit.
+    """
+    changes = collapse_changes(changes)
+
+    with_email = [(c["email"], c["customer"], c["tier"], c["status"], c["ts"]) for c in changes if c["email"]]
+    by_customer = [(c["customer"], c["tier"], c["status"], c["ts"]) for c in changes if not c["email"]]
+
+    written = 0
+    written += upsert_users_batch(conn, with_email, commit=False)
+    written += update_users_by_customer_batch(conn, by_customer, commit=False)
+    return written
+
+
+def _known_customers(conn, customers) -> set:
+    if not customers:
+        return set()
+    cur = conn.cursor()
+    cur.execute(
+        "select stripe_customer_id from users where stripe_customer_id = any(%s)",
+        (list(customers),),
+    )
+    return {r[0] for r in (cur.fetchall() or [])}
+
+
+def drain_pending(conn, limit: int = DRAIN_LIMIT):
+    """
+    Applies every not-yet-applied event (oldest first) in one batch.
+    Concurrent drains skip each other's locked rows, so a burst of webhook
+    deliveries collapses into one users write. Does not commit.
+
+    An event that only carries a customer id nobody has yet (the
+    subscription event raced ahead of checkout.session.completed) stays
+    pending and is applied by a later drain once the customer is linked.
+    Events already superseded by a newer one count as applied.
+    Returns (events_applied, users_written).
+    """
+    cur = conn.cursor()
+    cur.execute(
+        """
+        select id, payload
+        from stripe_events
+        where applied_at is null
+        order by created asc, id asc
+        limit %s
+        for update skip locked
+        """,
+        (int(limit),),
+    )
+    rows = cur.fetchall() or []
+    if not rows:
+        return 0, 0
+
+    changes = []
+    keys = []
+    for _id, payload in rows:
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        ch = change_from_event(payload or {})
+        changes.append(ch)
+        keys.append(ch["key"] if ch else None)
+
+    collapsed = {c["key"]: c for c in collapse_changes(changes)}
+    customer_only = {k for k, c in collapsed.items() if not c["email"]}
+
+    written = apply_changes(conn, changes)
+
+    known = _known_customers(conn, customer_only)
+    applied = [
+        r[0] for r, key in zip(rows, keys)
+        if key is None or key not in customer_only or key in known
+    ]
+    if applied:
+        cur.execute(
+            "update stripe_events set applied_at = now() where id = any(%s)",
+            (applied,),
+        )
+    return len(applied), written
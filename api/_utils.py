@@ -1,16 +1,49 @@
 import json
 import os
-import ssl
+import sys
+import threading
 import time
-import base64
-import hmac
-import hashlib
 from urllib.parse import urlparse, parse_qsl
 
-import pg8000.dbapi
-
-
-def _pick_database_url() -> str:
+# Kept deliberately slim: every endpoint imports this module on cold start.
+# pg8000/ssl are imported inside db_connect() so DB-less endpoints never pay
+# for them. Auth/entitlement helpers live in _auth.py, Stripe in _stripe_sync.py.
+
+
+# ---- Connection routing
+#
+#   db_connect()  /  db_connect("write")   writes, DDL, advisory locks, migrations
+#   db_connect("read")                     read-only paths (history, vault GET, tier lookups)
+#
+# "write" uses the direct (unpooled) endpoint: DATABASE_URL_DIRECT,
+# DATABASE_URL_UNPOOLED (Neon) or POSTGRES_URL_NON_POOLING (Vercel), else the
+# shared URL. "read" uses DATABASE_REPLICA_URL (a read replica) when set, else
+# the shared URL, which is the pooled endpoint on Neon / Vercel. With none of
+# the role-specific variables set, both roles use the shared URL, as before.
+#
+# Staleness guard: a replica connection checks its replay lag (at most every
+# REPLICA_LAG_CHECK_SECONDS per process). While the lag is over
+# REPLICA_MAX_LAG_SECONDS, or can't be read, reads go to the shared URL.
+
+try:
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "30") or "30")
+    REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "10") or "10")
+except Exception:
+    REPLICA_MAX_LAG_SECONDS, REPLICA_LAG_CHECK_SECONDS = 30.0, 10.0
+
+# 0 on a primary, or on a replica that has replayed everything it received
+_LAG_SQL = """
+    SELECT CASE
+      WHEN NOT pg_is_in_recovery() THEN 0
+      WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+      ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END;
+"""
+
+_REPLICA = {"checked": None, "fresh": True, "lag": None}
+
+
+def _shared_database_url() -> str:
     """
     Supports common env var names across Neon + Vercel.
     """
@@ -24,12 +57,90 @@ def _pick_database_url() -> str:
     )
 
 
-def db_connect():
+def _pick_database_url(role: str = "write") -> str:
+    if role == "read":
+        return os.getenv("DATABASE_REPLICA_URL") or _shared_database_url()
+    if role != "write":
+        raise ValueError(f"Unknown database role: {role}")
+    return (
+        os.getenv("DATABASE_URL_DIRECT")
+        or os.getenv("DATABASE_URL_UNPOOLED")
+        or os.getenv("POSTGRES_URL_NON_POOLING")
+        or _shared_database_url()
+    )
+
+
+def db_read_routed() -> bool:
+    """
+    Whether reads and writes go to different URLs, i.e. a db_connect("read")
+    connection may not see this request's writes or allow any of its own.
+    """
+    return _pick_database_url("read") != _pick_database_url("write")
+
+
+_ENSURED = set()
+
+
+def ensure_for_read(conn, ensure):
+    """
+    Runs a table's ensure_*(conn) for a read-only request: on the request's
+    own connection as before, or, when reads are routed (a replica can't run
+    DDL), once per process on a write connection.
+    """
+    if not db_read_routed():
+        return ensure(conn)
+    if ensure in _ENSURED:
+        return None
+    wconn = db_connect("write")
+    try:
+        ensure(wconn)
+    finally:
+        try:
+            wconn.close()
+        except Exception:
+            pass
+    _ENSURED.add(ensure)
+    return None
+
+
+def _replica_fresh(conn) -> bool:
+    """
+    Staleness guard for a connection to DATABASE_REPLICA_URL; the verdict is
+    reused for REPLICA_LAG_CHECK_SECONDS.
+    """
+    now = time.monotonic()
+    checked = _REPLICA["checked"]
+    if checked is not None and now - checked < REPLICA_LAG_CHECK_SECONDS:
+        return _REPLICA["fresh"]
+    try:
+        cur = conn.cursor()
+        cur.execute(_LAG_SQL)
+        lag = float(cur.fetchone()[0] or 0)
+        conn.rollback()
+    except Exception:
+        lag = None
+    fresh = lag is not None and lag <= REPLICA_MAX_LAG_SECONDS
+    _REPLICA.update({"checked": now, "fresh": fresh, "lag": lag})
+    return fresh
+
+
+def replica_state() -> dict:
+    """
+    Last staleness-guard verdict of this process (for diagnostics).
+    """
+    return {
+        "configured": bool(os.getenv("DATABASE_REPLICA_URL")),
+        "fresh": _REPLICA["fresh"],
+        "lag_seconds": _REPLICA["lag"],
+        "max_lag_seconds": REPLICA_MAX_LAG_SECONDS,
+    }
+
+
+def _db_open(url: str, timeout: float = 10):
     """
     Connect to Postgres (Neon) using pg8000 (pure Python).
     Enforces SSL when sslmode=require or when host looks like Neon.
     """
-    url = _pick_database_url()
     if not url:
         raise RuntimeError(
             "Missing database URL. Set DATABASE_URL (recommended) or POSTGRES_URL in Vercel Environment Variables."
@@ -50,6 +161,9 @@ def db_connect():
     if not (user and host and database):
         raise RuntimeError("Invalid DATABASE_URL/POSTGRES_URL: missing user/host/db name.")
 
+    import ssl
+    import pg8000.dbapi
+
     sslmode = (query.get("sslmode") or "").lower()
 
     # Neon requires TLS; many Neon URLs include sslmode=require. We enforce SSL if:
@@ -67,139 +181,389 @@ def db_connect():
         port=port,
         database=database,
         ssl_context=ssl_ctx,
-        timeout=10,
+        timeout=timeout,
     )
 
 
-def send_json(handler, status: int, payload: dict):
-    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
-    handler.send_response(status)
-    handler.send_header("Content-Type", "application/json; charset=utf-8")
-    handler.send_header("Cache-Control", "no-store")
-    handler.send_header("Content-Length", str(len(body)))
-    handler.end_headers()
-    handler.wfile.write(body)
+# ---- Optional per-process connection pool
+#
+# Off by default (every db_connect() opens a fresh connection, as before).
+# Long-lived processes (api/router.py, the self-hosted server) turn it on with
+# enable_db_pool(); DB_POOL_SIZE=<n> turns it on for every function.
+# Handlers don't change: conn.close() on a pooled connection returns it.
+# Idle connections are kept per URL, up to `size` each.
+
+try:
+    DB_POOL_MAX_IDLE_SECONDS = float(os.getenv("DB_POOL_MAX_IDLE_SECONDS", "240") or "240")
+except Exception:
+    DB_POOL_MAX_IDLE_SECONDS = 240.0
+
+_POOL = {"size": 0, "idle": {}}  # idle: {url: [(raw_conn, released_at), ...]}
+_POOL_LOCK = threading.Lock()
+
+
+class _PooledConnection:
+    """
+    Thin proxy over a pg8000 connection whose close() hands it back to the pool.
+    """
+
+    def __init__(self, raw, url):
+        self._raw = raw
+        self._url = url
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        _pool_release(self._raw, self._url)
+
+
+def enable_db_pool(size: int = 4):
+    with _POOL_LOCK:
+        _POOL["size"] = max(0, int(size))
+
+
+def close_db_pool():
+    with _POOL_LOCK:
+        idle, _POOL["idle"] = _POOL["idle"], {}
+    for raw, _ in [c for conns in idle.values() for c in conns]:
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+
+def _pool_release(raw, url):
+    # Never hand out a connection mid-transaction
+    try:
+        raw.rollback()
+    except Exception:
+        try:
+            raw.close()
+        except Exception:
+            pass
+        return
+
+    with _POOL_LOCK:
+        idle = _POOL["idle"].setdefault(url, [])
+        if len(idle) < _POOL["size"]:
+            idle.append((raw, time.monotonic()))
+            return
+    try:
+        raw.close()
+    except Exception:
+        pass
+
+
+def _pool_acquire(url):
+    now = time.monotonic()
+    while True:
+        with _POOL_LOCK:
+            idle = _POOL["idle"].get(url)
+            if not idle:
+                return None
+            raw, released_at = idle.pop()
+        # Neon suspends idle computes; don't reuse a socket that has likely been dropped
+        if now - released_at <= DB_POOL_MAX_IDLE_SECONDS:
+            return raw
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+
+class _CountingCursor:
+    # Only used with METRICS_ENABLED: counts statements per instance
+    def __init__(self, raw):
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
 
+    def __iter__(self):
+        return iter(self._raw)
 
-# =============================================================================
-# Step 1 (Stripe tier gating) helpers
-# =============================================================================
+    def execute(self, *args, **kwargs):
+        _metrics.incr("db:queries")
+        return self._raw.execute(*args, **kwargs)
 
-# Required env var for signing login tokens (set in Vercel):
-# AUTH_SECRET = long random string
-_AUTH_SECRET = os.getenv("AUTH_SECRET", "").encode("utf-8")
 
+class _CountingConnection:
+    def __init__(self, conn):
+        self._conn = conn
 
-def ensure_users_table(conn):
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self):
+        return _CountingCursor(self._conn.cursor())
+
+
+def _checkout(url: str, timeout: float = 10):
+    if _POOL["size"] <= 0:
+        conn = _db_open(url, timeout)
+        if METRICS_ENABLED:
+            _metrics.incr("db:connects")
+        return conn
+    raw = _pool_acquire(url)
+    if raw is None:
+        raw = _db_open(url, timeout)
+        if METRICS_ENABLED:
+            _metrics.incr("db:connects")
+    return _PooledConnection(raw, url)
+
+
+def _replica_checkout(replica: str, timeout: float = 10):
     """
-    Stores subscription tier entitlements.
+    A connection to the replica while the staleness guard allows it, else
+    None. A replica known to be stale (verdict younger than
+    REPLICA_LAG_CHECK_SECONDS) is not connected to at all; an unreachable one
+    counts as stale until the next check.
     """
-    cur = conn.cursor()
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-          email TEXT PRIMARY KEY,
-          stripe_customer_id TEXT,
-          tier TEXT NOT NULL DEFAULT 'free',
-          status TEXT NOT NULL DEFAULT 'inactive',
-          updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
-        )
-        """
-    )
-    conn.commit()
-
-
-def upsert_user(conn, email: str, stripe_customer_id: str, tier: str, status: str):
-    tier = (tier or "free").lower()
-    if tier not in ("free", "pro", "elite"):
-        tier = "free"
-
-    status = (status or "inactive").lower()
-
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO users (email, stripe_customer_id, tier, status, updated_at)
-        VALUES (%s, %s, %s, %s, now())
-        ON CONFLICT (email) DO UPDATE SET
-          stripe_customer_id = EXCLUDED.stripe_customer_id,
-          tier = EXCLUDED.tier,
-          status = EXCLUDED.status,
-          updated_at = now()
-        """,
-        (email, stripe_customer_id, tier, status),
-    )
-    conn.commit()
+    checked = _REPLICA["checked"]
+    if checked is not None and not _REPLICA["fresh"] and time.monotonic() - checked < REPLICA_LAG_CHECK_SECONDS:
+        return None
+    try:
+        conn = _checkout(replica, timeout)
+    except Exception:
+        _REPLICA.update({"checked": time.monotonic(), "fresh": False, "lag": None})
+        return None
+    if _replica_fresh(conn):
+        return conn
+    try:
+        conn.close()
+    except Exception:
+        pass
+    return None
 
 
-def get_user_tier(conn, email: str) -> str:
-    cur = conn.cursor()
-    cur.execute("SELECT tier FROM users WHERE email = %s", (email,))
-    row = cur.fetchone()
-    if not row or not row[0]:
-        return "free"
-    t = (row[0] or "free").lower()
-    return t if t in ("free", "pro", "elite") else "free"
+def db_connect(role: str = "write", timeout: float = 10):
+    """
+    Returns a DB connection for `role` ("write" or "read", see Connection
+    routing above); reuses a pooled one when enable_db_pool() is on.
+    timeout (seconds) bounds the connect and every later socket read.
+    """
+    url = _pick_database_url(role)
+    replica = os.getenv("DATABASE_REPLICA_URL")
+    if role == "read" and replica and url == replica:
+        conn = _replica_checkout(replica, timeout)
+        if conn is None:
+            conn = _checkout(_shared_database_url(), timeout)
+            if METRICS_ENABLED:
+                _metrics.incr("db:replica_fallbacks")
+    else:
+        conn = _checkout(url, timeout)
+
+    if METRICS_ENABLED:
+        _metrics.incr("db:checkouts")
+        return _CountingConnection(conn)
+    return conn
+
+
+try:
+    if int(os.getenv("DB_POOL_SIZE", "0") or "0") > 0:
+        enable_db_pool(int(os.getenv("DB_POOL_SIZE")))
+except Exception:
+    pass
+
+
+# ---- Per-phase request timing
+#
+#   with span(self, "db_connect"):
+#       conn = db_connect()
+#
+# With REQUEST_TIMING=1, send_json adds a Server-Timing header
+# (db_connect;dur=12.3, ..., total;dur=...) and writes one JSON line per
+# request to stderr. With METRICS_ENABLED=1 the same spans feed the
+# histograms in _metrics.py. Both off (the default), span() returns a shared
+# no-op and send_json skips all of it.
+
+TIMING_ENABLED = (os.getenv("REQUEST_TIMING") or "").strip().lower() in ("1", "true", "yes", "on")
+METRICS_ENABLED = (os.getenv("METRICS_ENABLED") or "").strip().lower() in ("1", "true", "yes", "on")
+_TRACK = TIMING_ENABLED or METRICS_ENABLED
+
+if METRICS_ENABLED:
+    try:
+        from . import _metrics
+    except Exception:
+        from api import _metrics
+else:
+    _metrics = None
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
 
 
-# ---- Token signing (stdlib only; no extra deps)
+class _Timing:
+    __slots__ = ("t0", "spans")
 
-def _b64url(b: bytes) -> str:
-    return base64.urlsafe_b64encode(b).decode("utf-8").rstrip("=")
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.spans = []
 
 
-def _b64url_decode(s: str) -> bytes:
-    pad = "=" * ((4 - len(s) % 4) % 4)
-    return base64.urlsafe_b64decode((s + pad).encode("utf-8"))
+class _Span:
+    __slots__ = ("timing", "name", "start")
 
+    def __init__(self, timing, name):
+        self.timing = timing
+        self.name = name
 
-def sign_token(payload: dict, days: int = 30) -> str:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timing.spans.append((self.name, time.perf_counter() - self.start))
+        return False
+
+
+def start_timing(handler):
     """
-    Creates a compact signed token: base64url(json).base64url(hmac)
+    Marks the start of a request (total;dur is measured from here). Optional:
+    the first span() starts the clock if this isn't called.
     """
-    if not _AUTH_SECRET:
-        raise RuntimeError("AUTH_SECRET env var is missing")
+    if _TRACK:
+        handler._timing = _Timing()
 
-    p = dict(payload or {})
-    p["exp"] = int(time.time()) + int(days) * 24 * 3600
 
-    body = _b64url(json.dumps(p, separators=(",", ":")).encode("utf-8"))
-    sig = hmac.new(_AUTH_SECRET, body.encode("utf-8"), hashlib.sha256).digest()
-    return body + "." + _b64url(sig)
+def span(handler, name: str):
+    if not _TRACK:
+        return _NOOP_SPAN
+    timing = getattr(handler, "_timing", None)
+    if timing is None:
+        timing = handler._timing = _Timing()
+    return _Span(timing, name)
 
 
-def verify_token(token: str) -> dict:
+def _route_key(handler) -> str:
     """
-    Returns decoded payload dict if valid; otherwise returns None.
+    Metrics key of a request: the route api/router.py resolved ("latest"),
+    else the module of the handler class. Never the raw path, which is
+    unbounded and, behind the Vercel rewrite, /api/router for everything.
     """
-    try:
-        if not token or "." not in token or not _AUTH_SECRET:
-            return None
+    return getattr(handler, "metrics_route", None) or type(handler).__module__.rpartition(".")[2]
 
-        body, sig = token.split(".", 1)
-        expected = hmac.new(_AUTH_SECRET, body.encode("utf-8"), hashlib.sha256).digest()
-        if not hmac.compare_digest(_b64url(expected), sig):
-            return None
 
-        payload = json.loads(_b64url_decode(body).decode("utf-8"))
-        exp = int(payload.get("exp", 0) or 0)
-        if exp and exp < int(time.time()):
-            return None
+def _finish_timing(handler, status: int):
+    """
+    Returns the Server-Timing header value (or None), logs the request line
+    and feeds metrics. Resets the handler's timing (keep-alive connections
+    reuse the instance).
+    """
+    timing = getattr(handler, "_timing", None)
+    handler._timing = None
+    if timing is None:
+        return None
 
-        return payload
-    except Exception:
+    total_ms = (time.perf_counter() - timing.t0) * 1000.0
+    phases = {}
+    for name, dur in timing.spans:
+        phases[name] = phases.get(name, 0.0) + dur * 1000.0
+
+    path = urlparse(getattr(handler, "path", "") or "").path
+    route = _route_key(handler)
+
+    if METRICS_ENABLED:
+        _metrics.observe("route", route, total_ms)
+        for name, ms in phases.items():
+            _metrics.observe("span", f"{route}:{name}", ms)
+            if name.startswith("upstream"):
+                _metrics.observe("upstream", name, ms)
+
+    if not TIMING_ENABLED:
         return None
 
+    try:
+        sys.stderr.write(
+            json.dumps(
+                {
+                    "ts": round(time.time(), 3),
+                    "method": getattr(handler, "command", None),
+                    "path": path,
+                    "route": route,
+                    "status": status,
+                    "total_ms": round(total_ms, 2),
+                    "spans": {k: round(v, 2) for k, v in phases.items()},
+                },
+                separators=(",", ":"),
+            )
+            + "\n"
+        )
+    except Exception:
+        pass
+
+    parts = [f"{k};dur={v:.2f}" for k, v in phases.items()]
+    parts.append(f"total;dur={total_ms:.2f}")
+    return ", ".join(parts)
+
+
+class RawJSON(str):
+    """
+    Already-encoded JSON text (e.g. a json_agg(...)::text column) that
+    send_json splices in verbatim as a top-level payload value, instead of
+    decoding it into Python objects and encoding it again.
+    """
+    __slots__ = ()
+
+
+def _encode(payload: dict) -> bytes:
+    if not any(type(v) is RawJSON for v in payload.values()):
+        return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    parts = []
+    for k, v in payload.items():
+        value = v if type(v) is RawJSON else json.dumps(v, ensure_ascii=False)
+        parts.append(f"{json.dumps(str(k), ensure_ascii=False)}: {value}")
+    return ("{" + ", ".join(parts) + "}").encode("utf-8")
+
 
-# ---- Stripe price → tier mapping (set these env vars in Vercel)
-# STRIPE_PRICE_PRO, STRIPE_PRICE_ELITE
+def send_json(handler, status: int, payload: dict):
+    if _TRACK:
+        with span(handler, "encode"):
+            body = _encode(payload)
+        server_timing = _finish_timing(handler, status)
+    else:
+        body = _encode(payload)
+        server_timing = None
+
+    handler.send_response(status)
+    handler.send_header("Content-Type", "application/json; charset=utf-8")
+    handler.send_header("Cache-Control", "no-store")
+    handler.send_header("Content-Length", str(len(body)))
+    if server_timing:
+        handler.send_header("Server-Timing", server_timing)
+    handler.end_headers()
+    handler.wfile.write(body)
 
-def tier_from_price_id(price_id: str) -> str:
-    pro = os.getenv("STRIPE_PRICE_PRO", "").strip()
-    elite = os.getenv("STRIPE_PRICE_ELITE", "").strip()
+    if METRICS_ENABLED:
+        _metrics.maybe_flush()
 
-    if price_id and elite and price_id == elite:
-        return "elite"
-    if price_id and pro and price_id == pro:
-        return "pro"
-    return "free"
+
+def upstream_base(name: str, default: str) -> str:
+    """
+    Base URL for an upstream; <NAME>_BASE_URL overrides it (e.g. point
+    STOOQ_BASE_URL at bench/stubs.py to inject latency and faults locally).
+    """
+    return (os.getenv(f"{name}_BASE_URL") or default).strip().rstrip("/")
+
+
+def record_cache(cache: str, hit: bool):
+    """
+    Counts a hit/miss for an in-memory cache (no-op unless METRICS_ENABLED).
+    """
+    if METRICS_ENABLED:
+        _metrics.cache_event(cache, hit)
@@ -0,0 +1,278 @@
+# api/alerts.py
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+try:
+    from ._utils import db_connect, ensure_for_read, send_json, span, start_timing
+    from ._auth import resolve_entitlements, sign_entitlement_token
+    from ._alerts import METRICS, OPS, MAX_RULES_PER_USER, ensure_alert_tables
+    from ._profiler import profiled
+    from .vault_items import (
+        _clamp, _get_bearer_token, _get_entitlement_token, _num, _read_json_body, _safe_str, _verify_clerk_jwt,
+    )
+except Exception:
+    from api._utils import db_connect, ensure_for_read, send_json, span, start_timing
+    from api._auth import resolve_entitlements, sign_entitlement_token
+    from api._alerts import METRICS, OPS, MAX_RULES_PER_USER, ensure_alert_tables
+    from api._profiler import profiled
+    from api.vault_items import (
+        _clamp, _get_bearer_token, _get_entitlement_token, _num, _read_json_body, _safe_str, _verify_clerk_jwt,
+    )
+
+# Alert rules for the Elite "alerts" feature. Evaluation happens on every
+# price tick in api/_alerts.py; this endpoint only manages rules and shows
+# what fired.
+#
+#   GET  /api/alerts                          -> {rules: [...], recent: [...]}
+#   POST /api/alerts {action: "create", metric, op, threshold, note?}
+#   POST /api/alerts {action: "delete", id}
+#   POST /api/alerts {action: "update", id, active?, threshold?, note?}
+
+
+def _rule_json(r):
+    return {
+        "id": str(r[0]),
+        "metric": r[1],
+        "op": r[2],
+        "threshold": float(r[3]),
+        "note": r[4] or "",
+        "active": bool(r[5]),
+        "last_fired_at": r[6].isoformat() if r[6] else None,
+        "created_at": r[7].isoformat() if r[7] else None,
+    }
+
+
+def _authenticate(req):
+    """
+    Returns (auth, error_response_args).
+    """
+    token = _get_bearer_token(req.headers)
+    if not token:
+        return None, (401, {"ok": False, "error": "Missing Bearer token"})
+    try:
+        with span(req, "auth"):
+            return _verify_clerk_jwt(token), None
+    except Exception as e:
+        return None, (401, {"ok": False, "error": f"Unauthorized: {str(e)}"})
+
+
+def _entitled(req, auth, conn):
+    """
+    Returns (ent, error_response_args); the caller must be on a tier with
+    the "alerts" feature.
+    """
+    email = _safe_str(auth["claims"].get("email"), 320) or None
+    try:
+        with span(req, "entitlements"):
+            ent = resolve_entitlements(
+                token=_get_entitlement_token(req.headers), email=email, conn=conn, user_id=auth["sub"]
+            )
+    except Exception:
+        ent = resolve_entitlements()
+    if not ent["features"].get("alerts"):
+        return ent, (403, {"ok": False, "error": "Alerts require the Elite tier", "tier": ent["tier"]})
+    return ent, None
+
+
+def _meta(ent, **extra):
+    meta = {"tier": ent["tier"], "features": ent["features"], **extra}
+    if ent["source"] == "db":
+        try:
+            meta["entitlement_token"] = sign_entitlement_token(ent["email"], ent["tier"], ent["ver"], user_id=ent["user_id"])
+        except Exception:
+            pass
+    return meta
+
+
+class handler(BaseHTTPRequestHandler):
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Headers", "authorization, content-type, x-entitlement-token")
+        self.send_header("Access-Control-Allow-Methods", "GET,POST,OPTIONS")
+        self.end_headers()
+
+    @profiled
+    def do_GET(self):
+        start_timing(self)
+        try:
+            qs = parse_qs(urlparse(self.path).query)
+            try:
+                recent_limit = _clamp(int(qs.get("recent", ["20"])[0] or "20"), 0, 200)
+            except Exception:
+                recent_limit = 20
+
+            auth, err = _authenticate(self)
+            if err:
+                return send_json(self, *err)
+            user_id = auth["sub"]
+
+            with span(self, "db_connect"):
+                conn = db_connect("read")
+            try:
+                ent, err = _entitled(self, auth, conn)
+                if err:
+                    return send_json(self, *err)
+
+                with span(self, "ensure_table"):
+                    ensure_for_read(conn, ensure_alert_tables)
+                cur = conn.cursor()
+                with span(self, "query"):
+                    cur.execute(
+                        """
+                        select id, metric, op, threshold, note, active, last_fired_at, created_at
+                        from alert_rules
+                        where user_id = %s
+                        order by created_at desc
+                        """,
+                        (user_id,),
+                    )
+                    rules = [_rule_json(r) for r in (cur.fetchall() or [])]
+
+                    recent = []
+                    if recent_limit:
+                        cur.execute(
+                            """
+                            select rule_id, metric, op, threshold, prev_value, value, fired_at, delivered_at
+                            from alert_outbox
+                            where user_id = %s
+                            order by fired_at desc
+                            limit %s
+                            """,
+                            (user_id, recent_limit),
+                        )
+                        recent = [
+                            {
+                                "rule_id": str(r[0]),
+                                "metric": r[1],
+                                "op": r[2],
+                                "threshold": float(r[3]),
+                                "prev_value": float(r[4]),
+                                "value": float(r[5]),
+                                "fired_at": r[6].isoformat() if r[6] else None,
+                                "delivered": r[7] is not None,
+                            }
+                            for r in (cur.fetchall() or [])
+                        ]
+
+                return send_json(
+                    self,
+                    200,
+                    {
+                        "ok": True,
+                        "rules": rules,
+                        "recent": recent,
+                        "meta": _meta(ent, count=len(rules), max_rules=MAX_RULES_PER_USER),
+                    },
+                )
+            finally:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+        except Exception as e:
+            return send_json(self, 500, {"ok": False, "error": str(e)})
+
+    @profiled
+    def do_POST(self):
+        start_timing(self)
+        try:
+            body = _read_json_body(self)
+            action = _safe_str(body.get("action"), 32).lower()
+            if action not in ("create", "delete", "update"):
+                return send_json(self, 400, {"ok": False, "error": "Invalid action"})
+
+            auth, err = _authenticate(self)
+            if err:
+                return send_json(self, *err)
+            user_id = auth["sub"]
+
+            with span(self, "db_connect"):
+                conn = db_connect()
+            try:
+                ent, err = _entitled(self, auth, conn)
+                if err:
+                    return send_json(self, *err)
+
+                with span(self, "ensure_table"):
+                    ensure_alert_tables(conn)
+                cur = conn.cursor()
+
+                if action == "create":
+                    metric = _safe_str(body.get("metric"), 32).lower()
+                    op = _safe_str(body.get("op"), 16).lower()
+                    threshold = _num(body.get("threshold"))
+                    note = _safe_str(body.get("note"), 180) or None
+
+                    if metric not in METRICS:
+                        return send_json(self, 400, {"ok": False, "error": f"metric must be one of {list(METRICS)}"})
+                    if op not in OPS:
+                        return send_json(self, 400, {"ok": False, "error": f"op must be one of {list(OPS)}"})
+                    if threshold is None or threshold <= 0:
+                        return send_json(self, 400, {"ok": False, "error": "threshold must be > 0"})
+
+                    # Per-user cap checked in the insert itself
+                    cur.execute(
+                        """
+                        insert into alert_rules (user_id, metric, op, threshold, note)
+                        select %s, %s, %s, %s, %s
+                        where (select count(*) from alert_rules where user_id = %s) < %s
+                        returning id, metric, op, threshold, note, active, last_fired_at, created_at
+                        """,
+                        (user_id, metric, op, float(threshold), note, user_id, MAX_RULES_PER_USER),
+                    )
+                    row = cur.fetchone()
+                    conn.commit()
+                    if not row:
+                        return send_json(
+                            self, 409, {"ok": False, "error": f"Rule limit reached ({MAX_RULES_PER_USER})"}
+                        )
+                    return send_json(self, 200, {"ok": True, "rule": _rule_json(row)})
+
+                rule_id = _safe_str(body.get("id"), 80)
+                if not rule_id:
+                    return send_json(self, 400, {"ok": False, "error": "Missing id"})
+
+                if action == "delete":
+                    cur.execute("delete from alert_rules where id = %s and user_id = %s", (rule_id, user_id))
+                    conn.commit()
+                    return send_json(self, 200, {"ok": True})
+
+                # UPDATE
+                sets = []
+                vals = []
+                if "active" in body:
+                    sets.append("active = %s")
+                    vals.append(bool(body.get("active")))
+                if "threshold" in body:
+                    threshold = _num(body.get("threshold"))
+                    if threshold is None or threshold <= 0:
+                        return send_json(self, 400, {"ok": False, "error": "threshold must be > 0"})
+                    sets.append("threshold = %s")
+                    vals.append(float(threshold))
+                if "note" in body:
+                    sets.append("note = %s")
+                    vals.append(_safe_str(body.get("note"), 180) or None)
+                if not sets:
+                    return send_json(self, 400, {"ok": False, "error": "Nothing to update"})
+
+                vals.extend([rule_id, user_id])
+                cur.execute(
+                    f"update alert_rules set {', '.join(sets)}, updated_at = now() where id = %s and user_id = %s",
+                    tuple(vals),
+                )
+                conn.commit()
+                return send_json(self, 200, {"ok": True})
+
+            finally:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+        except Exception as e:
+            return send_json(self, 500, {"ok": False, "error": str(e)})
+
+    def log_message(self, *_):
+        return
@@ -0,0 +1,108 @@
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import datetime
+
+# Import fallback to avoid Vercel module-path edge cases
+try:
+    from ._utils import db_connect, send_json, span, start_timing
+    from ._profiler import profiled
+    from ._gsr_index import read
+except Exception:
+    from api._utils import db_connect, send_json, span, start_timing
+    from api._profiler import profiled
+    from api._gsr_index import read
+
+
+# GET /api/analytics                      latest GSR + its percentile over all history
+#     ?date=YYYY-MM-DD                    GSR as of a date (last row on or before it)
+#     ?from=YYYY-MM-DD&to=YYYY-MM-DD      min / max / mean / change over a range (default: all)
+#     ?value=80                           percentile rank of an arbitrary ratio
+#
+# Served from the in-memory index in api/_gsr_index.py; each request costs one
+# index-only stamp query to detect gsr_daily changes plus O(log n) lookups.
+
+
+def _date_param(qs, name):
+    raw = (qs.get(name, [""])[0] or "").strip()
+    if not raw:
+        return None
+    return datetime.date.fromisoformat(raw)
+
+
+def _iso(stats):
+    if stats is None:
+        return None
+    out = dict(stats)
+    for k in ("from", "to"):
+        out[k] = out[k].isoformat()
+    out["min"] = {**out["min"], "date": out["min"]["date"].isoformat()}
+    out["max"] = {**out["max"], "date": out["max"]["date"].isoformat()}
+    return out
+
+
+class handler(BaseHTTPRequestHandler):
+    @profiled
+    def do_GET(self):
+        start_timing(self)
+        try:
+            qs = parse_qs(urlparse(self.path).query)
+            try:
+                at = _date_param(qs, "date")
+                start = _date_param(qs, "from")
+                end = _date_param(qs, "to")
+            except ValueError:
+                return send_json(self, 400, {"ok": False, "error": "Dates must be YYYY-MM-DD"})
+
+            value = None
+            raw_value = (qs.get("value", [""])[0] or "").strip()
+            if raw_value:
+                try:
+                    value = float(raw_value)
+                except ValueError:
+                    return send_json(self, 400, {"ok": False, "error": "value must be a number"})
+
+            def lookup(idx):
+                if not idx.n:
+                    return None
+                out = {
+                    "rows": idx.n,
+                    "latest": {
+                        "date": idx.dates[-1].isoformat(),
+                        "gsr": idx.values[-1],
+                        "percentile": idx.percentile(idx.values[-1]),
+                    },
+                    "range": _iso(idx.range_stats(start, end)),
+                }
+                if at is not None:
+                    hit = idx.as_of(at)
+                    out["as_of"] = {
+                        "requested": at.isoformat(),
+                        "date": hit[1].isoformat(),
+                        "gsr": hit[2],
+                        "percentile": idx.percentile(hit[2]),
+                    } if hit else None
+                if value is not None:
+                    out["value"] = {"gsr": value, "percentile": idx.percentile(value)}
+                return out
+
+            with span(self, "db_connect"):
+                conn = db_connect("read")
+            try:
+                with span(self, "index"):
+                    out, how = read(conn, lookup)
+            finally:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+            if out is None:
+                return send_json(self, 404, {"ok": False, "error": "No rows in gsr_daily yet"})
+
+            return send_json(self, 200, {"ok": True, **out, "index": how})
+
+        except Exception as e:
+            return send_json(self, 500, {"ok": False, "error": str(e)})
+
+    def log_message(self, format, *args):
+        return
@@ -4,7 +4,11 @@ from datetime import datetime, timezone
 import csv
 import os
 
-from api._utils import db_connect, send_json
+from api._utils import db_connect, send_json, start_timing
+from api._profiler import profiled
+from api._indicators import on_write
+from api._rollups import on_write as rollups_on_write
+from api._schema import upsert_daily
 
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
@@ -33,7 +37,9 @@ def _read_close_map(path: str):
 
 
 class handler(BaseHTTPRequestHandler):
+    @profiled
     def do_GET(self):
+        start_timing(self)
         try:
             qs = parse_qs(urlparse(self.path).query)
 
@@ -57,7 +63,18 @@ class handler(BaseHTTPRequestHandler):
                     "hint": "Provide Authorization: Bearer <CRON_SECRET> or ?secret=<CRON_SECRET>"
                 })
 
-            cursor = (qs.get("cursor", [""])[0] or "").strip()
+            # The cursor is "<next date>_<first date of the run>": it carries the
+            # run's start, so a client that only echoes next_cursor still gets
+            # the final recompute from the right day. A bare date cursor (older
+            # clients) takes `since` from the query, else the run is treated as
+            # starting at the first CSV date and the recompute covers it all
+            cursor, _, since = (qs.get("cursor", [""])[0] or "").strip().partition("_")
+            since = since or (qs.get("since", [""])[0] or "").strip()
+            if since:
+                try:
+                    since = datetime.strptime(since, "%Y-%m-%d").date().isoformat()
+                except ValueError:
+                    return send_json(self, 400, {"ok": False, "error": "since must be YYYY-MM-DD"})
             limit = int((qs.get("limit", ["500"])[0] or "500").strip())
             if limit < 50:
                 limit = 50
@@ -103,49 +120,46 @@ class handler(BaseHTTPRequestHandler):
                     "message": "No rows to process."
                 })
 
+            since = min(since, batch[0]) if since else common_dates[0]
+            next_cursor = None
+            if (start_idx + limit) < len(common_dates):
+                next_cursor = f"{common_dates[start_idx + limit]}_{since}"
+
             now_utc = datetime.now(timezone.utc).isoformat()
 
+            indicators = rollups = None
             conn = db_connect()
             try:
                 cur = conn.cursor()
-                for d in batch:
-                    g = gold[d]
-                    s = silver[d]
-                    if s == 0:
-                        continue
-                    gsr = g / s
-
-                    cur.execute(
-                        """
-                        insert into gsr_daily (d, gold_usd, silver_usd, gsr, fetched_at_utc, source)
-                        values (%s, %s, %s, %s, %s, %s)
-                        on conflict (d) do update
-                          set gold_usd = excluded.gold_usd,
-                              silver_usd = excluded.silver_usd,
-                              gsr = excluded.gsr,
-                              fetched_at_utc = excluded.fetched_at_utc,
-                              source = excluded.source
-                        """,
-                        (d, g, s, gsr, now_utc, "csv_backfill")
-                    )
+                upsert_daily(cur, [
+                    (d, gold[d], silver[d], gold[d] / silver[d], now_utc, "csv_backfill")
+                    for d in batch
+                    if silver[d] != 0
+                ])
 
                 conn.commit()
+
+                # Indicators and candles are recomputed once per run, on the last
+                # batch, from the earliest date written: per batch, each call
+                # would redo everything after it (quadratic over a full backfill)
+                if next_cursor is None:
+                    indicators = on_write(conn, since=since)
+                    rollups = rollups_on_write(conn, since=since)
             finally:
                 try:
                     conn.close()
                 except Exception:
                     pass
 
-            next_cursor = None
-            if (start_idx + limit) < len(common_dates):
-                next_cursor = common_dates[start_idx + limit]
-
             return send_json(self, 200, {
                 "ok": True,
                 "processed": len(batch),
                 "next_cursor": next_cursor,
+                "since": since,
                 "limit": limit,
                 "range": {"from": batch[0], "to": batch[-1]},
+                "indicators": indicators,
+                "rollups": rollups,
                 "note": "Call again with ?cursor=<next_cursor> until next_cursor is null."
             })
 
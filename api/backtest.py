@@ -0,0 +1,92 @@
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Import fallback to avoid Vercel module-path edge cases
+try:
+    from ._utils import db_connect, send_json, span, start_timing
+    from ._profiler import profiled
+    from ._backtest import GRID_KEYS, load_csv, load_db, normalize, run
+    from .vault_items import _read_json_body
+except Exception:
+    from api._utils import db_connect, send_json, span, start_timing
+    from api._profiler import profiled
+    from api._backtest import GRID_KEYS, load_csv, load_db, normalize, run
+    from api.vault_items import _read_json_body
+
+
+# Ratio-swap backtests (see api/_backtest.py)
+#
+#   GET  /api/backtest?enter=75,80,85&exit=50,55&fee_pct=0.5&premium_pct=0,2,4
+#        &start=gold|silver&from=2000-01-01&to=2025-12-31&top=5&source=db|csv&all=1
+#   POST /api/backtest {"enter": [75, 80], "exit": [50], ...}   same keys
+#
+# Every grid key takes one number or a list. Response: best run, equity
+# curves for the `top` runs, and with all=1 the stats of every run. Results
+# are cached on (parameter hash, data version); "cache" says where this one
+# came from.
+
+_KEYS = GRID_KEYS + ("start", "from", "to", "top", "source", "all")
+
+
+def _truthy(v) -> bool:
+    return str(v).strip().lower() in ("1", "true", "yes", "on")
+
+
+class handler(BaseHTTPRequestHandler):
+    def _respond(self, params):
+        source = str(params.pop("source", None) or "db").strip().lower()
+        if source not in ("db", "csv"):
+            return send_json(self, 400, {"ok": False, "error": "source must be 'db' or 'csv'"})
+        include_all = _truthy(params.pop("all", "0"))
+        try:
+            params = normalize(params)
+        except ValueError as e:
+            return send_json(self, 400, {"ok": False, "error": str(e)})
+
+        # Reads (series, shared cache) go to the read role; a write
+        # connection is opened only to store a freshly computed result
+        with span(self, "db_connect"):
+            conn = db_connect("read")
+        try:
+            with span(self, "load"):
+                series = load_db(conn) if source == "db" else load_csv()
+            if not series.dates:
+                return send_json(self, 404, {"ok": False, "error": "No rows in gsr_daily yet"})
+            with span(self, "backtest"):
+                try:
+                    out = run(series, params, conn=conn, connect_write=db_connect)
+                except ValueError as e:
+                    return send_json(self, 400, {"ok": False, "error": str(e)})
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+        if not include_all:
+            out = {k: v for k, v in out.items() if k != "results"}
+        return send_json(self, 200, {"ok": True, "source": source, **out})
+
+    @profiled
+    def do_GET(self):
+        start_timing(self)
+        try:
+            qs = parse_qs(urlparse(self.path).query)
+            params = {k: qs[k][0] for k in _KEYS if qs.get(k) and qs[k][0].strip()}
+            return self._respond(params)
+        except Exception as e:
+            return send_json(self, 500, {"ok": False, "error": str(e)})
+
+    @profiled
+    def do_POST(self):
+        start_timing(self)
+        try:
+            body = _read_json_body(self)
+            if not isinstance(body, dict):
+                return send_json(self, 400, {"ok": False, "error": "Body must be a JSON object"})
+            return self._respond({k: body[k] for k in _KEYS if body.get(k) is not None})
+        except Exception as e:
+            return send_json(self, 500, {"ok": False, "error": str(e)})
+
+    def log_message(self, format, *args):
+        return
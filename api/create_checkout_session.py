@@ -1,12 +1,13 @@
 from http.server import BaseHTTPRequestHandler
 import json
 import os
-import stripe
 
 try:
-    from ._utils import send_json
+    from ._utils import send_json, start_timing
+    from ._profiler import profiled
 except Exception:
-    from api._utils import send_json
+    from api._utils import send_json, start_timing
+    from api._profiler import profiled
 
 
 def _env(name: str) -> str:
@@ -17,8 +18,13 @@ def _env(name: str) -> str:
 
 
 class handler(BaseHTTPRequestHandler):
+    @profiled
     def do_POST(self):
+        start_timing(self)
         try:
+            # Lazy: the stripe SDK is the heaviest import in the project (~100 ms cold)
+            import stripe
+
             stripe.api_key = _env("STRIPE_SECRET_KEY")
 
             length = int(self.headers.get("content-length", "0") or "0")
@@ -55,6 +61,7 @@ class handler(BaseHTTPRequestHandler):
         except Exception as e:
             return send_json(self, 500, {"ok": False, "error": str(e)})
 
+    @profiled
     def do_GET(self):
         return send_json(self, 405, {"ok": False, "error": "Use POST"})
 
@@ -1,32 +1,39 @@
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 from datetime import datetime, timezone
-import json
-import urllib.request
 import os
 
 # Import fallback to avoid Vercel module-path edge cases
 try:
-    from ._utils import db_connect, send_json
+    from ._utils import db_connect, send_json, start_timing, upstream_base
+    from ._profiler import profiled
+    from ._http import get_json
+    from ._alerts import on_tick
+    from ._indicators import on_write
+    from ._rollups import on_write as rollups_on_write
+    from ._schema import upsert_daily
 except Exception:
-    from api._utils import db_connect, send_json
+    from api._utils import db_connect, send_json, start_timing, upstream_base
+    from api._profiler import profiled
+    from api._http import get_json
+    from api._alerts import on_tick
+    from api._indicators import on_write
+    from api._rollups import on_write as rollups_on_write
+    from api._schema import upsert_daily
 
 
-YAHOO_QUOTE_URL = "https://query1.finance.yahoo.com/v7/finance/quote?symbols=GC=F,SI=F"
+YAHOO_QUOTE_URL = upstream_base("YAHOO", "https://query1.finance.yahoo.com") + "/v7/finance/quote?symbols=GC=F,SI=F"
 
 
 def _fetch_yahoo_quotes():
-    req = urllib.request.Request(
+    data = get_json(
         YAHOO_QUOTE_URL,
         headers={
             "User-Agent": "Mozilla/5.0",
             "Accept": "application/json",
         },
-        method="GET",
+        deadline=15,
     )
-    with urllib.request.urlopen(req, timeout=15) as resp:
-        raw = resp.read().decode("utf-8")
-        data = json.loads(raw)
 
     results = (data.get("quoteResponse") or {}).get("result") or []
     by_symbol = {r.get("symbol"): r for r in results if r.get("symbol")}
@@ -57,7 +64,9 @@ def _is_authorized(handler_obj, qs):
 
 
 class handler(BaseHTTPRequestHandler):
+    @profiled
     def do_GET(self):
+        start_timing(self)
         try:
             qs = parse_qs(urlparse(self.path).query)
 
@@ -103,20 +112,15 @@ class handler(BaseHTTPRequestHandler):
             conn = db_connect()
             try:
                 cur = conn.cursor()
-                cur.execute(
-                    """
-                    insert into gsr_daily (d, gold_usd, silver_usd, gsr, fetched_at_utc, source)
-                    values (%s, %s, %s, %s, %s, %s)
-                    on conflict (d) do update
-                      set gold_usd = excluded.gold_usd,
-                          silver_usd = excluded.silver_usd,
-                          gsr = excluded.gsr,
-                          fetched_at_utc = excluded.fetched_at_utc,
-                          source = excluded.source;
-                    """,
-                    (today_utc, gold_px, silver_px, gsr, now_utc, "cron_hourly_yahoo"),
-                )
+                upsert_daily(cur, [(today_utc, gold_px, silver_px, gsr, now_utc, "cron_hourly_yahoo")])
                 conn.commit()
+
+                # Roll gsr_indicators and the open OHLC buckets forward over today's row
+                indicators = on_write(conn)
+                rollups = rollups_on_write(conn)
+
+                # New tick: queue any price / GSR / vault-value alerts it crossed
+                alerts = on_tick(conn, {"gold": gold_px, "silver": silver_px, "gsr": gsr}, source="cron_hourly_yahoo")
             finally:
                 try:
                     conn.close()
@@ -134,6 +138,9 @@ class handler(BaseHTTPRequestHandler):
                     "gsr": gsr,
                     "fetched_at_utc": now_utc,
                     "source": "cron_hourly_yahoo",
+                    "alerts": alerts,
+                    "indicators": indicators,
+                    "rollups": rollups,
                 },
             )
 
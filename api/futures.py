@@ -1,18 +1,25 @@
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 from datetime import datetime, timezone
-import urllib.request
 import csv
 import io
 
 try:
-    from ._utils import send_json
+    from ._utils import send_json, start_timing, upstream_base
+    from ._profiler import profiled
+    from ._singleflight import single_flight
+    from ._breaker import guarded, health
+    from ._http import get_text
 except Exception:
-    from api._utils import send_json
+    from api._utils import send_json, start_timing, upstream_base
+    from api._profiler import profiled
+    from api._singleflight import single_flight
+    from api._breaker import guarded, health
+    from api._http import get_text
 
 
 # Stooq CSV quote endpoint (no API key required)
-STOOQ_URL_TPL = "https://stooq.com/q/l/?s={symbol}&f=sd2t2ohlc&h&e=csv"
+STOOQ_URL_TPL = upstream_base("STOOQ", "https://stooq.com") + "/q/l/?s={symbol}&f=sd2t2ohlc&h&e=csv"
 
 # Keep compatibility with your old interface (?symbols=GC=F,SI=F,PL=F)
 SYMBOL_MAP = {
@@ -24,19 +31,19 @@ SYMBOL_MAP = {
     "pl.f": "pl.f",
 }
 
+# Gold/silver fallback when Stooq is failing (same Yahoo feed as /api/cron_gsr)
+YAHOO_SYMBOLS = {"gc.f": "GC=F", "si.f": "SI=F"}
+
 
 def _http_get_text(url: str, timeout: int = 15) -> str:
-    req = urllib.request.Request(
+    return get_text(
         url,
         headers={
             "User-Agent": "Mozilla/5.0 (MetalMetric-Futures; +https://metalmetric.com)",
             "Accept": "text/csv,text/plain,application/json;q=0.9,*/*;q=0.8",
         },
-        method="GET",
+        deadline=timeout,
     )
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        raw = resp.read()
-    return raw.decode("utf-8", errors="replace")
 
 
 def _fetch_stooq_last(symbol: str):
@@ -68,6 +75,14 @@ def _fetch_stooq_last(symbol: str):
     return price, d, t
 
 
+def _fetch_yahoo_quotes():
+    try:
+        from .cron_gsr import _fetch_yahoo_quotes as fetch
+    except Exception:
+        from api.cron_gsr import _fetch_yahoo_quotes as fetch
+    return fetch()
+
+
 def _normalize_price(metal: str, px: float):
     """
     Stooq futures sometimes return different scaling.
@@ -103,7 +118,9 @@ def _normalize_price(metal: str, px: float):
 
 
 class handler(BaseHTTPRequestHandler):
+    @profiled
     def do_GET(self):
+        start_timing(self)
         try:
             qs = parse_qs(urlparse(self.path).query)
             symbols_raw = (qs.get("symbols", ["GC=F,SI=F,PL=F"])[0] or "GC=F,SI=F,PL=F").strip()
@@ -127,10 +144,35 @@ class handler(BaseHTTPRequestHandler):
 
             prices_raw = {}
             market_meta = {}
+            errors = {}
+            sources = {}
             for sym in stooq_syms:
-                px, d, t = _fetch_stooq_last(sym)
+                # Concurrent requests for the same symbol share one Stooq call;
+                # the breaker skips Stooq entirely while it keeps failing.
+                try:
+                    (px, d, t), _ = single_flight(
+                        f"stooq:{sym}", lambda: guarded("stooq", lambda: _fetch_stooq_last(sym))
+                    )
+                except Exception as e:
+                    errors[sym] = str(e)
+                    continue
                 prices_raw[sym] = px
                 market_meta[sym] = {"date": d, "time": t}
+                sources[sym] = "stooq"
+
+            # Gold/silver fallback: Yahoo front-month quotes (platinum stays optional)
+            missing = [sym for sym in ("gc.f", "si.f") if sym in stooq_syms and sym not in prices_raw]
+            if missing:
+                try:
+                    quotes, _ = single_flight("yahoo:quotes", lambda: guarded("yahoo", _fetch_yahoo_quotes))
+                    for sym in missing:
+                        px = (quotes.get(YAHOO_SYMBOLS[sym]) or {}).get("regularMarketPrice")
+                        if px:
+                            prices_raw[sym] = float(px)
+                            market_meta[sym] = {"date": "", "time": ""}
+                            sources[sym] = "yahoo"
+                except Exception as e:
+                    errors["yahoo"] = str(e)
 
             gold_raw = prices_raw.get("gc.f")
             silver_raw = prices_raw.get("si.f")
@@ -140,7 +182,9 @@ class handler(BaseHTTPRequestHandler):
                 return send_json(self, 502, {
                     "ok": False,
                     "error": "Price source unavailable (missing gold or silver).",
+                    "providers": health("stooq", "yahoo"),
                     "debug": {
+                        "errors": errors,
                         "requested": requested,
                         "mapped": stooq_syms,
                         "unknown": unknown,
@@ -183,7 +227,9 @@ class handler(BaseHTTPRequestHandler):
                 "platinum_usd": (float(platinum_px) if platinum_px is not None else None),
                 "gsr": float(gsr),
                 "fetched_at_utc": now_utc,
-                "source": "futures_stooq",
+                "source": "futures_stooq" if set(sources.values()) == {"stooq"} else "futures_mixed",
+                "sources": sources,
+                "providers": health("stooq", "yahoo"),
                 "market": {
                     "date": market_date,
                     "time": market_time,
@@ -194,6 +240,7 @@ class handler(BaseHTTPRequestHandler):
                     "requested": requested,
                     "mapped": stooq_syms,
                     "unknown": unknown,
+                    "errors": errors,
                     "raw": {
                         "gold": gold_raw,
                         "silver": silver_raw,
@@ -1,24 +1,45 @@
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import datetime
-import json
-import urllib.request
-import urllib.error
+import os
 
 # Import fallback to avoid Vercel module-path edge cases
 try:
-    from ._utils import db_connect, send_json
+    from ._utils import RawJSON, db_connect, db_read_routed, send_json, span, start_timing, upstream_base
+    from ._profiler import profiled
+    from ._market import freshness_ttl, market_state
+    from ._singleflight import single_flight
+    from ._breaker import guarded, health
+    from ._http import get_json
+    from ._alerts import on_tick
+    from ._indicators import on_write, parse_names
+    from ._rollups import INTERVALS, on_write as rollups_on_write, read_candles
+    from ._frozen import segment
+    from ._schema import price_text, upsert_daily
 except Exception:
-    from api._utils import db_connect, send_json
+    from api._utils import RawJSON, db_connect, db_read_routed, send_json, span, start_timing, upstream_base
+    from api._profiler import profiled
+    from api._market import freshness_ttl, market_state
+    from api._singleflight import single_flight
+    from api._breaker import guarded, health
+    from api._http import get_json
+    from api._alerts import on_tick
+    from api._indicators import on_write, parse_names
+    from api._rollups import INTERVALS, on_write as rollups_on_write, read_candles
+    from api._frozen import segment
+    from api._schema import price_text, upsert_daily
 
 
 # Free / no-key source (GoldPrice.org JSON endpoint)
 # Returns JSON with items[0].xauPrice and items[0].xagPrice in USD
-GOLDPRICE_URL = "https://data-asg.goldprice.org/dbXRates/USD"
+GOLDPRICE_URL = upstream_base("GOLDPRICE", "https://data-asg.goldprice.org") + "/dbXRates/USD"
 
 # Update policy:
 # - If today's UTC row missing -> update
-# - If fetched_at_utc older than STALE_MINUTES -> update
+# - If ?stale_minutes=N is given and fetched_at_utc is older than N minutes -> update
+# - Otherwise the row stays fresh for _market.freshness_ttl(...) measured from
+#   fetched_at_utc: STALE_MINUTES_DEFAULT during active sessions, longer
+#   overnight, and until the reopen on weekends / holidays / settlement breaks
 STALE_MINUTES_DEFAULT = 55
 
 # If force=1, avoid hammering the upstream on rapid clicks
@@ -27,6 +48,28 @@ FORCE_COOLDOWN_SECONDS = 60
 # Advisory lock key (any consistent 64-bit int is fine)
 ADVISORY_LOCK_KEY = 731234567890  # arbitrary constant
 
+# Daily history is assembled by Postgres (json_agg) and spliced into the
+# response as one string; HISTORY_DB_JSON=0 builds it in Python from row
+# tuples instead. ?indicators= always takes the Python path (values are
+# merged per row).
+HISTORY_DB_JSON = (os.getenv("HISTORY_DB_JSON") or "1").strip().lower() not in ("0", "false", "no", "off")
+
+_HISTORY_JSON_SQL = """
+    SELECT coalesce(json_agg(json_build_object(
+             'date', to_char(d, 'YYYY-MM-DD'),
+             'gold_usd', gold_usd::numeric::text,
+             'silver_usd', silver_usd::numeric::text,
+             'gsr', gsr::numeric::text
+           ) ORDER BY d), '[]')::text, count(*)
+    FROM (
+      SELECT d, gold_usd, silver_usd, gsr
+      FROM gsr_daily
+      {where}
+      ORDER BY d DESC
+      LIMIT %s
+    ) t;
+"""
+
 
 def _utc_now():
     return datetime.datetime.now(datetime.timezone.utc)
@@ -45,11 +88,7 @@ def _fetch_goldprice_prices():
         "Origin": "https://goldprice.org",
     }
 
-    req = urllib.request.Request(GOLDPRICE_URL, headers=headers, method="GET")
-    with urllib.request.urlopen(req, timeout=15) as resp:
-        raw = resp.read().decode("utf-8")
-
-    data = json.loads(raw)
+    data = get_json(GOLDPRICE_URL, headers=headers, deadline=15)
     items = data.get("items") or []
     if not items:
         raise ValueError("GoldPrice response missing items[]")
@@ -70,21 +109,123 @@ def _fetch_goldprice_prices():
     return gold, silver, gsr
 
 
+def _read_indicators(conn, names, first, last):
+    """
+    {date: {name: value}} from gsr_indicators over [first, last], keyed with
+    the stored gsr under "_gsr"; None when the table is not there yet.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            f"SELECT d, gsr, {', '.join(names)} FROM gsr_indicators WHERE d BETWEEN %s AND %s;",
+            (first, last),
+        )
+        rows = cur.fetchall() or []
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return None
+    return {
+        r[0]: {"_gsr": r[1], **{n: (round(float(v), 6) if v is not None else None) for n, v in zip(names, r[2:])}}
+        for r in rows
+    }
+
+
+def _history_rows(cur, limit):
+    """
+    Newest `limit` daily rows, oldest first, plus where they came from.
+
+    With a frozen segment (api/_frozen.py) only the rows after its last day
+    are read from gsr_daily, an index range scan over a few weeks; the rest
+    of the window is sliced from the memory-mapped segment.
+    """
+    seg = segment()
+    if seg is None or not seg.n:
+        cur.execute(
+            """
+            SELECT d, gold_usd, silver_usd, gsr
+            FROM gsr_daily
+            ORDER BY d DESC
+            LIMIT %s;
+            """,
+            (limit,)
+        )
+        rows = list(cur.fetchall() or [])
+        rows.reverse()
+        return rows, {"db": len(rows), "frozen": 0}
+
+    cur.execute(
+        """
+        SELECT d, gold_usd, silver_usd, gsr
+        FROM gsr_daily
+        WHERE d > %s
+        ORDER BY d DESC
+        LIMIT %s;
+        """,
+        (seg.last_date, limit)
+    )
+    tail = list(cur.fetchall() or [])
+    tail.reverse()
+    frozen = seg.tail(limit - len(tail)) if len(tail) < limit else []
+    return frozen + tail, {"db": len(tail), "frozen": len(frozen), "frozen_to": str(seg.last_date)}
+
+
+def _history_json(cur, limit):
+    """
+    _history_rows() with the items already encoded: (RawJSON array, plan).
+    Postgres returns the gsr_daily part as one text value (numerics as their
+    exact text, like str(Decimal)); frozen rows come from the segment's
+    cached fragments.
+    """
+    seg = segment()
+    if seg is None or not seg.n:
+        cur.execute(_HISTORY_JSON_SQL.format(where=""), (limit,))
+        text, n = cur.fetchone()
+        return RawJSON(text), {"db": int(n), "frozen": 0}
+
+    cur.execute(_HISTORY_JSON_SQL.format(where="WHERE d > %s"), (seg.last_date, limit))
+    text, n = cur.fetchone()
+    n = int(n)
+    count = min(limit - n, seg.n)
+    if count <= 0:
+        return RawJSON(text), {"db": n, "frozen": 0, "frozen_to": str(seg.last_date)}
+    frozen = seg.json_tail(count)
+    text = "[" + frozen + ("]" if not n else ", " + text.lstrip()[1:])
+    return RawJSON(text), {"db": n, "frozen": count, "frozen_to": str(seg.last_date)}
+
+
+def _candle_to_history(c):
+    # c: (bucket, first_d, last_d, days, gold o/h/l/c, silver o/h/l/c, gsr o/h/l/c)
+    bucket, first_d, last_d, days = c[:4]
+    out = {"date": str(bucket), "first_date": str(first_d), "last_date": str(last_d), "days": int(days)}
+    for i, name in enumerate(("gold_usd", "silver_usd", "gsr")):
+        o, h, lo, cl = c[4 + 4 * i:8 + 4 * i]
+        out.update({
+            name: price_text(cl), f"{name}_open": price_text(o),
+            f"{name}_high": price_text(h), f"{name}_low": price_text(lo),
+        })
+    return out
+
+
 def _row_to_latest(row):
     # row: (d, gold_usd, silver_usd, gsr, fetched_at_utc, source)
     d, g, s, r, fetched_at, source = row
     return {
         "date": str(d),
-        "gold_usd": str(g),
-        "silver_usd": str(s),
-        "gsr": str(r),
+        "gold_usd": price_text(g),
+        "silver_usd": price_text(s),
+        "gsr": price_text(r),
         "fetched_at_utc": str(fetched_at),
         "source": str(source),
     }
 
 
 class handler(BaseHTTPRequestHandler):
+    @profiled
     def do_GET(self):
+        start_timing(self)
         try:
             qs = parse_qs(urlparse(self.path).query)
 
@@ -99,38 +240,68 @@ class handler(BaseHTTPRequestHandler):
             if limit > 50000:
                 limit = 50000
 
+            # ?indicators=sma,bands,pctl_365 -> merged into history rows
+            try:
+                indicator_names = parse_names(qs.get("indicators", [""])[0])
+            except ValueError as e:
+                return send_json(self, 400, {"ok": False, "error": str(e)})
+
+            # ?interval=1w|1M|1y -> history is OHLC candles from gsr_ohlc (closes in
+            # gold_usd / silver_usd / gsr); limit then counts candles
+            interval = (qs.get("interval", [""])[0] or "").strip() or None
+            if interval is not None and interval not in INTERVALS:
+                return send_json(self, 400, {"ok": False, "error": f"interval must be one of {', '.join(INTERVALS)}"})
+            if interval and indicator_names:
+                return send_json(self, 400, {"ok": False, "error": "indicators are daily; drop interval"})
+
             # self-heal controls
             force = (qs.get("force", ["0"])[0] or "0").strip().lower() in ("1", "true", "yes", "on")
-            stale_minutes_raw = (
-                (qs.get("stale_minutes", [str(STALE_MINUTES_DEFAULT)])[0] or str(STALE_MINUTES_DEFAULT)).strip()
-            )
+            stale_minutes_raw = (qs.get("stale_minutes", [""])[0] or "").strip()
             try:
-                stale_minutes = int(stale_minutes_raw)
+                stale_minutes = max(1, min(int(stale_minutes_raw), 24 * 60))
             except Exception:
-                stale_minutes = STALE_MINUTES_DEFAULT
-            stale_minutes = max(1, min(stale_minutes, 24 * 60))
+                stale_minutes = None  # market-aware
 
             now_utc = _utc_now()
             today_utc = now_utc.date()
-            stale_cutoff = now_utc - datetime.timedelta(minutes=stale_minutes)
+            stale_cutoff = (now_utc - datetime.timedelta(minutes=stale_minutes)) if stale_minutes else None
             force_cutoff = now_utc - datetime.timedelta(seconds=FORCE_COOLDOWN_SECONDS)
 
-            conn = db_connect()
+            # Reads go to the read route (pooler / replica); the first self-heal
+            # write moves the request onto the write route, where the rest of it
+            # also reads (so it sees its own write)
+            with span(self, "db_connect"):
+                conn = db_connect("read")
+            on_read_route = db_read_routed()
             try:
                 cur = conn.cursor()
 
+                def primary():
+                    nonlocal conn, cur, on_read_route
+                    if on_read_route:
+                        with span(self, "db_connect"):
+                            try:
+                                conn.close()
+                            except Exception:
+                                pass
+                            conn = db_connect("write")
+                            cur = conn.cursor()
+                        on_read_route = False
+                    return conn
+
                 # Helper: read today's row
                 def read_today():
-                    cur.execute(
-                        """
-                        SELECT d, gold_usd, silver_usd, gsr, fetched_at_utc, source
-                        FROM gsr_daily
-                        WHERE d = %s
-                        LIMIT 1;
-                        """,
-                        (today_utc,),
-                    )
-                    return cur.fetchone()
+                    with span(self, "read_today"):
+                        cur.execute(
+                            """
+                            SELECT d, gold_usd, silver_usd, gsr, fetched_at_utc, source
+                            FROM gsr_daily
+                            WHERE d = %s
+                            LIMIT 1;
+                            """,
+                            (today_utc,),
+                        )
+                        return cur.fetchone()
 
                 # 1) Read today's row (UTC) if present
                 today_row = read_today()
@@ -144,61 +315,74 @@ class handler(BaseHTTPRequestHandler):
                     try:
                         if force:
                             should_update = fetched_at < force_cutoff
-                        else:
+                        elif stale_cutoff is not None:
                             should_update = fetched_at < stale_cutoff
+                        else:
+                            ttl = freshness_ttl(
+                                "gold", "silver", now=fetched_at, base_seconds=STALE_MINUTES_DEFAULT * 60
+                            )
+                            should_update = fetched_at + datetime.timedelta(seconds=ttl) < now_utc
                     except Exception:
                         should_update = True
 
-                # 3) If missing/stale, try to acquire advisory lock and update
-                updated = False
-                update_error = None
-                got_lock = False
+                # 3) If missing/stale, try to acquire advisory lock and update.
+                # Concurrent stale requests in this instance wait on one refresh
+                # (single_flight) instead of losing the lock and serving stale data.
+                alerts = {}
+                indicators = {}
+                rollups = {}
 
-                if should_update:
+                def refresh():
+                    got_lock = False
                     try:
-                        cur.execute("SELECT pg_try_advisory_lock(%s);", (ADVISORY_LOCK_KEY,))
-                        got_lock = bool(cur.fetchone()[0])
+                        with span(self, "lock"):
+                            cur.execute("SELECT pg_try_advisory_lock(%s);", (ADVISORY_LOCK_KEY,))
+                            got_lock = bool(cur.fetchone()[0])
                     except Exception:
                         got_lock = False
+                    if not got_lock:
+                        return False, False, None
 
-                    if got_lock:
-                        try:
-                            gold, silver, gsr = _fetch_goldprice_prices()
-                            # Use a fresh timestamp at write time
-                            write_ts = _utc_now()
-
-                            cur.execute(
-                                """
-                                INSERT INTO gsr_daily (d, gold_usd, silver_usd, gsr, fetched_at_utc, source)
-                                VALUES (%s, %s, %s, %s, %s, %s)
-                                ON CONFLICT (d) DO UPDATE SET
-                                  gold_usd       = EXCLUDED.gold_usd,
-                                  silver_usd     = EXCLUDED.silver_usd,
-                                  gsr            = EXCLUDED.gsr,
-                                  fetched_at_utc = EXCLUDED.fetched_at_utc,
-                                  source         = EXCLUDED.source;
-                                """,
-                                (today_utc, gold, silver, gsr, write_ts, "latest_goldprice"),
-                            )
+                    try:
+                        with span(self, "upstream"):
+                            gold, silver, gsr = guarded("goldprice", _fetch_goldprice_prices)
+                        # Use a fresh timestamp at write time
+                        write_ts = _utc_now()
+
+                        with span(self, "upsert"):
+                            upsert_daily(cur, [(today_utc, gold, silver, gsr, write_ts, "latest_goldprice")])
                             conn.commit()
-                            updated = True
-                        except (urllib.error.HTTPError, urllib.error.URLError, ValueError) as e:
-                            update_error = str(e)
-                            try:
-                                conn.rollback()
-                            except Exception:
-                                pass
-                        except Exception as e:
-                            update_error = str(e)
-                            try:
-                                conn.rollback()
-                            except Exception:
-                                pass
-                        finally:
-                            try:
-                                cur.execute("SELECT pg_advisory_unlock(%s);", (ADVISORY_LOCK_KEY,))
-                            except Exception:
-                                pass
+                        with span(self, "indicators"):
+                            indicators.update(on_write(conn))
+                        with span(self, "rollups"):
+                            rollups.update(rollups_on_write(conn))
+                        with span(self, "alerts"):
+                            alerts.update(on_tick(
+                                conn, {"gold": gold, "silver": silver, "gsr": gsr}, source="latest_goldprice"
+                            ))
+                        return True, True, None
+                    except Exception as e:
+                        try:
+                            conn.rollback()
+                        except Exception:
+                            pass
+                        return True, False, str(e)
+                    finally:
+                        try:
+                            cur.execute("SELECT pg_advisory_unlock(%s);", (ADVISORY_LOCK_KEY,))
+                        except Exception:
+                            pass
+
+                updated = False
+                update_error = None
+                got_lock = False
+                coalesced = False
+
+                if should_update:
+                    primary()
+                    (got_lock, updated, update_error), coalesced = single_flight(
+                        f"latest:{today_utc}", refresh
+                    )
 
                 # 4) Determine latest to return:
                 # Prefer today's row if it exists; otherwise fallback to newest date.
@@ -225,22 +409,47 @@ class handler(BaseHTTPRequestHandler):
 
                 latest = _row_to_latest(latest_row)
 
-                # 5) History (DESC then reverse to ASC)
-                cur.execute(
-                    """
-                    SELECT d, gold_usd, silver_usd, gsr
-                    FROM gsr_daily
-                    ORDER BY d DESC
-                    LIMIT %s;
-                    """,
-                    (limit,)
-                )
-                rows = list(cur.fetchall() or [])
-                rows.reverse()
-                history = [
-                    {"date": str(d), "gold_usd": str(g), "silver_usd": str(s), "gsr": str(r)}
-                    for (d, g, s, r) in rows
-                ]
+                # 5) History, oldest first: frozen segment + gsr_daily tail (or candles)
+                history_plan = None
+                if interval:
+                    # Candles: rolled forward here only if gsr_ohlc lags gsr_daily
+                    with span(self, "candles"):
+                        candles = read_candles(conn, interval, limit)
+                        last = candles[-1] if candles else None
+                        if last is None or last[2] != latest_row[0] or float(last[-1]) != float(latest_row[3]):
+                            rollups.update(rollups_on_write(primary()))
+                            candles = read_candles(conn, interval, limit) or []
+                    with span(self, "serialize"):
+                        history = [_candle_to_history(c) for c in candles]
+                elif HISTORY_DB_JSON and not indicator_names:
+                    with span(self, "history"):
+                        history, history_plan = _history_json(cur, limit)
+                else:
+                    with span(self, "history"):
+                        rows, history_plan = _history_rows(cur, limit)
+                    with span(self, "serialize"):
+                        history = [
+                            {"date": str(d), "gold_usd": price_text(g), "silver_usd": price_text(s), "gsr": price_text(r)}
+                            for (d, g, s, r) in rows
+                        ]
+
+                # 6) Stored indicators; written by the cron / self-heal, so this is
+                # a lookup. Rolled forward here only if gsr_indicators lags gsr_daily.
+                if indicator_names and history:
+                    with span(self, "indicators"):
+                        # Freshness is judged against the gsr_daily row, never
+                        # rows[-1]: that may come from the frozen segment, which
+                        # keeps only 6 decimals and would never compare equal
+                        last_d = max(rows[-1][0], latest_row[0])
+                        stored = _read_indicators(conn, indicator_names, rows[0][0], last_d)
+                        tail = (stored or {}).get(latest_row[0])
+                        if tail is None or float(tail["_gsr"]) != float(latest_row[3]):
+                            indicators.update(on_write(primary()))
+                            stored = _read_indicators(conn, indicator_names, rows[0][0], last_d)
+                        empty = dict.fromkeys(indicator_names)
+                        for (d, *_), item in zip(rows, history):
+                            vals = (stored or {}).get(d, empty)
+                            item.update({n: vals[n] for n in indicator_names})
 
             finally:
                 try:
@@ -252,13 +461,21 @@ class handler(BaseHTTPRequestHandler):
                 "ok": True,
                 "latest": latest,
                 "history": history,
+                "interval": interval or "1d",
+                "history_source": history_plan,
                 "self_heal": {
                     "today_utc": str(today_utc),
                     "force": force,
                     "stale_minutes": stale_minutes,
+                    "market": market_state(now_utc),
                     "attempted": bool(should_update),
                     "updated": bool(updated),
                     "had_lock": bool(got_lock),
+                    "coalesced": bool(coalesced),
+                    "alerts": alerts or None,
+                    "indicators": indicators or None,
+                    "rollups": rollups or None,
+                    "providers": health("goldprice"),
                     "error": update_error
                 }
             })
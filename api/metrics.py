@@ -0,0 +1,69 @@
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Import fallback to avoid Vercel module-path edge cases
+try:
+    from ._utils import db_connect, send_json
+    from ._auth import has_cron_secret
+    from . import _metrics
+    from ._profiler import profiled
+    from ._breaker import provider_health
+except Exception:
+    from api._utils import db_connect, send_json
+    from api._auth import has_cron_secret
+    from api import _metrics
+    from api._profiler import profiled
+    from api._breaker import provider_health
+
+
+# GET /api/metrics?window_minutes=60[&kind=route|span|upstream]
+#
+# Merges metrics_rollup rows from every instance over the window and returns
+# count/mean/p50/p95/p99 per name, plus counters (cache hits/misses, breaker
+# transitions) and the shared circuit-breaker state per upstream provider.
+# Requires CRON_SECRET (Authorization: Bearer, X-Cron-Secret or ?secret=).
+
+
+class handler(BaseHTTPRequestHandler):
+    @profiled
+    def do_GET(self):
+        try:
+            qs = parse_qs(urlparse(self.path).query)
+
+            if not has_cron_secret(self, qs):
+                return send_json(self, 401, {
+                    "ok": False,
+                    "error": "Unauthorized",
+                    "hint": "Use Authorization: Bearer <CRON_SECRET> or ?secret=<CRON_SECRET>.",
+                })
+
+            try:
+                window = int((qs.get("window_minutes", ["60"])[0] or "60").strip())
+            except Exception:
+                window = 60
+            window = max(1, min(window, _metrics.RETENTION_MINUTES))
+
+            kind = (qs.get("kind", [""])[0] or "").strip().lower() or None
+            if kind and kind not in ("route", "span", "upstream"):
+                return send_json(self, 400, {"ok": False, "error": "kind must be route, span or upstream"})
+
+            conn = db_connect()
+            try:
+                _metrics.ensure_metrics_table(conn)
+                # Include this instance's unflushed data
+                flushed = _metrics.flush(conn)
+                summary = _metrics.summarize(conn, window, kind)
+                providers = provider_health(conn)
+            finally:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+            return send_json(self, 200, {"ok": True, "flushed_rows": flushed, **summary, "providers": providers})
+
+        except Exception as e:
+            return send_json(self, 500, {"ok": False, "error": str(e)})
+
+    def log_message(self, format, *args):
+        return
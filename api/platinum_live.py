@@ -1,20 +1,32 @@
 # api/platinum_live.py
 from http.server import BaseHTTPRequestHandler
 import csv, io, time
-from urllib.request import urlopen, Request
+
+try:
+    from ._utils import send_json, span, start_timing, record_cache, upstream_base
+    from ._profiler import profiled
+    from ._market import freshness_ttl
+    from ._singleflight import single_flight
+    from ._breaker import guarded, health
+    from ._http import get_text
+except Exception:
+    from api._utils import send_json, span, start_timing, record_cache, upstream_base
+    from api._profiler import profiled
+    from api._market import freshness_ttl
+    from api._singleflight import single_flight
+    from api._breaker import guarded, health
+    from api._http import get_text
 
 # simple in-memory cache to avoid hammering Stooq
-_CACHE = {"ts": 0, "platinum_usd": None, "updated": None}
+# (CACHE_SECONDS during active sessions; longer when the market is closed)
+_CACHE = {"ts": 0, "ttl": 60, "platinum_usd": None, "updated": None}
 CACHE_SECONDS = 60
 
-def _fetch_usdxpt_close():
-    # Stooq quote CSV endpoint pattern (works for many tickers/pairs).
-    # If your project already uses a stooq URL, reuse that same pattern here.
-    url = "https://stooq.com/q/l/?s=usdxpt&f=sd2t2ohlc&h&e=csv"
+# Stooq quote CSV endpoint pattern (works for many tickers/pairs)
+STOOQ_USDXPT_URL = upstream_base("STOOQ", "https://stooq.com") + "/q/l/?s=usdxpt&f=sd2t2ohlc&h&e=csv"
 
-    req = Request(url, headers={"User-Agent": "MetalMetric/1.0"})
-    with urlopen(req, timeout=10) as r:
-        text = r.read().decode("utf-8", errors="replace")
+def _fetch_usdxpt_close():
+    text = get_text(STOOQ_USDXPT_URL, headers={"User-Agent": "MetalMetric/1.0"}, deadline=10)
 
     rows = list(csv.reader(io.StringIO(text)))
     if len(rows) < 2:
@@ -43,37 +55,41 @@ def _fetch_usdxpt_close():
 
 
 class handler(BaseHTTPRequestHandler):
+    @profiled
     def do_GET(self):
+        start_timing(self)
         try:
             now = time.time()
-            if _CACHE["platinum_usd"] is not None and (now - _CACHE["ts"]) < CACHE_SECONDS:
-                self._send_json(200, {
+            if _CACHE["platinum_usd"] is not None and (now - _CACHE["ts"]) < _CACHE["ttl"]:
+                record_cache("platinum_live", True)
+                send_json(self, 200, {
                     "ok": True,
                     "platinum_usd": _CACHE["platinum_usd"],
                     "updated": _CACHE["updated"],
                     "source": "stooq usdxpt (inverted)"
                 })
                 return
+            record_cache("platinum_live", False)
 
-            platinum_usd, updated = _fetch_usdxpt_close()
-            _CACHE["ts"] = now
-            _CACHE["platinum_usd"] = platinum_usd
-            _CACHE["updated"] = updated
+            def refresh():
+                with span(self, "upstream_stooq"):
+                    px, upd = guarded("stooq", _fetch_usdxpt_close)
+                _CACHE["ts"] = now
+                _CACHE["ttl"] = freshness_ttl("platinum", base_seconds=CACHE_SECONDS)
+                _CACHE["platinum_usd"] = px
+                _CACHE["updated"] = upd
+                return px, upd
 
-            self._send_json(200, {
+            (platinum_usd, updated), _ = single_flight("platinum_live", refresh)
+
+            send_json(self, 200, {
                 "ok": True,
                 "platinum_usd": platinum_usd,
                 "updated": updated,
                 "source": "stooq usdxpt (inverted)"
             })
         except Exception as e:
-            self._send_json(200, {"ok": False, "error": str(e)})
-
-    def _send_json(self, code, obj):
-        import json
-        body = json.dumps(obj).encode("utf-8")
-        self.send_response(code)
-        self.send_header("Content-Type", "application/json; charset=utf-8")
-        self.send_header("Content-Length", str(len(body)))
-        self.end_headers()
-        self.wfile.write(body)
+            send_json(self, 200, {"ok": False, "error": str(e), "providers": health("stooq")})
+
+    def log_message(self, format, *args):
+        return
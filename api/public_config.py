@@ -2,10 +2,13 @@ from http.server import BaseHTTPRequestHandler
 import os
 try:
     from ._utils import send_json
+    from ._profiler import profiled
 except Exception:
     from api._utils import send_json
+    from api._profiler import profiled
 
 class handler(BaseHTTPRequestHandler):
+    @profiled
     def do_GET(self):
         pk = (os.environ.get("CLERK_PUBLISHABLE_KEY") or "").strip()
         if not pk:
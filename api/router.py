@@ -0,0 +1,174 @@
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import importlib
+import io
+import os
+
+# Import fallback to avoid Vercel module-path edge cases
+try:
+    from ._utils import send_json, enable_db_pool
+except Exception:
+    from api._utils import send_json, enable_db_pool
+
+
+# Optional single-function entry point: serves every /api/<route> from one
+# process, so module-level caches (spot/platinum_live _CACHE, _JWKS_CACHE,
+# entitlements) and the DB pool stay warm across routes.
+#
+# Enable on Vercel by pointing the /api rewrite at this function:
+#   { "source": "/api/(.*)", "destination": "/api/router?__route=$1" }
+# The per-route files keep working unchanged when it's not enabled.
+
+ROUTES = (
+    "alerts",
+    "analytics",
+    "backfill_gsr",
+    "backtest",
+    "create_checkout_session",
+    "cron_gsr",
+    "futures",
+    "latest",
+    "metrics",
+    "platinum_live",
+    "public_config",
+    "spot",
+    "stream",
+    "stripe_webhook",
+    "vault_config",
+    "vault_items",
+)
+
+# Request bodies up to this size are read off the socket before dispatch, so
+# a handler that answers without reading its body (auth / validation errors)
+# leaves a clean stream for the next request on a keep-alive connection.
+# Larger or chunked bodies close the connection after the response instead.
+MAX_BODY_BYTES = 1 << 20
+
+# One warm process handles every route, so keep a connection around
+try:
+    enable_db_pool(int(os.getenv("DB_POOL_SIZE", "2") or "2"))
+except Exception:
+    enable_db_pool(2)
+
+
+def route_name(path: str):
+    """
+    /api/latest?x=1 -> "latest"; /api/router?__route=spot -> "spot".
+    Returns None for anything that isn't a known route.
+    """
+    u = urlparse(path or "")
+    parts = [p for p in (u.path or "").split("/") if p]
+    if parts and parts[0] == "api":
+        parts = parts[1:]
+
+    name = parts[0] if parts else ""
+    if name.endswith(".py"):
+        name = name[:-3]
+
+    if name in ("", "router"):
+        name = (parse_qs(u.query).get("__route", [""])[0] or "").strip("/").split("/")[0]
+
+    return name if name in ROUTES else None
+
+
+def load_handler(name: str):
+    """
+    Imports api.<name> on first use (later calls hit sys.modules) and returns its handler class.
+    """
+    try:
+        mod = importlib.import_module(f".{name}", __package__ or "api")
+    except Exception:
+        mod = importlib.import_module(f"api.{name}")
+    return mod.handler
+
+
+class _HeadersOnly:
+    """
+    wfile for HEAD requests: the status line and headers (written in one go
+    by end_headers) pass through, the body is dropped.
+    """
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._done = False
+
+    def write(self, data):
+        if self._done:
+            return len(data)
+        self._done = bytes(data).endswith(b"\r\n\r\n")
+        return self._raw.write(data)
+
+    def flush(self):
+        return self._raw.flush()
+
+
+class handler(BaseHTTPRequestHandler):
+    def _buffer_body(self):
+        """
+        Reads the declared body into memory; self.rfile serves it to the route.
+        """
+        if self.headers.get("Transfer-Encoding"):
+            self.close_connection = True
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or "0")
+        except ValueError:
+            self.close_connection = True
+            return
+        if length <= 0:
+            return
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            return
+        self.rfile = io.BytesIO(self.rfile.read(length))
+
+    def _dispatch(self, method: str):
+        rfile, wfile = self.rfile, self.wfile
+        self._buffer_body()
+        # HEAD runs the GET handler with the body suppressed
+        if method == "HEAD":
+            self.wfile = _HeadersOnly(wfile)
+        try:
+            return self._route(method)
+        finally:
+            self.rfile, self.wfile = rfile, wfile
+
+    def _route(self, method: str):
+        name = route_name(self.path)
+        if not name:
+            return send_json(self, 404, {"ok": False, "error": "Unknown route", "routes": list(ROUTES)})
+
+        target = load_handler(name)
+        call = "GET" if method == "HEAD" and name != "stream" else method
+        if not hasattr(target, "do_" + call):
+            return send_json(self, 405, {"ok": False, "error": f"{method} not supported by /api/{name}"})
+
+        # Run the route's own handler code on this request. Swapping __class__
+        # is safe: all handlers are plain BaseHTTPRequestHandler subclasses.
+        # Restore afterwards so a keep-alive connection keeps routing.
+        own = self.__class__
+        # Keep the caller's protocol (HTTP/1.1 keep-alive in server.py)
+        self.protocol_version = own.protocol_version
+        self.__class__ = target
+        # Metrics are keyed by route (api/_utils._route_key), not by path
+        self.metrics_route = name
+        try:
+            return getattr(self, "do_" + call)()
+        finally:
+            self.__class__ = own
+            self.metrics_route = None
+
+    def do_GET(self):
+        return self._dispatch("GET")
+
+    def do_HEAD(self):
+        return self._dispatch("HEAD")
+
+    def do_POST(self):
+        return self._dispatch("POST")
+
+    def do_OPTIONS(self):
+        return self._dispatch("OPTIONS")
+
+    def log_message(self, format, *args):
+        return
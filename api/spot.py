@@ -2,37 +2,47 @@ from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 from datetime import datetime, timezone
 import os
-import json
 import time
-import urllib.request
 import urllib.error
+from types import SimpleNamespace
 
 try:
-    from ._utils import send_json
+    from ._utils import db_connect, send_json, span, start_timing, record_cache, upstream_base
+    from ._profiler import profiled
+    from ._market import freshness_ttl, market_state
+    from ._quota import acquire, ensure_quota_table, record_value
+    from ._singleflight import single_flight
+    from ._breaker import BreakerOpen, guarded, health
+    from ._http import get_json
 except Exception:
-    from api._utils import send_json
+    from api._utils import db_connect, send_json, span, start_timing, record_cache, upstream_base
+    from api._profiler import profiled
+    from api._market import freshness_ttl, market_state
+    from api._quota import acquire, ensure_quota_table, record_value
+    from api._singleflight import single_flight
+    from api._breaker import BreakerOpen, guarded, health
+    from api._http import get_json
 
 
 # GoldPrice.org spot for XAU/XAG (no key)
-GOLDPRICE_URL = "https://data-asg.goldprice.org/dbXRates/USD"
+GOLDPRICE_URL = upstream_base("GOLDPRICE", "https://data-asg.goldprice.org") + "/dbXRates/USD"
 
 # MetalPriceAPI spot for XPT (key required)
-METALPRICEAPI_URL = "https://api.metalpriceapi.com/v1/latest"
+METALPRICEAPI_URL = upstream_base("METALPRICEAPI", "https://api.metalpriceapi.com") + "/v1/latest"
 
-# Simple in-memory cache to avoid burning your 100-request free tier
+# Simple in-memory cache to avoid burning your 100-request free tier.
+# CACHE_TTL_SECONDS applies during active sessions; _market stretches it
+# overnight and until the reopen on weekends/holidays.
 CACHE_TTL_SECONDS = 60
-_CACHE = {"ts": 0.0, "payload": None}
+_CACHE = {"ts": 0.0, "ttl": CACHE_TTL_SECONDS, "payload": None}
 
 
 def _utc_now_iso():
     return datetime.now(timezone.utc).isoformat()
 
 
-def _http_get_json(url: str, headers: dict, timeout: int = 15) -> dict:
-    req = urllib.request.Request(url, headers=headers, method="GET")
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        raw = resp.read().decode("utf-8", errors="replace")
-    return json.loads(raw)
+def _http_get_json(url: str, headers: dict, timeout: int = 15, retries: int = 1) -> dict:
+    return get_json(url, headers=headers, deadline=timeout, retries=retries)
 
 
 def _fetch_goldprice_gold_silver():
@@ -81,7 +91,8 @@ def _fetch_metalpriceapi_platinum():
         "Accept": "application/json",
     }
 
-    data = _http_get_json(url, headers=headers, timeout=15)
+    # No retries: every attempt counts against the monthly quota
+    data = _http_get_json(url, headers=headers, timeout=15, retries=0)
     rates = data.get("rates") or {}
 
     direct = rates.get("USDXPT")
@@ -101,60 +112,191 @@ def _fetch_metalpriceapi_platinum():
     return 1.0 / inv
 
 
+def _fetch_stooq_platinum():
+    try:
+        from .platinum_live import _fetch_usdxpt_close
+    except Exception:
+        from api.platinum_live import _fetch_usdxpt_close
+    return guarded("stooq", _fetch_usdxpt_close)[0]
+
+
+def _fetch_stooq_gold_silver():
+    """
+    Fallback for gold/silver when GoldPrice is down: Stooq front-month futures.
+    """
+    try:
+        from .futures import _fetch_stooq_last, _normalize_price
+    except Exception:
+        from api.futures import _fetch_stooq_last, _normalize_price
+    gold = _normalize_price("gold", guarded("stooq", lambda: _fetch_stooq_last("gc.f"))[0])
+    silver = _normalize_price("silver", guarded("stooq", lambda: _fetch_stooq_last("si.f"))[0])
+    if gold <= 0 or silver <= 0:
+        raise ValueError(f"Non-positive gold/silver: gold={gold}, silver={silver}")
+    return gold, silver, (gold / silver)
+
+
+def _platinum_budgeted(handler_obj):
+    """
+    Platinum under the shared MetalPriceAPI quota ledger (_quota.py).
+    Returns (usd, source, quota):
+      - call granted        -> MetalPriceAPI, value stored in the ledger
+      - paced (budget left) -> the ledger's last MetalPriceAPI value
+      - exhausted / no key  -> Stooq usdxpt (same route as /api/platinum_live)
+      - MetalPriceAPI failing or its breaker open -> Stooq usdxpt
+    If the ledger itself is unreachable we call MetalPriceAPI and rely on
+    the in-memory cache, as before.
+    """
+    if not (os.environ.get("METALPRICEAPI_KEY") or "").strip():
+        with span(handler_obj, "upstream_stooq"):
+            return float(_fetch_stooq_platinum()), "spot_stooq_usdxpt", None
+
+    conn = None
+    quota = None
+    try:
+        try:
+            with span(handler_obj, "quota"):
+                conn = db_connect()
+                ensure_quota_table(conn)
+                quota = acquire(conn, "metalpriceapi")
+        except Exception:
+            quota = None
+
+        if quota is None or quota["allowed"]:
+            try:
+                with span(handler_obj, "upstream_metalpriceapi"):
+                    px = float(guarded("metalpriceapi", _fetch_metalpriceapi_platinum))
+            except Exception:
+                px = None
+            if px is not None:
+                if quota is not None:
+                    try:
+                        record_value(conn, "metalpriceapi", px)
+                    except Exception:
+                        pass
+                return px, "spot_metalpriceapi", quota
+
+        # Ledger unreachable (quota None) and MetalPriceAPI down: Stooq below
+        if quota is not None and quota["last_value"] is not None and not quota["exhausted"]:
+            return float(quota["last_value"]), "spot_metalpriceapi_ledger", quota
+    finally:
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    with span(handler_obj, "upstream_stooq"):
+        return float(_fetch_stooq_platinum()), "spot_stooq_usdxpt", quota
+
+
+def _refresh(handler_obj, force: bool, now: float) -> dict:
+    """
+    Fetches upstreams, builds the payload and fills _CACHE. Run under
+    single_flight so concurrent cache misses share one upstream round-trip.
+    """
+    ttl = freshness_ttl("gold", "silver", "platinum", base_seconds=CACHE_TTL_SECONDS)
+
+    # Gold & silver are REQUIRED: GoldPrice, or Stooq futures while it is failing
+    gold_silver_source = "spot_goldprice"
+    try:
+        with span(handler_obj, "upstream_goldprice"):
+            gold_usd, silver_usd, gsr = guarded("goldprice", _fetch_goldprice_gold_silver)
+    except Exception as primary_error:
+        try:
+            with span(handler_obj, "upstream_stooq"):
+                gold_usd, silver_usd, gsr = _fetch_stooq_gold_silver()
+        except Exception:
+            raise primary_error
+        gold_silver_source = "spot_stooq_futures"
+
+    # Platinum is OPTIONAL (never break the endpoint)
+    platinum_usd = None
+    platinum_source = "spot_metalpriceapi"
+    platinum_error = None
+    quota = None
+    try:
+        platinum_usd, platinum_source, quota = _platinum_budgeted(handler_obj)
+    except (urllib.error.HTTPError, urllib.error.URLError, ValueError) as e:
+        platinum_error = str(e)
+    except Exception as e:
+        platinum_error = str(e)
+
+    payload = {
+        "ok": True,
+        "date": datetime.now(timezone.utc).date().isoformat(),
+        "gold_usd": float(gold_usd),
+        "silver_usd": float(silver_usd),
+        "platinum_usd": platinum_usd,  # may be None
+        "gsr": float(gsr),
+        "fetched_at_utc": _utc_now_iso(),
+        "source": "spot_mixed",
+        "sources": {
+            "gold_silver": gold_silver_source,
+            "platinum": platinum_source,
+        },
+        "cache": {
+            "ttl_seconds": ttl,
+            "market": market_state(),
+            "forced": bool(force),
+        }
+    }
+
+    payload["providers"] = health("goldprice", "metalpriceapi", "stooq")
+
+    if quota is not None:
+        payload["quota"] = {
+            k: quota[k] for k in ("calls", "usable", "limit", "window_end", "min_interval_seconds", "exhausted")
+        }
+
+    # Only include this key when something went wrong (keeps response clean)
+    if platinum_error:
+        payload["platinum_error"] = platinum_error
+
+    _CACHE["ts"] = now
+    _CACHE["ttl"] = ttl
+    _CACHE["payload"] = payload
+    return payload
+
+
+def current(now: float = None) -> dict:
+    """
+    The cached payload, refreshed (under the same single_flight as do_GET)
+    once its TTL has lapsed. Used by the /api/stream publisher.
+    """
+    now = now or time.time()
+    if _CACHE["payload"] and (now - _CACHE["ts"] < _CACHE["ttl"]):
+        record_cache("spot", True)
+        return _CACHE["payload"]
+    record_cache("spot", False)
+    payload, _ = single_flight("spot", lambda: _refresh(SimpleNamespace(), False, now))
+    return payload
+
+
 class handler(BaseHTTPRequestHandler):
+    @profiled
     def do_GET(self):
+        start_timing(self)
         try:
             qs = parse_qs(urlparse(self.path).query)
             force = (qs.get("force", ["0"])[0] or "0").strip().lower() in ("1", "true", "yes", "on")
 
             # Cache (protects your 100-request tier)
             now = time.time()
-            if (not force) and _CACHE["payload"] and (now - _CACHE["ts"] < CACHE_TTL_SECONDS):
+            if (not force) and _CACHE["payload"] and (now - _CACHE["ts"] < _CACHE["ttl"]):
+                record_cache("spot", True)
                 return send_json(self, 200, _CACHE["payload"])
+            record_cache("spot", False)
 
-            # Gold & silver are REQUIRED
-            gold_usd, silver_usd, gsr = _fetch_goldprice_gold_silver()
-
-            # Platinum is OPTIONAL (never break the endpoint)
-            platinum_usd = None
-            platinum_error = None
-            try:
-                platinum_usd = float(_fetch_metalpriceapi_platinum())
-            except (urllib.error.HTTPError, urllib.error.URLError, ValueError) as e:
-                platinum_error = str(e)
-            except Exception as e:
-                platinum_error = str(e)
-
-            payload = {
-                "ok": True,
-                "date": datetime.now(timezone.utc).date().isoformat(),
-                "gold_usd": float(gold_usd),
-                "silver_usd": float(silver_usd),
-                "platinum_usd": platinum_usd,  # may be None
-                "gsr": float(gsr),
-                "fetched_at_utc": _utc_now_iso(),
-                "source": "spot_mixed",
-                "sources": {
-                    "gold_silver": "spot_goldprice",
-                    "platinum": "spot_metalpriceapi",
-                },
-                "cache": {
-                    "ttl_seconds": CACHE_TTL_SECONDS,
-                    "forced": bool(force),
-                }
-            }
-
-            # Only include this key when something went wrong (keeps response clean)
-            if platinum_error:
-                payload["platinum_error"] = platinum_error
-
-            _CACHE["ts"] = now
-            _CACHE["payload"] = payload
+            payload, _ = single_flight("spot", lambda: _refresh(self, force, now))
             return send_json(self, 200, payload)
 
-        except (urllib.error.HTTPError, urllib.error.URLError, ValueError) as e:
+        except (urllib.error.HTTPError, urllib.error.URLError, ValueError, BreakerOpen) as e:
             # Keep this as 502 because it means gold/silver failed (critical)
-            return send_json(self, 502, {"ok": False, "error": str(e)})
+            return send_json(self, 502, {
+                "ok": False,
+                "error": str(e),
+                "providers": health("goldprice", "metalpriceapi", "stooq"),
+            })
         except Exception as e:
             return send_json(self, 500, {"ok": False, "error": str(e)})
 
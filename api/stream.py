@@ -0,0 +1,51 @@
+from http.server import BaseHTTPRequestHandler
+
+# Import fallback to avoid Vercel module-path edge cases
+try:
+    from ._utils import send_json
+    from ._stream import quote_hub
+except Exception:
+    from api._utils import send_json
+    from api._stream import quote_hub
+
+
+# GET /api/stream -> text/event-stream of live quotes (see api/_stream.py)
+#
+#   event: snapshot   all fields, sent once on connect
+#   event: quote      only the fields that changed
+#
+# Streaming needs a server that can hand the socket over to the publisher
+# (server.py exposes server.detach). Vercel functions buffer the whole
+# response, so there the endpoint answers 204, which tells EventSource not to
+# reconnect; clients then keep polling /api/spot. 503 when the hub is full.
+
+
+class handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        detach = getattr(self.server, "detach", None)
+        if detach is None:
+            self.send_response(204)
+            self.send_header("X-Stream-Fallback", "/api/spot")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        hub = quote_hub()
+        if hub.full():
+            return send_json(self, 503, {"ok": False, "error": "Too many stream subscribers", "poll": "/api/spot"})
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache, no-store")
+        self.send_header("X-Accel-Buffering", "no")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+
+        # From here on the hub writes to the socket; the worker is released
+        if hub.subscribe(self.connection):
+            detach(self.connection)
+
+    def log_message(self, *_):
+        return
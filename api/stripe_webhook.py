@@ -0,0 +1,83 @@
+from http.server import BaseHTTPRequestHandler
+import json
+import os
+
+# Import fallback to avoid Vercel module-path edge cases
+try:
+    from ._utils import db_connect, send_json, start_timing
+    from ._auth import ensure_users_table
+    from ._stripe_sync import ensure_stripe_events_table, record_event, drain_pending, verify_stripe_signature
+    from ._profiler import profiled
+except Exception:
+    from api._utils import db_connect, send_json, start_timing
+    from api._auth import ensure_users_table
+    from api._stripe_sync import ensure_stripe_events_table, record_event, drain_pending, verify_stripe_signature
+    from api._profiler import profiled
+
+
+class handler(BaseHTTPRequestHandler):
+    @profiled
+    def do_POST(self):
+        start_timing(self)
+        try:
+            secret = (os.environ.get("STRIPE_WEBHOOK_SECRET") or "").strip()
+            if not secret:
+                return send_json(self, 500, {"ok": False, "error": "Missing env var: STRIPE_WEBHOOK_SECRET"})
+
+            try:
+                length = int(self.headers.get("Content-Length") or "0")
+            except Exception:
+                length = 0
+            raw = self.rfile.read(length) if length > 0 else b""
+
+            sig = (self.headers.get("Stripe-Signature") or "").strip()
+            if not verify_stripe_signature(raw, sig, secret):
+                return send_json(self, 400, {"ok": False, "error": "Invalid Stripe signature"})
+
+            try:
+                event = json.loads(raw.decode("utf-8"))
+            except Exception:
+                return send_json(self, 400, {"ok": False, "error": "Invalid JSON"})
+            if not isinstance(event, dict) or not event.get("id"):
+                return send_json(self, 400, {"ok": False, "error": "Missing event id"})
+
+            conn = db_connect()
+            try:
+                ensure_users_table(conn)
+                ensure_stripe_events_table(conn)
+
+                # 1) Append (dedup by event id) and 2) apply everything pending in one batch
+                is_new = record_event(conn, event)
+                applied, written = drain_pending(conn)
+                conn.commit()
+            except Exception:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                raise
+            finally:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+            return send_json(self, 200, {
+                "ok": True,
+                "id": event["id"],
+                "type": event.get("type"),
+                "duplicate": not is_new,
+                "applied": applied,
+                "users_written": written,
+            })
+
+        except Exception as e:
+            # Non-2xx makes Stripe retry, which is what we want on DB errors
+            return send_json(self, 500, {"ok": False, "error": str(e)})
+
+    @profiled
+    def do_GET(self):
+        return send_json(self, 405, {"ok": False, "error": "Use POST"})
+
+    def log_message(self, *_):
+        return
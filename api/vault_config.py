@@ -4,8 +4,12 @@ import os
 
 try:
     from ._utils import send_json
+    from ._auth import resolve_entitlements
+    from ._profiler import profiled
 except Exception:
     from api._utils import send_json
+    from api._auth import resolve_entitlements
+    from api._profiler import profiled
 
 
 def _env(name: str, default: str = ""):
@@ -13,8 +17,34 @@ def _env(name: str, default: str = ""):
     return v if v else default
 
 
+def _clerk_user_id(headers):
+    """
+    Verified Clerk sub from the Authorization header, or None. The JWT
+    helpers load lazily so anonymous requests skip the PyJWT import.
+    """
+    auth = (headers.get("Authorization") or "").strip()
+    if not auth.startswith("Bearer "):
+        return None
+    try:
+        try:
+            from .vault_items import _verify_clerk_jwt
+        except Exception:
+            from api.vault_items import _verify_clerk_jwt
+        return _verify_clerk_jwt(auth.split(" ", 1)[1].strip())["sub"]
+    except Exception:
+        return None
+
+
 class handler(BaseHTTPRequestHandler):
+    @profiled
     def do_GET(self):
+        # Entitlements come from the signed token only (no DB round trip here).
+        # Header only: a token in the query string would leak into access
+        # logs, proxies and Referer headers. The token is bound to a Clerk
+        # user id, so it only counts alongside that user's Bearer session.
+        token = (self.headers.get("X-Entitlement-Token") or "").strip()
+        ent = resolve_entitlements(token=token or None, user_id=_clerk_user_id(self.headers))
+
         # Premium-ready config: the UI can render a "shelf" even before entitlements exist.
         config = {
             "ok": True,
@@ -72,14 +102,9 @@ class handler(BaseHTTPRequestHandler):
                 },
             ],
             "entitlements": {
-                # stub: later you’ll return real tier + flags
-                "tier": "free",
-                "features": {
-                    "virtual_shelf": True,       # show shelf UI
-                    "images": False,             # Pro unlock (thumbnails)
-                    "history": False,            # Pro unlock
-                    "alerts": False,             # Elite unlock
-                },
+                # virtual_shelf: always; images/history: Pro; alerts: Elite
+                "tier": ent["tier"],
+                "features": ent["features"],
             },
         }
 
@@ -6,21 +6,31 @@ import json
 import time
 
 try:
-    from ._utils import db_connect, send_json
+    from ._utils import db_connect, ensure_for_read, send_json, span, start_timing, record_cache
+    from ._auth import resolve_entitlements, sign_entitlement_token
+    from ._profiler import profiled
+    from ._http import get_json
 except Exception:
-    from api._utils import db_connect, send_json
+    from api._utils import db_connect, ensure_for_read, send_json, span, start_timing, record_cache
+    from api._auth import resolve_entitlements, sign_entitlement_token
+    from api._profiler import profiled
+    from api._http import get_json
 
 # ---- JWT / Clerk verification helpers ----
-try:
-    import jwt  # PyJWT
-    import requests
-except Exception:
-    jwt = None
-    requests = None
-
+# PyJWT (+ cryptography) is imported on first use, so the
+# OPTIONS preflight and auth failures never pay for them on cold start.
 _JWKS_CACHE = {"keys": None, "exp": 0}
 
 
+def _jwt():
+    try:
+        import jwt  # PyJWT
+        import jwt.algorithms
+    except Exception:
+        raise RuntimeError("Missing dependency 'PyJWT'")
+    return jwt
+
+
 # ----------------------------
 # Small utilities
 # ----------------------------
@@ -32,6 +42,11 @@ def _get_bearer_token(headers):
     return tok or None
 
 
+def _get_entitlement_token(headers):
+    tok = (headers.get("X-Entitlement-Token") or headers.get("x-entitlement-token") or "").strip()
+    return tok or None
+
+
 def _read_json_body(req: BaseHTTPRequestHandler):
     try:
         length = int(req.headers.get("Content-Length") or "0")
@@ -179,14 +194,11 @@ def _next_shelf_slot(cur, user_id: str, shelf_section: str):
 def _fetch_jwks(jwks_url: str, ttl_seconds: int = 3600):
     now = int(time.time())
     if _JWKS_CACHE["keys"] and now < _JWKS_CACHE["exp"]:
+        record_cache("jwks", True)
         return _JWKS_CACHE["keys"]
+    record_cache("jwks", False)
 
-    if not requests:
-        raise RuntimeError("Missing dependency 'requests'")
-
-    r = requests.get(jwks_url, timeout=8)
-    r.raise_for_status()
-    data = r.json()
+    data = get_json(jwks_url, deadline=8)
     keys = data.get("keys") if isinstance(data, dict) else None
     if not keys:
         raise RuntimeError("JWKS response missing 'keys'")
@@ -196,8 +208,7 @@ def _fetch_jwks(jwks_url: str, ttl_seconds: int = 3600):
 
 
 def _verify_clerk_jwt(token: str):
-    if not jwt:
-        raise RuntimeError("Missing dependency 'PyJWT'")
+    jwt = _jwt()
 
     jwks_url = (os.environ.get("CLERK_JWKS_URL") or "").strip()
     if not jwks_url:
@@ -244,18 +255,21 @@ class handler(BaseHTTPRequestHandler):
     def do_OPTIONS(self):
         self.send_response(204)
         self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Headers", "authorization, content-type")
+        self.send_header("Access-Control-Allow-Headers", "authorization, content-type, x-entitlement-token")
         self.send_header("Access-Control-Allow-Methods", "GET,POST,OPTIONS")
         self.end_headers()
 
-        def do_GET(self):
+    @profiled
+    def do_GET(self):
+        start_timing(self)
         try:
             token = _get_bearer_token(self.headers)
             if not token:
                 return send_json(self, 401, {"ok": False, "error": "Missing Bearer token"})
 
             try:
-                auth = _verify_clerk_jwt(token)
+                with span(self, "auth"):
+                    auth = _verify_clerk_jwt(token)
             except Exception as e:
                 # IMPORTANT: invalid/misconfigured auth should be 401, not 500
                 return send_json(self, 401, {"ok": False, "error": f"Unauthorized: {str(e)}"})
@@ -277,9 +291,11 @@ class handler(BaseHTTPRequestHandler):
             if type_filter and not _is_allowed_item_type(type_filter):
                 return send_json(self, 400, {"ok": False, "error": "Invalid type filter"})
 
-            conn = db_connect()
+            with span(self, "db_connect"):
+                conn = db_connect("read")
             try:
-                ensure_table(conn)
+                with span(self, "ensure_table"):
+                    ensure_for_read(conn, ensure_table)
                 cur = conn.cursor()
 
                 where = ["user_id = %s"]
@@ -295,24 +311,25 @@ class handler(BaseHTTPRequestHandler):
 
                 vals.append(limit)
 
-                cur.execute(
-                    f"""
-                    select
-                      id, label, metal, item_type,
-                      weight_value, weight_unit, purity,
-                      premium_pct, notes, source,
-                      shelf_section, shelf_slot, accent, qty, created_at
-                    from vault_items
-                    where {' and '.join(where)}
-                    order by
-                      coalesce(shelf_section, 'Main') asc,
-                      (case when shelf_slot is null then 999999 else shelf_slot end) asc,
-                      created_at desc
-                    limit %s
-                    """,
-                    tuple(vals),
-                )
-                rows = cur.fetchall() or []
+                with span(self, "query"):
+                    cur.execute(
+                        f"""
+                        select
+                          id, label, metal, item_type,
+                          weight_value, weight_unit, purity,
+                          premium_pct, notes, source,
+                          shelf_section, shelf_slot, accent, qty, created_at
+                        from vault_items
+                        where {' and '.join(where)}
+                        order by
+                          coalesce(shelf_section, 'Main') asc,
+                          (case when shelf_slot is null then 999999 else shelf_slot end) asc,
+                          created_at desc
+                        limit %s
+                        """,
+                        tuple(vals),
+                    )
+                    rows = cur.fetchall() or []
 
                 items = []
                 for r in rows:
@@ -337,31 +354,57 @@ class handler(BaseHTTPRequestHandler):
                     )
 
                 # Section breakdown for UI shelves
-                cur.execute(
-                    """
-                    select coalesce(shelf_section,'Main') as section, count(*)::int
-                    from vault_items
-                    where user_id = %s
-                    group by 1
-                    order by 1 asc
-                    """,
-                    (user_id,),
-                )
-                sec_rows = cur.fetchall() or []
+                with span(self, "sections"):
+                    cur.execute(
+                        """
+                        select coalesce(shelf_section,'Main') as section, count(*)::int
+                        from vault_items
+                        where user_id = %s
+                        group by 1
+                        order by 1 asc
+                        """,
+                        (user_id,),
+                    )
+                    sec_rows = cur.fetchall() or []
                 sections = [{"section": s, "count": int(c)} for (s, c) in sec_rows]
 
+                # Tier gating: token/cache first, users table only on a miss
+                email = _safe_str(auth["claims"].get("email"), 320) or None
+                try:
+                    with span(self, "entitlements"):
+                        ent = resolve_entitlements(
+                            token=_get_entitlement_token(self.headers),
+                            email=email,
+                            conn=conn,
+                            user_id=user_id,
+                        )
+                except Exception:
+                    ent = resolve_entitlements()
+
+                meta = {
+                    "tier": ent["tier"],
+                    "features": ent["features"],
+                    "count": len(items),
+                    "limit": limit,
+                    "sections": sections,
+                }
+
+                # Hand back a fresh token after a DB lookup so the next request can skip it
+                if ent["source"] == "db":
+                    try:
+                        meta["entitlement_token"] = sign_entitlement_token(
+                            ent["email"], ent["tier"], ent["ver"], user_id=ent["user_id"]
+                        )
+                    except Exception:
+                        pass
+
                 return send_json(
                     self,
                     200,
                     {
                         "ok": True,
                         "items": items,
-                        "meta": {
-                            "tier": "free",
-                            "count": len(items),
-                            "limit": limit,
-                            "sections": sections,
-                        },
+                        "meta": meta,
                     },
                 )
             finally:
@@ -373,14 +416,17 @@ class handler(BaseHTTPRequestHandler):
         except Exception as e:
             return send_json(self, 500, {"ok": False, "error": str(e)})
 
-        def do_POST(self):
+    @profiled
+    def do_POST(self):
+        start_timing(self)
         try:
             token = _get_bearer_token(self.headers)
             if not token:
                 return send_json(self, 401, {"ok": False, "error": "Missing Bearer token"})
 
             try:
-                auth = _verify_clerk_jwt(token)
+                with span(self, "auth"):
+                    auth = _verify_clerk_jwt(token)
             except Exception as e:
                 return send_json(self, 401, {"ok": False, "error": f"Unauthorized: {str(e)}"})
 
@@ -392,9 +438,11 @@ class handler(BaseHTTPRequestHandler):
             if action not in ("create", "delete", "update", "reorder"):
                 return send_json(self, 400, {"ok": False, "error": "Invalid action"})
 
-            conn = db_connect()
+            with span(self, "db_connect"):
+                conn = db_connect()
             try:
-                ensure_table(conn)
+                with span(self, "ensure_table"):
+                    ensure_table(conn)
                 cur = conn.cursor()
 
                 # ----------------------------
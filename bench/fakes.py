@@ -0,0 +1,280 @@
+"""
+In-memory stand-in for the pg8000 connections the handlers use.
+
+FakeDB understands exactly the statements issued by api/latest.py,
+api/vault_items.py, api/backfill_gsr.py, api/cron_gsr.py,
+api/_gsr_index.py, api/_indicators.py, api/_backtest.py, api/_rollups.py,
+api/_schema.py and api/_pricing.py
+(matched on table + verb) and returns tuples typed the way pg8000 returns them
+(datetime.date / Decimal / datetime), so serialization cost is realistic.
+Anything else (DDL, advisory locks) succeeds and returns nothing useful.
+"""
+import datetime
+from bisect import bisect_left, bisect_right, insort
+from decimal import Decimal
+
+
+def _norm(sql: str) -> str:
+    return " ".join((sql or "").lower().split())
+
+
+def _numeric_text(v) -> str:
+    # value::numeric::text: a float8 cast to numeric keeps 15 significant digits
+    return "%.15g" % v if isinstance(v, float) else str(v)
+
+
+class FakeDB:
+    def __init__(self):
+        self.gsr_daily = []  # [(d, gold, silver, gsr, fetched_at, source)] ascending by d
+        self.gsr_indicators = {}  # d -> (gsr, *_indicators.COLUMNS)
+        self._indicator_dates = []  # sorted keys of gsr_indicators
+        self.gsr_ohlc = {}  # interval -> {bucket: (first_d, last_d, days, *_rollups.COLUMNS)}
+        self.vault_items = []  # [tuple in vault_items select order + user_id]
+        self.users = {}
+        self.queries = 0
+        self.rows_fetched = 0
+        self.compact = False  # gsr_daily layout (api/_schema.py): float prices, generated gsr
+        self.replica_lag = 0.0  # seconds reported to the replica staleness guard (api/_utils.py)
+        self._next_id = 1
+
+    # ---- seeding
+    def seed_history(self, n_rows: int, fresh_today: bool = True, compact: bool = False):
+        """
+        compact=True: the compact layout, prices as float (double precision).
+        """
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        now = datetime.datetime.now(datetime.timezone.utc)
+        start = today - datetime.timedelta(days=n_rows - 1)
+        rows = []
+        for i in range(n_rows):
+            d = start + datetime.timedelta(days=i)
+            gold = Decimal("1200.00") + Decimal(i % 900) / Decimal("3")
+            silver = Decimal("15.000") + Decimal(i % 400) / Decimal("40")
+            gsr = (gold / silver).quantize(Decimal("0.000001"))
+            fetched = now if (fresh_today and d == today) else now - datetime.timedelta(days=n_rows - i)
+            if compact:
+                gold, silver = float(gold), float(silver)
+                gsr = gold / silver
+            rows.append((d, gold, silver, gsr, fetched, "bench"))
+        self.gsr_daily = rows
+        self.compact = compact
+        return self
+
+    def stale_today(self, minutes: int = 120):
+        """
+        Backdates the newest row so the next /api/latest takes the self-heal path.
+        """
+        if self.gsr_daily:
+            d, g, s, r, ts, src = self.gsr_daily[-1]
+            self.gsr_daily[-1] = (d, g, s, r, ts - datetime.timedelta(minutes=minutes), src)
+        return self
+
+    def tick_today(self, step: str = "0.01"):
+        """
+        Moves the newest row's ratio, as a self-heal refresh of today would.
+        """
+        if self.gsr_daily:
+            d, g, s, r, _, src = self.gsr_daily[-1]
+            now = datetime.datetime.now(datetime.timezone.utc)
+            self.gsr_daily[-1] = (d, g, s, r + type(r)(step), now, src)
+        return self
+
+    def seed_vault(self, user_id: str, n_items: int):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        metals = ("gold", "silver", "platinum")
+        sections = ("Main", "Coins", "Bullion", "Jewelry")
+        self.vault_items = []
+        for i in range(n_items):
+            self.vault_items.append((
+                self._next_id, f"Item {i}", metals[i % 3], "coin",
+                1.0 + (i % 10), "oz", 0.999, 3.5, "", "manual",
+                sections[i % 4], i, None, 1, now - datetime.timedelta(minutes=i),
+                user_id,
+            ))
+            self._next_id += 1
+        return self
+
+    def connect(self, role="write", timeout=None):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, db: FakeDB):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db: FakeDB):
+        self.db = db
+        self._rows = []
+        self.rowcount = -1
+
+    def execute(self, sql, params=()):
+        self.db.queries += 1
+        q = _norm(sql)
+        params = tuple(params or ())
+        self._rows = []
+
+        if "pg_try_advisory_lock" in q:
+            self._rows = [(True,)]
+        elif "pg_is_in_recovery()" in q:
+            self._rows = [(Decimal(str(self.db.replica_lag)),)]
+        elif q.startswith("select attgenerated") and "to_regclass('gsr_daily')" in q:
+            self._rows = [(self.db.compact,)]
+        elif "from gsr_daily" in q and "where d = %s" in q:
+            d = params[0]
+            if isinstance(d, str):
+                d = datetime.date.fromisoformat(d)
+            self._rows = [r for r in self.db.gsr_daily[-3:] if r[0] == d][:1]
+        elif q.startswith("select coalesce(json_agg(") and "from gsr_daily" in q:
+            # Server-side history JSON: formatted the way Postgres json_agg /
+            # json_build_object print it, one row back
+            rows = self.db.gsr_daily
+            if "where d > %s" in q:
+                rows = rows[bisect_right([r[0] for r in rows], params[0]):]
+            if "limit %s" in q:
+                rows = rows[len(rows) - min(len(rows), int(params[-1])):]
+            items = [
+                f'{{"date" : "{r[0].isoformat()}", "gold_usd" : "{_numeric_text(r[1])}", '
+                f'"silver_usd" : "{_numeric_text(r[2])}", "gsr" : "{_numeric_text(r[3])}"}}'
+                for r in rows
+            ]
+            text = "[" + ", \n ".join(items) + "]"
+            self._rows = [(text, len(rows))] if "count(*)" in q else [(text,)]
+        elif q.startswith("select gsr from gsr_daily where d < %s order by d desc"):
+            i = bisect_left([r[0] for r in self.db.gsr_daily], params[0])
+            self._rows = [(r[3],) for r in self.db.gsr_daily[max(0, i - int(params[1])):i][::-1]]
+        elif "from gsr_daily where d > %s order by d desc" in q:
+            i = bisect_right([r[0] for r in self.db.gsr_daily], params[0])
+            self._rows = [r[:4] for r in self.db.gsr_daily[i:][::-1][:int(params[1])]]
+        elif "from gsr_daily" in q and "order by d desc" in q:
+            limit = int(params[0]) if params else 1
+            rows = self.db.gsr_daily[-limit:][::-1]
+            if q.startswith("select d, gold_usd, silver_usd, gsr from"):
+                rows = [r[:4] for r in rows]
+            self._rows = rows
+        elif q.startswith("select max(fetched_at_utc), min(d), max(d) from gsr_daily"):
+            rows = self.db.gsr_daily
+            if rows:
+                self._rows = [(max(r[4] for r in rows), rows[0][0], rows[-1][0])]
+            else:
+                self._rows = [(None, None, None)]
+        elif q.startswith("select d, gsr from gsr_daily") and "order by d asc" in q:
+            rows = self.db.gsr_daily
+            if "where d >= %s" in q:
+                rows = [r for r in rows if r[0] >= params[0]]
+            elif "where fetched_at_utc > %s" in q:
+                rows = [r for r in rows if r[4] > params[0]]
+            self._rows = [(r[0], r[3]) for r in rows]
+        elif q.startswith("select d, gold_usd, silver_usd from gsr_daily order by d asc"):
+            self._rows = [r[:3] for r in self.db.gsr_daily]
+        elif q.startswith("select d, gold_usd, silver_usd, gsr from gsr_daily") and "order by d asc" in q:
+            rows = self.db.gsr_daily
+            if "where d >= %s" in q:
+                rows = rows[bisect_left([r[0] for r in rows], params[0]):]
+            self._rows = [r[:4] for r in rows]
+        elif q.startswith("select interval, max(bucket) from gsr_ohlc"):
+            self._rows = [(k, max(v)) for k, v in self.db.gsr_ohlc.items() if v]
+        elif q.startswith("insert into gsr_ohlc"):
+            interval, buckets, *cols = params
+            stored = self.db.gsr_ohlc.setdefault(interval, {})
+            for i, b in enumerate(buckets):
+                stored[b] = tuple(c[i] for c in cols)
+        elif q.startswith("select bucket, first_d") and "from gsr_ohlc" in q:
+            stored = self.db.gsr_ohlc.get(params[0], {})
+            picked = sorted(stored, reverse=True)[:int(params[1])]
+            self._rows = [(b, *stored[b]) for b in picked]
+        elif q.startswith("insert into gsr_daily"):
+            # One unnest() upsert per batch: an array per column
+            if self.db.compact:
+                if ", gsr," in q[:q.index(")")]:
+                    raise ValueError('cannot insert a non-DEFAULT value into column "gsr"')
+                batch = [(d, float(g), float(s), float(g) / float(s), ts, src) for d, g, s, ts, src in zip(*params)]
+            else:
+                if len(params) != 6:
+                    raise ValueError('null value in column "gsr" violates not-null constraint')
+                batch = [
+                    (d, Decimal(str(g)), Decimal(str(s)), Decimal(str(r)), ts, src)
+                    for d, g, s, r, ts, src in zip(*params)
+                ]
+            written = {}
+            for d, g, s, r, ts, src in batch:
+                if isinstance(d, str):
+                    d = datetime.date.fromisoformat(d)
+                if isinstance(ts, str):
+                    ts = datetime.datetime.fromisoformat(ts)
+                written[d] = (d, g, s, r, ts, src)
+            rows = self.db.gsr_daily
+            if rows and min(written) > rows[-1][0]:
+                rows.extend(written[d] for d in sorted(written))
+            else:
+                merged = {r[0]: r for r in rows}
+                merged.update(written)
+                rows[:] = [merged[d] for d in sorted(merged)]
+        elif q.startswith("select max(d) from gsr_indicators"):
+            self._rows = [(self.db._indicator_dates[-1] if self.db._indicator_dates else None,)]
+        elif q.startswith("select ema_") and "from gsr_indicators where d < %s" in q:
+            from api._indicators import COLUMNS
+            dates = self.db._indicator_dates
+            i = bisect_left(dates, params[0])
+            if i:
+                vals = dict(zip(COLUMNS, self.db.gsr_indicators[dates[i - 1]][1:]))
+                cols = q[len("select "):q.index(" from ")].split(", ")
+                self._rows = [tuple(vals[c] for c in cols)]
+        elif q.startswith("select d, gsr,") and "from gsr_indicators" in q:
+            from api._indicators import COLUMNS
+            cols = q[len("select d, gsr, "):q.index(" from ")].split(", ")
+            pos = [COLUMNS.index(c) + 1 for c in cols]
+            dates = self.db._indicator_dates
+            picked = dates[bisect_left(dates, params[0]):bisect_right(dates, params[1])]
+            self._rows = [(d, v[0], *(v[p] for p in pos))
+                          for d, v in ((d, self.db.gsr_indicators[d]) for d in picked)]
+        elif q.startswith("insert into gsr_indicators"):
+            dates = [datetime.date.fromisoformat(d) if isinstance(d, str) else d for d in params[0]]
+            for i, d in enumerate(dates):
+                if d not in self.db.gsr_indicators:
+                    insort(self.db._indicator_dates, d)
+                self.db.gsr_indicators[d] = tuple(col[i] for col in params[1:])
+        elif "from vault_items" in q and q.startswith("select id, label"):
+            user_id, limit = params[0], int(params[-1])
+            self._rows = [r[:15] for r in self.db.vault_items if r[15] == user_id][:limit]
+        elif "from vault_items" in q and "count(*)" in q:
+            counts = {}
+            for r in self.db.vault_items:
+                counts[r[10]] = counts.get(r[10], 0) + 1
+            self._rows = sorted(counts.items())
+        elif "coalesce(max(shelf_slot), -1) + 1" in q:
+            slots = [r[11] for r in self.db.vault_items if r[15] == params[0] and r[10] == params[1]]
+            self._rows = [((max(slots) + 1) if slots else 0,)]
+        elif q.startswith("insert into vault_items"):
+            now = datetime.datetime.now(datetime.timezone.utc)
+            new_id = self.db._next_id
+            self.db._next_id += 1
+            (user_id, label, metal, item_type, wv, wu, purity, prem, notes, source, sec, slot, accent, qty) = params
+            self.db.vault_items.append(
+                (new_id, label, metal, item_type, wv, wu, purity, prem, notes, source, sec, slot, accent, qty, now, user_id)
+            )
+            self._rows = [(new_id, now)]
+        elif "from users" in q and q.startswith("select tier"):
+            self._rows = [self.db.users[params[0]]] if params and params[0] in self.db.users else []
+        # DDL, unlocks, updates: accepted, no result
+
+    def fetchone(self):
+        self.db.rows_fetched += bool(self._rows)
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        self.db.rows_fetched += len(self._rows)
+        return list(self._rows)
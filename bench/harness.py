@@ -0,0 +1,90 @@
+"""
+Drives a BaseHTTPRequestHandler subclass in-process: no socket, no server.
+The handler's own do_<METHOD> runs against BytesIO rfile/wfile, exactly the
+code path Vercel runs, and the raw response is parsed back.
+"""
+import io
+import json
+import time
+from email.parser import BytesParser
+from http.client import HTTPMessage
+
+
+def _headers(d):
+    msg = HTTPMessage()
+    for k, v in (d or {}).items():
+        msg[k] = v
+    return msg
+
+
+def call(handler_cls, method: str, path: str, headers=None, body=None):
+    """
+    Returns (status, headers_dict, body_bytes).
+    """
+    raw_body = b""
+    if body is not None:
+        raw_body = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+    hdrs = dict(headers or {})
+    if raw_body:
+        hdrs.setdefault("Content-Type", "application/json")
+        hdrs["Content-Length"] = str(len(raw_body))
+
+    h = handler_cls.__new__(handler_cls)
+    h.rfile = io.BytesIO(raw_body)
+    h.wfile = io.BytesIO()
+    h.client_address = ("127.0.0.1", 0)
+    h.server = None
+    h.command = method
+    h.path = path
+    h.request_version = "HTTP/1.1"
+    h.requestline = f"{method} {path} HTTP/1.1"
+    h.close_connection = True
+    h.headers = _headers(hdrs)
+
+    getattr(h, "do_" + method)()
+    if hasattr(h, "_headers_buffer") and h._headers_buffer:
+        h.flush_headers()
+
+    raw = h.wfile.getvalue()
+    head, _, payload = raw.partition(b"\r\n\r\n")
+    status_line, _, header_blob = head.partition(b"\r\n")
+    status = int(status_line.split()[1])
+    parsed = BytesParser().parsebytes(header_blob + b"\r\n\r\n", headersonly=True)
+    return status, dict(parsed.items()), payload
+
+
+def measure(fn, iterations: int, warmup: int = 2):
+    """
+    Runs fn() warmup + iterations times; returns per-call latencies in ms.
+    """
+    for _ in range(warmup):
+        fn()
+    out = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t0) * 1000.0)
+    return out
+
+
+def summarize(name: str, samples_ms, extra=None):
+    s = sorted(samples_ms)
+    n = len(s)
+
+    def pct(q):
+        if not n:
+            return None
+        return round(s[min(n - 1, int(round(q * (n - 1))))], 3)
+
+    total_s = sum(s) / 1000.0
+    out = {
+        "name": name,
+        "iterations": n,
+        "mean_ms": round(sum(s) / n, 3) if n else None,
+        "p50_ms": pct(0.50),
+        "p99_ms": pct(0.99),
+        "max_ms": round(s[-1], 3) if n else None,
+        "throughput_rps": round(n / total_s, 1) if total_s > 0 else None,
+    }
+    out.update(extra or {})
+    return out
@@ -0,0 +1,131 @@
+"""
+Thundering-herd harness: fires N concurrent requests at an endpoint whose
+cache is cold / whose today row is stale, with the upstream simulator adding
+latency so the requests overlap, and asserts the upstream saw exactly the
+expected number of calls (one per upstream resource).
+
+  python bench/herd.py                  # all scenarios, N=50
+  python bench/herd.py -n 200 --only spot
+  python bench/herd.py --no-single-flight   # show the uncoalesced herd (expected to fail)
+
+Exits 1 when any scenario made a different number of upstream calls or when a
+request did not return 200.
+"""
+import argparse
+import os
+import re
+import sys
+import threading
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+
+from bench.fakes import FakeDB  # noqa: E402
+from bench.harness import call  # noqa: E402
+from bench.stubs import StubUpstreams  # noqa: E402
+
+
+def _fire(n: int, fn):
+    barrier = threading.Barrier(n)
+    statuses = [None] * n
+
+    def worker(i):
+        barrier.wait()
+        try:
+            statuses[i] = fn()[0]
+        except Exception as e:  # the harness reports, never raises
+            statuses[i] = repr(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return statuses
+
+
+def scenario_spot(stubs):
+    from api import spot
+
+    spot._CACHE.update({"ts": 0.0, "payload": None})
+    return (lambda: call(spot.handler, "GET", "/api/spot")), {"/dbXRates/USD": 1, "/v1/latest": 1}
+
+
+def scenario_platinum_live(stubs):
+    from api import platinum_live
+
+    platinum_live._CACHE.update({"ts": 0, "platinum_usd": None, "updated": None})
+    return (lambda: call(platinum_live.handler, "GET", "/api/platinum_live")), {"/q/l/": 1}
+
+
+def scenario_futures(stubs):
+    from api import futures
+
+    # Three symbols -> one Stooq call each
+    return (lambda: call(futures.handler, "GET", "/api/futures")), {"/q/l/": 3}
+
+
+def scenario_latest(stubs):
+    from api import latest
+
+    db = FakeDB().seed_history(30).stale_today()
+    latest.db_connect = db.connect
+    return (lambda: call(latest.handler, "GET", "/api/latest?limit=30&stale_minutes=1")), {"/dbXRates/USD": 1}
+
+
+SCENARIOS = {
+    "spot": scenario_spot,
+    "platinum_live": scenario_platinum_live,
+    "futures": scenario_futures,
+    "latest": scenario_latest,
+}
+
+
+def _disable_single_flight():
+    from api import futures, latest, platinum_live, spot
+
+    for mod in (futures, latest, platinum_live, spot):
+        mod.single_flight = lambda key, fn, timeout=None: (fn(), False)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Concurrent cache-miss harness")
+    ap.add_argument("-n", type=int, default=50, help="concurrent requests per scenario")
+    ap.add_argument("--latency-ms", type=float, default=150.0, help="simulated upstream latency")
+    ap.add_argument("--only", help="regex over scenario names: " + ", ".join(SCENARIOS))
+    ap.add_argument("--no-single-flight", action="store_true", help="bypass single_flight (baseline)")
+    args = ap.parse_args(argv)
+
+    stubs = StubUpstreams(config={"*": {"latency": {"dist": "fixed", "ms": args.latency_ms}}}).start()
+    os.environ.update(stubs.env())
+    os.environ["METALPRICEAPI_KEY"] = "bench"
+    if args.no_single_flight:
+        _disable_single_flight()
+
+    failed = False
+    try:
+        for name, setup in SCENARIOS.items():
+            if args.only and not re.search(args.only, name):
+                continue
+            fn, expected = setup(stubs)
+            stubs.hits.clear()
+            statuses = _fire(args.n, fn)
+
+            bad = [s for s in statuses if s != 200]
+            hits = {path: stubs.hits.get(path, 0) for path in expected}
+            ok = not bad and all(hits[p] == expected[p] for p in expected)
+            failed = failed or not ok
+            print(
+                f"{name:<14} n={args.n:<4} upstream calls {hits} (expected {expected})"
+                f"  non-200={len(bad)}  {'ok' if ok else 'FAIL'}"
+            )
+            if bad:
+                print(f"    e.g. {bad[0]}")
+    finally:
+        stubs.stop()
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
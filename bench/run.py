@@ -0,0 +1,627 @@
+"""
+Offline endpoint benchmarks.
+
+  python bench/run.py                         # all scenarios -> bench/results/latest.json
+  python bench/run.py --only latest --quick
+  python bench/run.py --compare bench/results/baseline.json --threshold 0.25
+  python bench/run.py --only upstream --upstream-config sim.json --seed 1
+
+Each scenario drives a real api/* handler class in-process (bench/harness.py)
+against an in-memory Postgres stand-in (bench/fakes.py) and the local
+upstream simulator (bench/stubs.py; --upstream-config injects latency and
+faults). Results are written as JSON (p50/p99/mean/throughput, status mix,
+DB queries and upstream calls per request). With --compare, exits 1 when any
+scenario's p50 regressed by more than --threshold.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+
+from bench.fakes import FakeDB  # noqa: E402
+from bench.harness import call, measure, summarize  # noqa: E402
+from bench.stubs import StubUpstreams  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+
+CRON_SECRET = "bench-secret"
+USER_ID = "user_bench"
+
+
+def _iters(n_rows: int, quick: bool) -> int:
+    base = 200 if n_rows <= 1000 else (40 if n_rows <= 15000 else 15)
+    return max(3, base // 5) if quick else base
+
+
+class Bench:
+    def __init__(self, quick: bool, upstream_config=None, seed=None):
+        self.quick = quick
+        self.faulty = bool(upstream_config)
+        self.stubs = StubUpstreams(config=upstream_config, seed=seed).start()
+        self.results = []
+        self.tmpdir = tempfile.mkdtemp(prefix="gsr-bench-")
+
+        os.environ["CRON_SECRET"] = CRON_SECRET
+        os.environ["METALPRICEAPI_KEY"] = "bench"
+        os.environ["CLERK_JWKS_URL"] = self.stubs.base_url + "/jwks"
+        os.environ.update(self.stubs.env())
+        os.environ.pop("CLERK_ISSUER", None)
+        os.environ.pop("CLERK_AUDIENCE", None)
+
+        self.token = self._make_clerk_token()
+
+    def close(self):
+        self.stubs.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    # ---- helpers
+    def _make_clerk_token(self):
+        import jwt
+        from jwt.algorithms import RSAAlgorithm
+        from cryptography.hazmat.primitives.asymmetric import rsa
+
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwk = json.loads(RSAAlgorithm.to_jwk(key.public_key()))
+        jwk.update({"kid": "bench", "alg": "RS256", "use": "sig"})
+        self.stubs.jwks = [jwk]
+
+        now = int(time.time())
+        return jwt.encode(
+            {"sub": USER_ID, "iat": now, "exp": now + 3600, "email": "bench@example.com"},
+            key,
+            algorithm="RS256",
+            headers={"kid": "bench"},
+        )
+
+    def _run(self, name, fn, iterations, db=None, check=200):
+        status, _, body = fn()
+        if status != check and not self.faulty:
+            raise RuntimeError(f"{name}: expected {check}, got {status}: {body[:200]!r}")
+
+        statuses = {}
+
+        def counted():
+            out = fn()
+            statuses[str(out[0])] = statuses.get(str(out[0]), 0) + 1
+            return out
+
+        q0 = db.queries if db else 0
+        r0 = db.rows_fetched if db else 0
+        u0 = self.stubs.total_hits()
+        samples = measure(counted, iterations, warmup=1)
+        calls = len(samples) + 1  # measure() warmup
+
+        extra = {
+            "statuses": statuses,
+            "response_bytes": len(body),
+            "db_queries_per_req": round(((db.queries - q0) if db else 0) / calls, 2),
+            "db_rows_per_req": round(((db.rows_fetched - r0) if db else 0) / calls, 1),
+            "upstream_calls_per_req": round((self.stubs.total_hits() - u0) / calls, 2),
+        }
+        res = summarize(name, samples, extra)
+        self.results.append(res)
+        print(f"{name:<32} p50 {res['p50_ms']:>9.3f} ms  p99 {res['p99_ms']:>9.3f} ms  {res['throughput_rps']:>9} rps"
+              f"  {extra['db_rows_per_req']:>9} db rows")
+        return res
+
+    # ---- scenarios
+    def latest(self):
+        from api import latest, _frozen, _schema
+
+        # Baseline scenarios read every row from the (fake) DB as tuples
+        _frozen.FROZEN_PATH = ""
+        latest.HISTORY_DB_JSON = False
+        for n in (1000, 15000, 50000):
+            db = FakeDB().seed_history(n)
+            latest.db_connect = db.connect
+            self._run(
+                f"latest_history_{n // 1000}k",
+                lambda: call(latest.handler, "GET", f"/api/latest?limit={n}"),
+                _iters(n, self.quick),
+                db,
+            )
+
+        # Compact gsr_daily layout (api/_schema.py): rows come back as floats.
+        # FakeDB skips pg8000's text decode (Decimal(text) ~340 ns vs
+        # float(text) ~90 ns per cell), so this shows only the encode side,
+        # where price_text(float) costs more than str(Decimal): expect it
+        # slower than latest_history_15k. The DB-side JSON path does neither
+        # in Python
+        db = FakeDB().seed_history(15000, compact=True)
+        latest.db_connect = db.connect
+        # layout() is cached per process: forget it whenever the layout changes
+        _schema.forget_layout()
+        self._run(
+            "latest_history_15k_compact",
+            lambda: call(latest.handler, "GET", "/api/latest?limit=15000"),
+            _iters(15000, self.quick),
+            db,
+        )
+        # Both paths print float8 prices with numeric's 15 significant digits
+        # (65.43, not 65.43000000000001)
+        for db_json in (False, True):
+            latest.HISTORY_DB_JSON = db_json
+            out = json.loads(call(latest.handler, "GET", "/api/latest?limit=15000")[2])
+            long = [v for h in out["history"] for v in (h["gold_usd"], h["silver_usd"], h["gsr"])
+                    if len(v.replace(".", "").lstrip("0")) > 15]
+            if long:
+                raise RuntimeError(f"latest_history_15k_compact: {len(long)} values past 15 digits, e.g. {long[:3]}")
+        latest.HISTORY_DB_JSON = False
+        print(f"{'latest_history_15k_compact_text':<32} 15 significant digits on both paths  ok")
+
+        # Same 15k window with everything older than 28 days in a frozen segment
+        db = FakeDB().seed_history(15000)
+        latest.db_connect = db.connect
+        _schema.forget_layout()
+        cutoff = db.gsr_daily[-1][0] - datetime.timedelta(days=28)
+        seg_path = os.path.join(self.tmpdir, "gsr_frozen.bin")
+        with open(seg_path, "wb") as f:
+            f.write(_frozen.pack([r[:4] for r in db.gsr_daily if r[0] < cutoff]))
+        _frozen.FROZEN_PATH = seg_path
+        self._run(
+            "latest_history_15k_frozen",
+            lambda: call(latest.handler, "GET", "/api/latest?limit=15000"),
+            _iters(15000, self.quick),
+            db,
+        )
+
+        # History encoded by the DB (json_agg text, one row) and spliced into
+        # the response. FakeDB formats that text in-process, so these timings
+        # include work Postgres would do; db_rows_per_req is the number to watch.
+        latest.HISTORY_DB_JSON = True
+        self._run(
+            "latest_history_15k_frozen_dbjson",
+            lambda: call(latest.handler, "GET", "/api/latest?limit=15000"),
+            _iters(15000, self.quick),
+            db,
+        )
+        # A stale segment (cut ~9 months back) must still return every day:
+        # the tail query covers the whole gap after its last day
+        stale = db.gsr_daily[-1][0] - datetime.timedelta(days=270)
+        seg_path = os.path.join(self.tmpdir, "gsr_frozen_stale.bin")
+        with open(seg_path, "wb") as f:
+            f.write(_frozen.pack([r[:4] for r in db.gsr_daily if r[0] < stale]))
+        _frozen.FROZEN_PATH = seg_path
+        want = [str(r[0]) for r in db.gsr_daily[-15000:]]
+        gap = sum(1 for r in db.gsr_daily if r[0] >= stale)
+        for db_json in (False, True):
+            latest.HISTORY_DB_JSON = db_json
+            out = json.loads(call(latest.handler, "GET", "/api/latest?limit=15000")[2])
+            got = [h["date"] for h in out["history"]]
+            if got != want or out["history_source"]["db"] != gap:
+                raise RuntimeError(f"latest_history_stale_segment: {len(got)} days, source {out['history_source']}")
+        print(f"{'latest_history_stale_segment':<32} {gap} days after {stale} read from the DB  ok")
+
+        _frozen.FROZEN_PATH = ""
+        db = FakeDB().seed_history(15000)
+        latest.db_connect = db.connect
+        self._run(
+            "latest_history_15k_dbjson",
+            lambda: call(latest.handler, "GET", "/api/latest?limit=15000"),
+            _iters(15000, self.quick),
+            db,
+        )
+        latest.HISTORY_DB_JSON = False
+
+        # ?indicators=all: stored lookups, then today's row moving under them
+        db = FakeDB().seed_history(15000)
+        latest.db_connect = db.connect
+        path = "/api/latest?limit=1000&indicators=all"
+        call(latest.handler, "GET", path)  # first call fills gsr_indicators
+        self._run("latest_indicators_1k_of_15k", lambda: call(latest.handler, "GET", path), _iters(1000, self.quick), db)
+
+        def indicators_today_moved():
+            db.tick_today()
+            return call(latest.handler, "GET", path)
+
+        self._run("latest_indicators_today_moved", indicators_today_moved, _iters(1000, self.quick) // 4, db)
+
+        # Frozen segment reaching the newest day: its rows keep 6 decimals, so
+        # the freshness check must compare the stored ratio with gsr_daily, or
+        # every request rebuilds gsr_indicators
+        db = FakeDB().seed_history(15000, compact=True)
+        latest.db_connect = db.connect
+        _schema.forget_layout()
+        seg_path = os.path.join(self.tmpdir, "gsr_frozen_all.bin")
+        with open(seg_path, "wb") as f:
+            f.write(_frozen.pack([r[:4] for r in db.gsr_daily]))
+        _frozen.FROZEN_PATH = seg_path
+        call(latest.handler, "GET", path)
+        _, _, body = call(latest.handler, "GET", path)
+        healed = json.loads(body)["self_heal"]["indicators"]
+        if healed:
+            raise RuntimeError(f"latest_indicators_frozen: indicators rebuilt on a fresh table: {healed}")
+        self._run("latest_indicators_frozen", lambda: call(latest.handler, "GET", path), _iters(1000, self.quick), db)
+        _frozen.FROZEN_PATH = ""
+
+        # Weekly candles: ~2.1k gsr_ohlc rows instead of 15k daily rows
+        db = FakeDB().seed_history(15000)
+        latest.db_connect = db.connect
+        _schema.forget_layout()
+        call(latest.handler, "GET", "/api/latest?interval=1w&limit=20000")  # first call fills gsr_ohlc
+        self._run(
+            "latest_candles_1w_of_15k",
+            lambda: call(latest.handler, "GET", "/api/latest?interval=1w&limit=20000"),
+            _iters(1000, self.quick),
+            db,
+        )
+        # The homepage's MAX range (public/app.js intervalForRange): monthly
+        # candles, limit sized to the months since 1793
+        self._run(
+            "latest_candles_1M_max",
+            lambda: call(latest.handler, "GET", "/api/latest?interval=1M&limit=2809"),
+            _iters(1000, self.quick),
+            db,
+        )
+
+        # Stale today row -> self-heal path (lock + upstream + upsert)
+        db = FakeDB().seed_history(1000, fresh_today=False)
+        latest.db_connect = db.connect
+
+        def self_heal():
+            db.stale_today()
+            return call(latest.handler, "GET", "/api/latest?limit=1000&stale_minutes=1")
+
+        self._run(
+            "latest_self_heal_1k",
+            self_heal,
+            _iters(1000, self.quick) // 4,
+            db,
+        )
+
+        db = FakeDB().seed_history(1000, fresh_today=False, compact=True)
+        latest.db_connect = db.connect
+        _schema.forget_layout()
+        self._run("latest_self_heal_1k_compact", self_heal, _iters(1000, self.quick) // 4, db)
+        _schema.forget_layout()
+
+    def vault(self):
+        from api import vault_items
+
+        auth = {"Authorization": f"Bearer {self.token}"}
+        for n in (10, 1000, 50000):
+            db = FakeDB().seed_vault(USER_ID, n)
+            vault_items.db_connect = db.connect
+            self._run(
+                f"vault_get_{n if n < 1000 else str(n // 1000) + 'k'}",
+                lambda: call(vault_items.handler, "GET", "/api/vault_items?limit=500", headers=auth),
+                _iters(max(n, 1000) if n > 1000 else 1000, self.quick),
+                db,
+            )
+
+            body = {
+                "action": "create",
+                "label": "Bench Eagle",
+                "metal": "gold",
+                "item_type": "coin",
+                "weight_value": 1,
+                "weight_unit": "oz",
+                "purity": 0.9167,
+            }
+            self._run(
+                f"vault_post_create_{n if n < 1000 else str(n // 1000) + 'k'}",
+                lambda: call(vault_items.handler, "POST", "/api/vault_items", headers=auth, body=body),
+                _iters(max(n, 1000) if n > 1000 else 1000, self.quick),
+                db,
+            )
+
+    def backfill(self):
+        from api import backfill_gsr
+
+        db = FakeDB()
+        backfill_gsr.db_connect = db.connect
+        for limit in (500, 5000):
+            self._run(
+                f"backfill_batch_{limit}",
+                lambda: call(backfill_gsr.handler, "GET", f"/api/backfill_gsr?secret={CRON_SECRET}&limit={limit}"),
+                5 if self.quick else 20,
+                db,
+            )
+
+        # A whole run: indicators and candles are recomputed once, on the last
+        # call, from the first date written (not once per batch)
+        db = FakeDB()
+        backfill_gsr.db_connect = db.connect
+        calls, recomputed, qs = 0, [], ""
+        while True:
+            status, _, body = call(backfill_gsr.handler, "GET", f"/api/backfill_gsr?secret={CRON_SECRET}&limit=2000{qs}")
+            out = json.loads(body)
+            if status != 200:
+                raise RuntimeError(f"backfill_full_run: {status} {body[:200]!r}")
+            calls += 1
+            if out["indicators"]:
+                recomputed.append(out["indicators"])
+            if not out["next_cursor"]:
+                break
+            qs = f"&cursor={out['next_cursor']}"
+        first = db.gsr_daily[0][0].isoformat()
+        if len(recomputed) != 1 or recomputed[0].get("from") != first:
+            raise RuntimeError(f"backfill_full_run: expected one recompute from {first}, got {recomputed}")
+        print(f"{'backfill_full_run':<32} {calls} calls  {len(db.gsr_daily)} rows  indicators {recomputed[0]}  ok")
+
+        # A bare date cursor without since (the run's start is unknown) must
+        # still recompute from the first date, not from its own batch
+        last = out["range"]["from"]
+        status, _, body = call(backfill_gsr.handler, "GET", f"/api/backfill_gsr?secret={CRON_SECRET}&limit=2000&cursor={last}")
+        out = json.loads(body)
+        if status != 200 or (out["indicators"] or {}).get("from") != first:
+            raise RuntimeError(f"backfill_bare_cursor: expected a recompute from {first}, got {body[:300]!r}")
+        print(f"{'backfill_bare_cursor':<32} cursor {last}  indicators {out['indicators']}  ok")
+
+    def upstream(self):
+        from api import spot, futures, cron_gsr, platinum_live
+
+        self._run("spot_forced", lambda: call(spot.handler, "GET", "/api/spot?force=1"), 10 if self.quick else 100)
+        self._run("spot_cached", lambda: call(spot.handler, "GET", "/api/spot"), 50 if self.quick else 1000)
+
+        # Quota ledger down (no DB here) and MetalPriceAPI down: platinum must
+        # still come from Stooq usdxpt
+        if not self.faulty:
+            self.stubs.configure({"metalpriceapi": {"error_rate": 1.0}})
+            try:
+                status, _, body = call(spot.handler, "GET", "/api/spot?force=1")
+                out = json.loads(body)
+                if status != 200 or out.get("platinum_usd") is None or out["sources"]["platinum"] != "spot_stooq_usdxpt":
+                    raise RuntimeError(f"spot with ledger + MetalPriceAPI down: {body[:300]!r}")
+                print(f"{'spot_ledger_and_metalpriceapi_down':<32} platinum from {out['sources']['platinum']}  ok")
+            finally:
+                self.stubs.configure({"metalpriceapi": {"error_rate": 0.0}})
+                spot._CACHE["payload"] = None
+
+        self._run("futures", lambda: call(futures.handler, "GET", "/api/futures"), 10 if self.quick else 100)
+
+        def platinum_uncached():
+            platinum_live._CACHE["platinum_usd"] = None
+            return call(platinum_live.handler, "GET", "/api/platinum_live")
+
+        self._run("platinum_live", platinum_uncached, 10 if self.quick else 100)
+
+        db = FakeDB().seed_history(10)
+        cron_gsr.db_connect = db.connect
+        self._run(
+            "cron_gsr",
+            lambda: call(cron_gsr.handler, "GET", "/api/cron_gsr", headers={"x-vercel-cron": "1"}),
+            10 if self.quick else 100,
+            db,
+        )
+
+    def analytics(self):
+        from api import analytics
+
+        db = FakeDB().seed_history(15000)
+        analytics.db_connect = db.connect
+        path = "/api/analytics?date=2010-06-30&from=2008-01-01&to=2012-12-31&value=80"
+        self._run("analytics_15k_cached", lambda: call(analytics.handler, "GET", path), _iters(1000, self.quick), db)
+
+        def moving_today():
+            db.tick_today()
+            return call(analytics.handler, "GET", path)
+
+        self._run("analytics_15k_today_moved", moving_today, _iters(1000, self.quick), db)
+
+    def backtest(self):
+        from api import backtest, _backtest
+
+        db = FakeDB().seed_history(15000)
+        backtest.db_connect = db.connect
+        path = "/api/backtest?enter=70,75,80,85,90&exit=40,45,50,55&fee_pct=0,0.5,1&premium_pct=0,2,4&top=3"
+
+        def uncached():
+            _backtest._CACHE.clear()
+            return call(backtest.handler, "GET", path)
+
+        self._run("backtest_15k_180_runs", uncached, 5 if self.quick else 30, db)
+        self._run("backtest_15k_cached", lambda: call(backtest.handler, "GET", path), _iters(1000, self.quick), db)
+
+        # A large grid (~1k (enter, exit) pairs) inline and on the shared
+        # process pool; the pool is started by the first call (_run's check
+        # call), so the timed calls show the warm pool. Pools only pay off
+        # with more than one CPU.
+        grid = ",".join(str(v) for v in range(60, 96))
+        big = f"/api/backtest?enter={grid}&exit={','.join(str(v) for v in range(30, 60))}&top=1"
+
+        def big_uncached():
+            _backtest._CACHE.clear()
+            return call(backtest.handler, "GET", big)
+
+        workers = _backtest.WORKERS
+        try:
+            _backtest.WORKERS = 1
+            self._run("backtest_15k_grid_inline", big_uncached, 3 if self.quick else 10, db)
+            _backtest.WORKERS = max(2, os.cpu_count() or 1)
+            self._run(f"backtest_15k_grid_pool_{_backtest.WORKERS}w", big_uncached, 3 if self.quick else 10, db)
+        finally:
+            _backtest.WORKERS = workers
+            _backtest._drop_pool()
+
+    def alerts(self):
+        """
+        Tick evaluation in api/_alerts.py against 100k / 250k rules; the
+        HTTP side is covered by cron_gsr / latest.
+        """
+        import random
+        from api._alerts import AlertIndex, OPS
+
+        rng = random.Random(7)
+        centers = {"gold": 2650.0, "silver": 31.4, "gsr": 84.4}
+        for n in (100000, 250000):
+            n_users = n // 10
+            rows = []
+            for i in range(n):
+                user_id = f"user_{i % n_users}"
+                op = OPS[i % 3]
+                if i % 4 == 3:
+                    rows.append((i, user_id, "vault_value", op, rng.uniform(5e3, 5e5)))
+                else:
+                    metric = ("gold", "silver", "gsr")[i % 4]
+                    rows.append((i, user_id, metric, op, centers[metric] * rng.uniform(0.7, 1.3)))
+            holdings = {f"user_{u}": {"gold": rng.uniform(1, 100), "silver": rng.uniform(0, 2000)}
+                        for u in range(n_users)}
+
+            t0 = time.perf_counter()
+            idx = AlertIndex(rows)
+            build_ms = (time.perf_counter() - t0) * 1000.0
+
+            prev = {"gold": 2650.0, "silver": 31.4, "gsr": 2650.0 / 31.4, "platinum": 980.0}
+            new = {"gold": 2662.5, "silver": 31.1, "gsr": 2662.5 / 31.1}
+            fired = idx.fired(prev, new, holdings)
+            label = f"alerts_tick_{n // 1000}k"
+            res = summarize(
+                label,
+                measure(lambda: idx.fired(prev, new, holdings), 20 if self.quick else 200),
+                {"rules": idx.size, "fired_per_tick": len(fired), "index_build_ms": round(build_ms, 1)},
+            )
+            self.results.append(res)
+            print(f"{label:<32} p50 {res['p50_ms']:>9.3f} ms  p99 {res['p99_ms']:>9.3f} ms  "
+                  f"fired {len(fired)}  build {build_ms:.0f} ms")
+
+    def routing(self):
+        """
+        db_connect(role) routing in api/_utils.py against a primary and a
+        replica FakeDB: /api/latest reads land on the replica until its lag
+        passes REPLICA_MAX_LAG_SECONDS (or it can't be reached), then on the
+        primary without connecting to the replica again until the next check.
+        """
+        from api import _utils, _frozen, latest
+
+        _frozen.FROZEN_PATH = ""
+        primary_url, replica_url = "postgresql://bench@primary/gsr", "postgresql://bench@replica/gsr"
+        primary = FakeDB().seed_history(1000)
+        replica = FakeDB().seed_history(1000)
+        replica.gsr_daily = list(primary.gsr_daily)
+        dbs = {primary_url: primary, replica_url: replica}
+        opens = {primary_url: 0, replica_url: 0}
+        down = set()
+
+        def fake_open(url, timeout=10):
+            opens[url] += 1
+            if url in down:
+                raise OSError(f"connection refused: {url}")
+            return dbs[url].connect()
+        env = {"DATABASE_URL": primary_url, "DATABASE_REPLICA_URL": replica_url}
+        saved_env = {k: os.environ.get(k) for k in env}
+        saved_open = _utils._db_open
+        os.environ.update(env)
+        _utils._db_open = fake_open
+        latest.db_connect = _utils.db_connect
+        path = "/api/latest?limit=1000"
+        try:
+            _utils._REPLICA["checked"] = None
+            q0 = primary.queries
+            self._run("latest_routed_replica", lambda: call(latest.handler, "GET", path), _iters(1000, self.quick), replica)
+            if primary.queries != q0:
+                raise RuntimeError("latest_routed_replica: reads reached the primary")
+
+            replica.replica_lag = _utils.REPLICA_MAX_LAG_SECONDS * 4
+            _utils._REPLICA["checked"] = None
+            o0 = opens[replica_url]
+            self._run("latest_routed_replica_lagging", lambda: call(latest.handler, "GET", path),
+                      _iters(1000, self.quick), primary)
+            if opens[replica_url] - o0 > 1:  # the one lag check
+                raise RuntimeError("latest_routed_replica_lagging: kept connecting to the lagging replica")
+
+            replica.replica_lag = 0.0
+            down.add(replica_url)
+            _utils._REPLICA["checked"] = None
+            o0 = opens[replica_url]
+            self._run("latest_routed_replica_down", lambda: call(latest.handler, "GET", path),
+                      _iters(1000, self.quick), primary)
+            if opens[replica_url] - o0 > 1:
+                raise RuntimeError("latest_routed_replica_down: kept connecting to the unreachable replica")
+        finally:
+            _utils._db_open = saved_open
+            _utils._REPLICA.update({"checked": None, "fresh": True, "lag": None})
+            for k, v in saved_env.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+
+
+SCENARIOS = ("latest", "vault", "backfill", "upstream", "analytics", "backtest", "alerts", "routing")
+
+
+def _git_rev():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path: str, threshold: float):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        base = {r["name"]: r for r in json.load(f).get("results", [])}
+    regressions = []
+    for r in results:
+        b = base.get(r["name"])
+        if not b or not b.get("p50_ms") or r.get("p50_ms") is None:
+            continue
+        change = (r["p50_ms"] - b["p50_ms"]) / b["p50_ms"]
+        if change > threshold:
+            regressions.append({"name": r["name"], "baseline_p50_ms": b["p50_ms"], "p50_ms": r["p50_ms"], "change": round(change, 3)})
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Offline endpoint benchmarks")
+    ap.add_argument("--only", help="regex over scenario groups: " + ", ".join(SCENARIOS))
+    ap.add_argument("--quick", action="store_true", help="fewer iterations (smoke run)")
+    ap.add_argument("--out", default=os.path.join(RESULTS_DIR, "latest.json"))
+    ap.add_argument("--upstream-config", help="fault-injection JSON for the upstream simulator (see bench/stubs.py)")
+    ap.add_argument("--seed", type=int, default=None, help="seed for simulated latency/fault draws")
+    ap.add_argument("--compare", help="baseline results JSON")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed p50 slowdown (0.25 = 25%%)")
+    args = ap.parse_args(argv)
+
+    upstream_config = None
+    if args.upstream_config:
+        with open(args.upstream_config, "r", encoding="utf-8") as f:
+            upstream_config = json.load(f)
+
+    bench = Bench(quick=args.quick, upstream_config=upstream_config, seed=args.seed)
+    try:
+        for name in SCENARIOS:
+            if args.only and not re.search(args.only, name):
+                continue
+            getattr(bench, name)()
+    finally:
+        bench.close()
+
+    doc = {
+        "meta": {
+            "ts": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "git_rev": _git_rev(),
+            "quick": args.quick,
+            "upstream_config": upstream_config,
+        },
+        "results": bench.results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+    print(f"\nwrote {args.out}")
+
+    if args.compare:
+        regressions = compare(bench.results, args.compare, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['name']}: p50 {r['baseline_p50_ms']} -> {r['p50_ms']} ms (+{r['change']:.0%})", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Fan-out check for /api/stream: starts server.py's PooledHTTPServer on a
+local port against the upstream simulator, opens N SSE subscribers, moves
+the simulated gold price and asserts that
+
+  - every subscriber got one snapshot and then exactly one "quote" event,
+  - that event carries only the fields that changed,
+  - the upstream saw one GoldPrice call for the change, however large N is,
+  - the request workers were all released (N can exceed --workers).
+
+  python bench/stream.py                # N=200 subscribers, 4 workers
+  python bench/stream.py -n 1000 --workers 2
+
+Exits 1 on any failed check.
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+
+from bench import stubs as sim  # noqa: E402
+
+
+class Subscriber:
+    def __init__(self, port: int):
+        self.events = []
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout=10)
+        self.sock.sendall(b"GET /api/stream HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n")
+        self._buf = b""
+        self.status = None
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        try:
+            while True:
+                chunk = self.sock.recv(65536)
+                if not chunk:
+                    return
+                self._buf += chunk
+                if self.status is None and b"\r\n\r\n" in self._buf:
+                    head, self._buf = self._buf.split(b"\r\n\r\n", 1)
+                    self.status = int(head.split(b" ", 2)[1])
+                while self.status is not None and b"\n\n" in self._buf:
+                    block, self._buf = self._buf.split(b"\n\n", 1)
+                    ev = {}
+                    for line in block.decode("utf-8").split("\n"):
+                        key, _, val = line.partition(": ")
+                        if key in ("event", "data", "id"):
+                            ev[key] = val
+                    if "event" in ev:
+                        ev["data"] = json.loads(ev.get("data") or "{}")
+                        self.events.append(ev)
+        except OSError:
+            return
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def _wait(pred, timeout: float) -> bool:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if pred():
+            return True
+        time.sleep(0.01)
+    return pred()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="SSE fan-out check")
+    ap.add_argument("-n", type=int, default=200, help="subscribers")
+    ap.add_argument("--workers", type=int, default=4)
+    args = ap.parse_args(argv)
+
+    upstreams = sim.StubUpstreams().start()
+    os.environ.update(upstreams.env())
+    os.environ["METALPRICEAPI_KEY"] = "bench"
+    os.environ["STREAM_INTERVAL_SECONDS"] = "0.1"
+
+    import server
+    from api import spot
+    from api._stream import quote_hub
+
+    srv = server.make_server("127.0.0.1", 0, args.workers)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    port = srv.server_address[1]
+
+    failures = []
+    subs = []
+    try:
+        spot._CACHE.update({"ts": 0.0, "payload": None})
+        for _ in range(args.n):
+            subs.append(Subscriber(port))
+        if not _wait(lambda: all(s.events for s in subs), 15):
+            failures.append(f"only {sum(bool(s.events) for s in subs)}/{args.n} got a snapshot")
+
+        # Workers are free again: a plain request still goes through
+        probe = socket.create_connection(("127.0.0.1", port), timeout=5)
+        probe.sendall(b"GET /api/spot HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+        if not probe.recv(64).startswith(b"HTTP/1.1 200"):
+            failures.append("request workers still busy with streams")
+        probe.close()
+
+        before = upstreams.snapshot()["hits"].get("/dbXRates/USD", 0)
+        t0 = time.perf_counter()
+        sim.GOLD += 12.5
+        spot._CACHE["ts"] = 0.0  # quote TTL lapsed: next publisher poll refreshes upstream
+        ok = _wait(lambda: all(len(s.events) >= 2 for s in subs), 15)
+        fanout_ms = (time.perf_counter() - t0) * 1000.0
+        time.sleep(0.5)  # anything extra would show up now
+        calls = upstreams.snapshot()["hits"].get("/dbXRates/USD", 0) - before
+
+        if not ok:
+            failures.append(f"only {sum(len(s.events) >= 2 for s in subs)}/{args.n} got the update")
+        if calls != 1:
+            failures.append(f"expected 1 GoldPrice call for the change, saw {calls}")
+        extra = [s for s in subs if len(s.events) != 2]
+        if extra:
+            failures.append(f"{len(extra)} subscribers got {len(extra[0].events)} events, expected 2")
+        for s in subs[:1]:
+            if len(s.events) >= 2:
+                upd = s.events[1]
+                if upd["event"] != "quote" or set(upd["data"]) != {"gold_usd", "gsr", "fetched_at_utc"}:
+                    failures.append(f"update should carry only changed fields, got {upd}")
+
+        hub_stats = quote_hub().stats
+        print(f"subscribers {args.n}  workers {args.workers}  fan-out {fanout_ms:.1f} ms  "
+              f"upstream calls {calls}  hub {hub_stats}")
+    finally:
+        for s in subs:
+            s.close()
+        srv.shutdown()
+        srv.server_close()
+        upstreams.stop()
+
+    for f in failures:
+        print("FAIL:", f)
+    if not failures:
+        print("ok")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
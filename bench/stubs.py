@@ -0,0 +1,313 @@
+"""
+Local upstream simulator standing in for every upstream the API calls:
+
+  /dbXRates/USD            goldprice      items[0].xauPrice / xagPrice
+  /q/l/?s=<sym>&...        stooq          CSV quote (gc.f, si.f, pl.f, usdxpt)
+  /v7/finance/quote        yahoo          quoteResponse.result[]
+  /v1/latest               metalpriceapi  rates.USDXPT / XPT
+  /jwks                    jwks           Clerk JWKS (keys set via StubUpstreams.jwks)
+
+Each upstream has a scriptable behaviour (see DEFAULT_BEHAVIOR):
+
+  latency          {"dist": "fixed", "ms": 40}
+                   {"dist": "uniform", "lo": 20, "hi": 120}
+                   {"dist": "lognormal", "median": 60, "sigma": 0.5}
+  error_rate       fraction answered 500/502/503 with an HTML error page
+  html_rate        fraction answered 200 text/html (captcha / maintenance page)
+  rate_limit_rate  fraction rate-limited: 429 + Retry-After, or for Stooq its
+                   real 200 "Exceeded the daily hits limit" text
+  hang_rate        fraction that stall for hang_seconds before answering
+
+Point the endpoints at it with GOLDPRICE_BASE_URL / STOOQ_BASE_URL /
+YAHOO_BASE_URL / METALPRICEAPI_BASE_URL. Standalone:
+
+  python bench/stubs.py --port 8787 --config sim.json --seed 1
+
+At runtime, GET /__sim returns behaviours + hit counts and POST /__sim with
+{"stooq": {"error_rate": 0.2}} updates them.
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+GOLD = 2650.25
+SILVER = 31.4
+PLATINUM = 980.5
+
+STOOQ_CLOSE = {"gc.f": GOLD, "si.f": SILVER, "pl.f": PLATINUM, "usdxpt": 1.0 / PLATINUM}
+
+UPSTREAMS = ("goldprice", "stooq", "yahoo", "metalpriceapi", "jwks")
+
+ROUTES = {
+    "/dbXRates/USD": "goldprice",
+    "/q/l/": "stooq",
+    "/v7/finance/quote": "yahoo",
+    "/v1/latest": "metalpriceapi",
+    "/jwks": "jwks",
+}
+
+DEFAULT_BEHAVIOR = {
+    "latency": {"dist": "fixed", "ms": 0},
+    "error_rate": 0.0,
+    "html_rate": 0.0,
+    "rate_limit_rate": 0.0,
+    "retry_after": 60,
+    "hang_rate": 0.0,
+    "hang_seconds": 30.0,
+}
+
+HTML_ERROR_PAGE = (
+    "<!DOCTYPE html><html><head><title>{code} {reason}</title></head>"
+    "<body><h1>{reason}</h1><p>The server encountered a temporary error.</p></body></html>"
+)
+HTML_CAPTCHA_PAGE = (
+    "<!DOCTYPE html><html><head><title>Just a moment...</title></head>"
+    "<body><noscript>Please enable JavaScript and cookies to continue</noscript></body></html>"
+)
+
+
+def goldprice_body():
+    return {"ts": 0, "tsj": 0, "date": "", "items": [{"curr": "USD", "xauPrice": GOLD, "xagPrice": SILVER}]}
+
+
+def stooq_body(symbol: str):
+    close = STOOQ_CLOSE.get(symbol.lower())
+    close_s = "N/D" if close is None else f"{close:.6f}"
+    return (
+        "Symbol,Date,Time,Open,High,Low,Close\r\n"
+        f"{symbol.upper()},2025-01-02,22:00:00,{close_s},{close_s},{close_s},{close_s}\r\n"
+    )
+
+
+def yahoo_body():
+    return {"quoteResponse": {"result": [
+        {"symbol": "GC=F", "regularMarketPrice": GOLD},
+        {"symbol": "SI=F", "regularMarketPrice": SILVER},
+    ], "error": None}}
+
+
+def metalpriceapi_body():
+    return {"success": True, "base": "USD", "rates": {"USDXPT": PLATINUM, "XPT": 1.0 / PLATINUM}}
+
+
+def _latency_s(spec: dict, rng: random.Random) -> float:
+    dist = (spec or {}).get("dist", "fixed")
+    if dist == "uniform":
+        ms = rng.uniform(float(spec.get("lo", 0)), float(spec.get("hi", 0)))
+    elif dist == "lognormal":
+        median = float(spec.get("median", 0))
+        ms = 0.0 if median <= 0 else rng.lognormvariate(math.log(median), float(spec.get("sigma", 0.5)))
+    else:
+        ms = float(spec.get("ms", 0))
+    return max(0.0, ms) / 1000.0
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        u = urlparse(self.path)
+        stubs = self.server.stubs
+        if u.path == "/__sim":
+            return self._send(200, json.dumps(stubs.snapshot()), "application/json")
+
+        name = ROUTES.get(u.path)
+        with stubs.lock:
+            stubs.hits[u.path] = stubs.hits.get(u.path, 0) + 1
+        if name is None:
+            return self._send(404, "not found", "text/plain")
+
+        outcome, delay = stubs.decide(name)
+        if delay:
+            time.sleep(delay)
+
+        if outcome == "error":
+            code = stubs.choice((500, 502, 503))
+            reason = {500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable"}[code]
+            return self._send(code, HTML_ERROR_PAGE.format(code=code, reason=reason), "text/html")
+        if outcome == "html":
+            return self._send(200, HTML_CAPTCHA_PAGE, "text/html")
+        if outcome == "rate_limit":
+            if name == "stooq":
+                return self._send(200, "Exceeded the daily hits limit", "text/plain")
+            retry = str(int(stubs.behavior(name)["retry_after"]))
+            if name == "metalpriceapi":
+                body = json.dumps({"success": False, "error": {"statusCode": 429, "message": "Too many requests"}})
+                return self._send(429, body, "application/json", {"Retry-After": retry})
+            return self._send(429, "Too Many Requests", "text/plain", {"Retry-After": retry})
+
+        if name == "goldprice":
+            return self._send(200, json.dumps(goldprice_body()), "application/json")
+        if name == "stooq":
+            qs = parse_qs(u.query)
+            return self._send(200, stooq_body((qs.get("s", [""])[0] or "")), "text/csv")
+        if name == "yahoo":
+            return self._send(200, json.dumps(yahoo_body()), "application/json")
+        if name == "metalpriceapi":
+            return self._send(200, json.dumps(metalpriceapi_body()), "application/json")
+        return self._send(200, json.dumps({"keys": stubs.jwks}), "application/json")
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/__sim":
+            return self._send(404, "not found", "text/plain")
+        length = int(self.headers.get("Content-Length", "0") or "0")
+        try:
+            self.server.stubs.configure(json.loads(self.rfile.read(length) or b"{}"))
+        except (ValueError, TypeError) as e:
+            return self._send(400, json.dumps({"error": str(e)}), "application/json")
+        return self._send(200, json.dumps(self.server.stubs.snapshot()), "application/json")
+
+    def _send(self, status, text, ctype, extra_headers=None):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (extra_headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        return
+
+
+class StubUpstreams:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, config=None, seed=None):
+        self.hits = {}
+        self.outcomes = {}
+        self.jwks = []
+        self.lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._behavior = {name: dict(DEFAULT_BEHAVIOR) for name in UPSTREAMS}
+        if config:
+            self.configure(config)
+        self.server = ThreadingHTTPServer((host, port), _StubHandler)
+        self.server.daemon_threads = True
+        self.server.stubs = self
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self):
+        """
+        Base-URL overrides that point the price endpoints at this simulator.
+        """
+        return {
+            "GOLDPRICE_BASE_URL": self.base_url,
+            "STOOQ_BASE_URL": self.base_url,
+            "YAHOO_BASE_URL": self.base_url,
+            "METALPRICEAPI_BASE_URL": self.base_url,
+        }
+
+    def configure(self, config: dict):
+        """
+        config: {"<upstream>" | "*": {behaviour keys}}; "*" applies to all.
+        """
+        with self.lock:
+            for name, spec in (config or {}).items():
+                targets = UPSTREAMS if name == "*" else (name,)
+                for t in targets:
+                    if t not in self._behavior:
+                        raise ValueError(f"unknown upstream: {t}")
+                    unknown = set(spec) - set(DEFAULT_BEHAVIOR)
+                    if unknown:
+                        raise ValueError(f"unknown behaviour keys: {sorted(unknown)}")
+                    self._behavior[t].update(spec)
+        return self
+
+    def reset(self):
+        with self.lock:
+            self._behavior = {name: dict(DEFAULT_BEHAVIOR) for name in UPSTREAMS}
+            self.hits = {}
+            self.outcomes = {}
+        return self
+
+    def behavior(self, name: str) -> dict:
+        with self.lock:
+            return dict(self._behavior[name])
+
+    def choice(self, seq):
+        with self.lock:
+            return self._rng.choice(seq)
+
+    def decide(self, name: str):
+        """
+        Returns (outcome, delay_seconds) for one request; outcome is
+        "ok" | "error" | "html" | "rate_limit".
+        """
+        with self.lock:
+            b = self._behavior[name]
+            rng = self._rng
+            delay = _latency_s(b["latency"], rng)
+            if rng.random() < float(b["hang_rate"]):
+                delay += float(b["hang_seconds"])
+            r = rng.random()
+            outcome = "ok"
+            for key, label in (("error_rate", "error"), ("html_rate", "html"), ("rate_limit_rate", "rate_limit")):
+                p = float(b[key])
+                if r < p:
+                    outcome = label
+                    break
+                r -= p
+            per = self.outcomes.setdefault(name, {})
+            per[outcome] = per.get(outcome, 0) + 1
+        return outcome, delay
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "behavior": {k: dict(v) for k, v in self._behavior.items()},
+                "hits": dict(self.hits),
+                "outcomes": {k: dict(v) for k, v in self.outcomes.items()},
+            }
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def total_hits(self):
+        with self.lock:
+            return sum(self.hits.values())
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Local upstream simulator")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8787)
+    ap.add_argument("--config", help="JSON behaviour file ({\"stooq\": {\"error_rate\": 0.1}, ...})")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args(argv)
+
+    config = None
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+
+    stubs = StubUpstreams(args.host, args.port, config=config, seed=args.seed)
+    print(f"upstream simulator on {stubs.base_url}")
+    for k, v in stubs.env().items():
+        print(f"  export {k}={v}")
+    try:
+        stubs.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stubs.server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
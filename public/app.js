@@ -162,24 +162,52 @@ function filterByRange(history, range) {
 }
 
 function desiredLimitForRange(range) {
+  const interval = intervalForRange(range);
+  if (interval) return candleCount(range, interval); // limit counts candles
   if (range === "1M") return 3000;
   if (range === "3M") return 9000;
   if (range === "6M") return 18000;
   if (range === "1Y") return 30000;
-  if (range === "MAX") return 80000;
   return 5000;
 }
 
+// Long ranges plot OHLC closes from gsr_ohlc instead of every day: the
+// finest bucket that keeps the chart under MAX_CANDLES points (MAX, back to
+// 1793, is monthly). Ranges up to a decade stay daily.
+const FIRST_HISTORY_YEAR = 1793; // first row of data/xauusd.csv
+const MAX_CANDLES = 3000;
+const CANDLES_PER_YEAR = { "1w": 52.18, "1M": 12, "1y": 1 };
+
+function rangeYears(range) {
+  if (range === "MAX") return new Date().getUTCFullYear() - FIRST_HISTORY_YEAR + 1;
+  return { "1M": 1 / 12, "3M": 0.25, "6M": 0.5, "1Y": 1 }[range] ?? 0;
+}
+
+function candleCount(range, interval) {
+  // +1: the partial buckets at both ends of the span
+  return Math.ceil(rangeYears(range) * CANDLES_PER_YEAR[interval]) + 1;
+}
+
+function intervalForRange(range) {
+  if (rangeYears(range) <= 10) return null;
+  return Object.keys(CANDLES_PER_YEAR).find((i) => candleCount(range, i) <= MAX_CANDLES) || "1y";
+}
+
 function sortHistoryAsc(hist) {
   return (hist || []).slice().sort((a, b) => (String(a?.date || "") < String(b?.date || "") ? -1 : 1));
 }
 
 let FULL_HISTORY = [];
+let CANDLES = [];
 let CURRENT_RANGE = "1M";
 let CHART_GSR = null;
 let CHART_GOLD = null;
 let CHART_SILVER = null;
 
+function currentPoints() {
+  return intervalForRange(CURRENT_RANGE) ? CANDLES : filterByRange(FULL_HISTORY, CURRENT_RANGE);
+}
+
 function destroyCharts() {
   try { CHART_GSR?.destroy(); } catch {}
   try { CHART_GOLD?.destroy(); } catch {}
@@ -460,6 +488,7 @@ function setNoData(errMsg) {
   $("deltaPct").textContent = "—";
   $("rangeLabel").textContent = errMsg || "No data";
   FULL_HISTORY = [];
+  CANDLES = [];
   renderCharts([]);
 }
 
@@ -469,10 +498,11 @@ function setNoData(errMsg) {
  * - explicit no-store
  * - optional force=1 to trigger self-heal immediately
  */
-async function fetchLatest(limit, { force = false } = {}) {
+async function fetchLatest(limit, { force = false, interval = null } = {}) {
   const params = new URLSearchParams();
   params.set("limit", String(limit));
   if (force) params.set("force", "1");
+  if (interval) params.set("interval", interval);
   params.set("_t", String(Date.now()));
   const url = `/api/latest?${params.toString()}`;
 
@@ -498,7 +528,8 @@ async function load(forRange = CURRENT_RANGE, { force = false } = {}) {
 
   try {
     const want = desiredLimitForRange(forRange);
-    const data = await fetchLatest(want, { force });
+    const interval = intervalForRange(forRange);
+    const data = await fetchLatest(want, { force, interval });
 
     const latest = data.latest;
     $("gsr").textContent = fmtNum(latest.gsr, 4);
@@ -509,6 +540,12 @@ async function load(forRange = CURRENT_RANGE, { force = false } = {}) {
     $("utcDate").textContent = latest.date || "—";
     $("lastUpdatedHuman").textContent = latest.fetched_at_utc ? timeAgo(latest.fetched_at_utc) : "—";
 
+    if (interval) {
+      CANDLES = sortHistoryAsc(Array.isArray(data.history) ? data.history : []);
+      renderCharts(currentPoints());
+      return;
+    }
+
     FULL_HISTORY = sortHistoryAsc(Array.isArray(data.history) ? data.history : []);
 
     // Delta vs previous (small polish: consistent sign, avoid "+0.00", use ASCII "-")
@@ -531,7 +568,7 @@ async function load(forRange = CURRENT_RANGE, { force = false } = {}) {
       $("deltaPct").className = "";
     }
 
-    renderCharts(filterByRange(FULL_HISTORY, CURRENT_RANGE));
+    renderCharts(currentPoints());
   } catch (e) {
     setNoData(`Error: ${e?.message || e}`);
   } finally {
@@ -556,11 +593,11 @@ document.querySelectorAll(".segBtn").forEach((b) => {
   b.addEventListener("click", async () => {
     CURRENT_RANGE = b.dataset.range;
     setActiveRange(CURRENT_RANGE);
-    // For MAX we fetch bigger history; for others, reuse the already-fetched history
-    if (CURRENT_RANGE === "MAX") {
-      await load("MAX", { force: false });
+    // Candle ranges (MAX) fetch gsr_ohlc; other ranges reuse the already-fetched daily history
+    if (intervalForRange(CURRENT_RANGE)) {
+      await load(CURRENT_RANGE, { force: false });
     } else {
-      renderCharts(filterByRange(FULL_HISTORY, CURRENT_RANGE));
+      renderCharts(currentPoints());
     }
   });
 });
@@ -569,7 +606,7 @@ document.querySelectorAll(".segBtn").forEach((b) => {
   const el = $(id);
   if (!el) return;
   el.addEventListener("change", () => {
-    renderCharts(filterByRange(FULL_HISTORY, CURRENT_RANGE));
+    renderCharts(currentPoints());
   });
 });
 
@@ -589,6 +626,30 @@ setInterval(() => {
   load(CURRENT_RANGE, { force: false });
 }, 60 * 60 * 1000);
 
+// Live spot over SSE (/api/stream on the self-hosted server): only changed
+// fields arrive. Vercel answers 204, EventSource stops, and the hourly
+// load() above remains the only refresh.
+(function subscribeSpots() {
+  if (typeof EventSource !== "function" || !$("gsr")) return;
+  const es = new EventSource("/api/stream");
+  const apply = (ev) => {
+    let d;
+    try { d = JSON.parse(ev.data); } catch { return; }
+    if (d.gsr != null) $("gsr").textContent = fmtNum(d.gsr, 4);
+    if (d.gold_usd != null) $("gold").textContent = fmtUSD(d.gold_usd, 2);
+    if (d.silver_usd != null) $("silver").textContent = fmtUSD(d.silver_usd, 2);
+    if (d.fetched_at_utc) {
+      $("fetchedAt").textContent = d.fetched_at_utc;
+      $("lastUpdatedHuman").textContent = timeAgo(d.fetched_at_utc);
+    }
+  };
+  es.addEventListener("snapshot", apply);
+  es.addEventListener("quote", apply);
+  es.onerror = () => {
+    if (es.readyState === EventSource.CLOSED) es.close();
+  };
+})();
+
 // When user returns to the tab, refresh once (forced)
 document.addEventListener("visibilitychange", () => {
   if (!document.hidden) load(CURRENT_RANGE, { force: true });
@@ -0,0 +1,113 @@
+"""
+Ratio-swap backtests from the command line (same engine as /api/backtest).
+
+  python scripts/backtest.py                                  # gold -> silver at 80, back at 50, CSV history
+  python scripts/backtest.py --enter 60:100:2 --exit 30:60 --fee 0,0.5,1 --premium 0,2,4
+  python scripts/backtest.py --source db --from 2000-01-01 --top 3 --curve best.csv
+  python scripts/backtest.py --enter 80 --exit 50 --json > run.json
+
+Grid values are comma lists and/or start:stop[:step] ranges (stop included).
+--source csv (default) reads data/xauusd.csv + data/xagusd.csv; --source db
+reads gsr_daily and needs DATABASE_URL. Large grids run on a process pool
+(--workers, default: all cores). The grid size cap of the API does not apply.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from api import _backtest  # noqa: E402
+
+
+def expand(spec: str):
+    """
+    "60:70:5,80" -> [60.0, 65.0, 70.0, 80.0]
+    """
+    out = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if ":" in part:
+            bits = [float(b) for b in part.split(":")]
+            lo, hi, step = bits[0], bits[1], (bits[2] if len(bits) > 2 else 1.0)
+            if step <= 0:
+                raise argparse.ArgumentTypeError(f"bad step in {part!r}")
+            n = int(round((hi - lo) / step))
+            out.extend(round(lo + i * step, 10) for i in range(n + 1) if lo + i * step <= hi + 1e-9)
+        else:
+            out.append(float(part))
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="GSR swap-strategy backtester")
+    ap.add_argument("--source", choices=("csv", "db"), default="csv")
+    ap.add_argument("--enter", type=expand, default=[80.0], help="swap gold -> silver at gsr >= enter")
+    ap.add_argument("--exit", type=expand, default=[50.0], help="swap silver -> gold at gsr <= exit")
+    ap.add_argument("--fee", type=expand, default=[0.5], help="fee %% per swap")
+    ap.add_argument("--premium", type=expand, default=[2.0], help="premium / spread %% per swap")
+    ap.add_argument("--start", choices=_backtest.START_METALS, default="gold")
+    ap.add_argument("--from", dest="start_date")
+    ap.add_argument("--to", dest="end_date")
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--workers", type=int, help="process pool size (1 = inline)")
+    ap.add_argument("--curve", help="write the best run's equity curve to this CSV")
+    ap.add_argument("--json", action="store_true", help="print the full result as JSON")
+    args = ap.parse_args(argv)
+
+    if args.workers is not None:
+        _backtest.WORKERS = max(1, args.workers)
+        _backtest.PARALLEL_MIN_PAIRS = 2
+
+    if args.source == "db":
+        from api._utils import db_connect
+
+        conn = db_connect()
+        try:
+            series = _backtest.load_db(conn)
+        finally:
+            conn.close()
+    else:
+        series = _backtest.load_csv()
+
+    params = {
+        "enter": args.enter, "exit": args.exit, "fee_pct": args.fee, "premium_pct": args.premium,
+        "start": args.start, "from": args.start_date, "to": args.end_date, "top": args.top,
+    }
+    t0 = time.perf_counter()
+    try:
+        out = _backtest.run(series, params, max_runs=0)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    elapsed = time.perf_counter() - t0
+
+    if args.curve and out["top"]:
+        with open(args.curve, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=("date", "growth", "metal"))
+            w.writeheader()
+            w.writerows(out["top"][0]["equity"])
+
+    if args.json:
+        print(json.dumps(out, indent=2))
+        return 0
+
+    rng = out["range"]
+    print(f"{rng['from']} .. {rng['to']} ({rng['days']} days)  start {out['start']}  "
+          f"runs {out['runs']}  workers {out['workers']}  {elapsed:.2f} s  data {out['key']['data']}")
+    print(f"{'enter':>7} {'exit':>7} {'fee%':>6} {'prem%':>6} {'trades':>6} {'return%':>12} "
+          f"{'hold%':>10} {'oz x':>8} {'maxDD%':>7} {'gold%':>6}")
+    for r in out["top"]:
+        print(f"{r['enter']:>7g} {r['exit']:>7g} {r['fee_pct']:>6g} {r['premium_pct']:>6g} {r['trades']:>6} "
+              f"{r['return_pct']:>12.2f} {r['hold_return_pct']:>10.2f} {r['start_metal_oz']:>8.3f} "
+              f"{r['max_drawdown_pct']:>7.2f} {r['time_in_gold_pct']:>6.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
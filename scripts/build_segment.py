@@ -0,0 +1,120 @@
+"""
+Compile the frozen history segment (api/_frozen.py) shipped with the functions.
+
+  python scripts/build_segment.py                          # data/*.csv, rows older than 28 days
+  python scripts/build_segment.py --db                     # + gsr_daily (needs DATABASE_URL)
+  python scripts/build_segment.py --db --keep-on-error     # the Vercel build step (vercel.json)
+  python scripts/build_segment.py --export gsr_daily.csv   # + a DB export
+  python scripts/build_segment.py --cutoff 2025-12-01 --out /tmp/seg.bin
+  python scripts/build_segment.py --info                   # describe the current segment
+
+Rows come from data/xauusd.csv + data/xagusd.csv (dates present in both),
+overlaid by gsr_daily rows (--db, or an export with columns
+d,gold_usd,silver_usd,gsr such as
+  \\copy (select d, gold_usd, silver_usd, gsr from gsr_daily order by d) to 'gsr_daily.csv' csv header
+). Only days before --cutoff are frozen; /api/latest reads everything after
+the segment's last day from gsr_daily. vercel.json runs it with --db as the
+build command, so every deploy moves the cutoff forward and picks up
+corrections to old rows; --keep-on-error keeps the checked-in file (and the
+deploy going) when the DB cannot be read.
+"""
+import argparse
+import csv
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from api import _frozen  # noqa: E402
+from api.backfill_gsr import GOLD_CSV, SILVER_CSV, _read_close_map  # noqa: E402
+
+LAG_DAYS = 28
+
+
+def csv_rows():
+    gold = _read_close_map(GOLD_CSV)
+    silver = _read_close_map(SILVER_CSV)
+    out = {}
+    for d in set(gold) & set(silver):
+        if silver[d] > 0:
+            out[datetime.date.fromisoformat(d)] = (gold[d], silver[d], gold[d] / silver[d])
+    return out
+
+
+def export_rows(path: str):
+    out = {}
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            try:
+                d = datetime.date.fromisoformat((row.get("d") or "").strip()[:10])
+                out[d] = (float(row["gold_usd"]), float(row["silver_usd"]), float(row["gsr"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+    return out
+
+
+def db_rows(cutoff):
+    from api._utils import db_connect
+
+    conn = db_connect()
+    try:
+        cur = conn.cursor()
+        cur.execute("select d, gold_usd, silver_usd, gsr from gsr_daily where d < %s order by d asc;", (cutoff,))
+        return {r[0]: (r[1], r[2], r[3]) for r in cur.fetchall() or []}
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Build data/gsr_frozen.bin")
+    ap.add_argument("--out", default=_frozen.DEFAULT_PATH)
+    ap.add_argument("--cutoff", type=datetime.date.fromisoformat,
+                    help=f"freeze rows before this day (default: today - {LAG_DAYS} days)")
+    ap.add_argument("--db", action="store_true", help="overlay gsr_daily (DATABASE_URL)")
+    ap.add_argument("--export", action="append", default=[], help="overlay a gsr_daily CSV export")
+    ap.add_argument("--no-csv", action="store_true", help="skip data/*.csv")
+    ap.add_argument("--keep-on-error", action="store_true",
+                    help="if the DB read fails, keep the current segment and exit 0")
+    ap.add_argument("--info", action="store_true", help="describe the segment at --out and exit")
+    args = ap.parse_args(argv)
+
+    if args.info:
+        _frozen.FROZEN_PATH = args.out
+        seg = _frozen.segment()
+        if seg is None:
+            print(f"{args.out}: missing or invalid")
+            return 1
+        age = (datetime.datetime.now(datetime.timezone.utc).date() - seg.last_date).days if seg.n else None
+        print(f"{args.out}: {seg.info()}  {os.path.getsize(args.out)} bytes  {age} days old")
+        return 0
+
+    cutoff = args.cutoff or (datetime.datetime.now(datetime.timezone.utc).date() - datetime.timedelta(days=LAG_DAYS))
+    merged = {} if args.no_csv else csv_rows()
+    for path in args.export:
+        merged.update(export_rows(path))
+    if args.db:
+        try:
+            merged.update(db_rows(cutoff))
+        except Exception as e:
+            if not args.keep_on_error:
+                raise
+            print(f"gsr_daily not readable ({e}); keeping {args.out}", file=sys.stderr)
+            return 0
+
+    rows = [(d, *merged[d]) for d in sorted(merged) if d < cutoff]
+    if not rows:
+        print("no rows before the cutoff", file=sys.stderr)
+        return 1
+    data = _frozen.pack(rows, built_at=int(time.time()))
+    tmp = args.out + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, args.out)
+    print(f"{args.out}: {len(rows)} rows {rows[0][0]} .. {rows[-1][0]}  {len(data)} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,143 @@
+"""
+Cold-start import profiler for the api/ functions.
+
+  python scripts/import_budget.py                 # all endpoints, budgets from import_budget.json
+  python scripts/import_budget.py spot latest     # only these endpoints
+  python scripts/import_budget.py --top 15 --runs 5 --json
+
+Each endpoint module is imported in a fresh interpreter with `-X importtime`
+(what a Vercel cold start pays on top of the runtime itself). Reports the
+cumulative import cost per endpoint (median of --runs) plus the most
+expensive modules it pulled in, and exits 1 if any endpoint is over budget.
+
+Budgets live in scripts/import_budget.json:
+  {"default_ms": 150, "endpoints": {"create_checkout_session": 200}}
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+API_DIR = os.path.join(ROOT, "api")
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_budget.json")
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def endpoints():
+    # Vercel only deploys non-underscore files as functions
+    return sorted(
+        f[:-3]
+        for f in os.listdir(API_DIR)
+        if f.endswith(".py") and not f.startswith("_")
+    )
+
+
+def load_budgets(path: str):
+    if not os.path.exists(path):
+        return 150.0, {}
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    return float(cfg.get("default_ms", 150)), {k: float(v) for k, v in (cfg.get("endpoints") or {}).items()}
+
+
+def _importtime(code: str):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{code!r} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            yield int(m.group(1)), int(m.group(2)), len(m.group(3)), m.group(4)
+
+
+def startup_modules():
+    # Imported by the bare interpreter (site, .pth hooks); never charged to an endpoint
+    return {name for _, _, _, name in _importtime("pass")}
+
+
+def profile_once(module: str, baseline):
+    """
+    Returns (total_ms, {imported_module: (self_ms, cumulative_ms)}) for one cold import.
+    """
+    mods = {}
+    total_us = 0
+    for self_us, cum_us, indent, name in _importtime(f"import api.{module}"):
+        if name in baseline:
+            continue
+        mods[name] = (self_us / 1000.0, cum_us / 1000.0)
+        # Top-level entries (single leading space) are disjoint, so their sum is the total
+        if indent == 1:
+            total_us += cum_us
+    return total_us / 1000.0, mods
+
+
+def profile(module: str, runs: int, baseline):
+    totals = []
+    last = {}
+    for _ in range(max(1, runs)):
+        total, mods = profile_once(module, baseline)
+        totals.append(total)
+        last = mods
+    return statistics.median(totals), last
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Per-endpoint cold-start import cost")
+    ap.add_argument("modules", nargs="*", help="endpoint names (default: every api/*.py function)")
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--top", type=int, default=8, help="heaviest imported modules to list per endpoint")
+    ap.add_argument("--budget-file", default=BUDGET_FILE)
+    ap.add_argument("--json", action="store_true", help="machine-readable output")
+    args = ap.parse_args(argv)
+
+    default_ms, budgets = load_budgets(args.budget_file)
+    names = args.modules or endpoints()
+
+    baseline = startup_modules()
+
+    results = []
+    for name in names:
+        total, mods = profile(name, args.runs, baseline)
+        budget = budgets.get(name, default_ms)
+        heaviest = sorted(
+            ((m, c[1]) for m, c in mods.items() if not m.startswith("api")),
+            key=lambda x: x[1],
+            reverse=True,
+        )[: args.top]
+        results.append({
+            "endpoint": name,
+            "import_ms": round(total, 1),
+            "budget_ms": budget,
+            "over_budget": total > budget,
+            "heaviest": [{"module": m, "cumulative_ms": round(ms, 1)} for m, ms in heaviest],
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for r in results:
+            flag = "OVER" if r["over_budget"] else "ok"
+            print(f"{r['endpoint']:<26} {r['import_ms']:>8.1f} ms  (budget {r['budget_ms']:.0f} ms)  {flag}")
+            for h in r["heaviest"]:
+                print(f"    {h['module']:<40} {h['cumulative_ms']:>8.1f} ms")
+
+    over = [r["endpoint"] for r in results if r["over_budget"]]
+    if over:
+        print(f"\nOver budget: {', '.join(over)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Convert gsr_daily between the numeric layout (sql/schema.sql) and the compact
+one (sql/schema_compact.sql); see api/_schema.py.
+
+  python scripts/migrate_compact.py               # numeric -> compact
+  python scripts/migrate_compact.py --revert      # compact -> numeric
+  python scripts/migrate_compact.py --dry-run     # print the SQL, change nothing
+
+The conversion runs in one transaction under an ACCESS EXCLUSIVE lock on
+gsr_daily (the table is rewritten; a few tens of thousands of rows take well
+under a second). numeric -> double precision keeps ~15-17 significant digits,
+more than any stored price carries. The derived tables are dropped in the
+same transaction and rebuilt right after from the converted rows: gsr_ohlc
+(recreated in the new price type) and gsr_indicators. Writers pick the new
+layout up on their next write; no redeploy needed. Needs DATABASE_URL.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from api import _schema  # noqa: E402
+
+TO_COMPACT = [
+    "lock table gsr_daily in access exclusive mode;",
+    """
+    alter table gsr_daily
+      alter column gold_usd type double precision using gold_usd::double precision,
+      alter column silver_usd type double precision using silver_usd::double precision,
+      drop column gsr;
+    """,
+    "alter table gsr_daily add column gsr double precision generated always as (gold_usd / silver_usd) stored;",
+    "drop table if exists gsr_ohlc;",
+    "drop table if exists gsr_indicators;",
+]
+
+TO_NUMERIC = [
+    "lock table gsr_daily in access exclusive mode;",
+    "alter table gsr_daily drop column gsr;",
+    """
+    alter table gsr_daily
+      alter column gold_usd type numeric using gold_usd::numeric,
+      alter column silver_usd type numeric using silver_usd::numeric,
+      add column gsr numeric;
+    """,
+    "update gsr_daily set gsr = gold_usd / silver_usd;",
+    "alter table gsr_daily alter column gsr set not null;",
+    "drop table if exists gsr_ohlc;",
+    "drop table if exists gsr_indicators;",
+]
+
+
+def table_size(cur) -> int:
+    cur.execute("select pg_total_relation_size('gsr_daily');")
+    return int(cur.fetchone()[0])
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Convert gsr_daily to / from the compact layout")
+    ap.add_argument("--revert", action="store_true", help="compact -> numeric")
+    ap.add_argument("--dry-run", action="store_true", help="print the statements only")
+    args = ap.parse_args(argv)
+
+    target = _schema.NUMERIC if args.revert else _schema.COMPACT
+    steps = TO_NUMERIC if args.revert else TO_COMPACT
+    if args.dry_run:
+        for sql in steps:
+            print(" ".join(sql.split()))
+        return 0
+
+    from api._utils import db_connect
+    from api._indicators import update_indicators
+    from api._rollups import refresh_rollups
+
+    conn = db_connect()
+    try:
+        cur = conn.cursor()
+        current = _schema.layout(cur, max_age=0)
+        if current == target:
+            print(f"gsr_daily is already {target}")
+            return 0
+        before = table_size(cur)
+        try:
+            for sql in steps:
+                cur.execute(sql)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"migration failed, nothing changed: {e}", file=sys.stderr)
+            return 1
+        _schema.forget_layout()
+        cur.execute("analyze gsr_daily;")
+        conn.commit()
+        after = table_size(cur)
+        print(f"gsr_daily: {current} -> {target}  {before} -> {after} bytes")
+        print(f"gsr_ohlc rebuilt: {refresh_rollups(conn)}")
+        print(f"gsr_indicators rebuilt: {update_indicators(conn)}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,76 @@
+"""
+Export sampled request profiles (request_profiles table) as collapsed stacks.
+
+  python scripts/profile_dump.py --route /api/latest --limit 20 > latest.collapsed
+  flamegraph.pl latest.collapsed > latest.svg      # or drop the file into speedscope.app
+
+Stacks from all matching profiles are merged (counts summed), so the output
+is one flame graph per route over the selected requests.
+
+Needs DATABASE_URL.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from api._utils import db_connect  # noqa: E402
+
+
+def merge_collapsed(texts):
+    merged = {}
+    for text in texts:
+        for line in (text or "").splitlines():
+            stack, _, count = line.rpartition(" ")
+            if not stack:
+                continue
+            try:
+                merged[stack] = merged.get(stack, 0) + int(count)
+            except ValueError:
+                continue
+    return merged
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Merge stored request profiles into one collapsed-stack file")
+    ap.add_argument("--route", help="e.g. /api/latest (default: all routes)")
+    ap.add_argument("--limit", type=int, default=50, help="newest N profiles")
+    ap.add_argument("--forced-only", action="store_true", help="only X-Profile requests")
+    args = ap.parse_args(argv)
+
+    where = []
+    params = []
+    if args.route:
+        where.append("route = %s")
+        params.append(args.route)
+    if args.forced_only:
+        where.append("forced")
+    params.append(max(1, args.limit))
+
+    conn = db_connect()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            select collapsed from request_profiles
+            {('where ' + ' and '.join(where)) if where else ''}
+            order by ts desc
+            limit %s
+            """,
+            tuple(params),
+        )
+        rows = cur.fetchall() or []
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    for stack, count in sorted(merge_collapsed(r[0] for r in rows).items()):
+        sys.stdout.write(f"{stack} {count}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""
+Replay stored Stripe events or reconcile the users table against Stripe.
+
+  python scripts/stripe_reconcile.py reconcile [--dry-run] [--keep-missing]
+  python scripts/stripe_reconcile.py reconcile --stub subscriptions.json
+  python scripts/stripe_reconcile.py replay [--since 2025-01-01]
+
+reconcile pages through every Stripe subscription (customer expanded) and
+bulk-upserts one row per customer with the best active tier. Users that still
+hold a paid tier but have no active subscription are downgraded to free
+unless --keep-missing is given. --stub reads subscriptions from a local JSON
+file (a list, or a Stripe list object with "data") instead of calling Stripe.
+
+replay re-applies events already stored in stripe_events, oldest first.
+
+Needs DATABASE_URL (and STRIPE_SECRET_KEY unless --stub is used).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from api._utils import db_connect  # noqa: E402
+from api._auth import ensure_users_table  # noqa: E402
+from api._stripe_sync import (  # noqa: E402
+    TIER_RANK,
+    apply_changes,
+    change_from_event,
+    ensure_stripe_events_table,
+    subscription_change,
+)
+
+
+class StubStripe:
+    """
+    Minimal stand-in for the stripe module: Subscription.list with
+    limit/starting_after paging over a local list of subscription dicts.
+    """
+
+    def __init__(self, subscriptions):
+        self.Subscription = _StubSubscriptions(subscriptions)
+
+    @classmethod
+    def from_file(cls, path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get("data") or []
+        return cls(data)
+
+
+class _StubSubscriptions:
+    def __init__(self, subscriptions):
+        self._subs = list(subscriptions or [])
+
+    def list(self, limit=100, starting_after=None, **_):
+        start = 0
+        if starting_after:
+            ids = [s.get("id") for s in self._subs]
+            start = ids.index(starting_after) + 1 if starting_after in ids else len(ids)
+        page = self._subs[start:start + int(limit)]
+        return {"data": page, "has_more": (start + len(page)) < len(self._subs)}
+
+
+def iter_subscriptions(client, page_size: int = 100):
+    starting_after = None
+    while True:
+        kwargs = {"status": "all", "limit": page_size, "expand": ["data.customer"]}
+        if starting_after:
+            kwargs["starting_after"] = starting_after
+        page = client.Subscription.list(**kwargs)
+
+        data = page.get("data") or []
+        for sub in data:
+            yield sub
+
+        if not data or not page.get("has_more"):
+            return
+        starting_after = data[-1].get("id")
+
+
+def _best_by_customer(subscriptions, ts: int = 0):
+    best = {}
+    for sub in subscriptions:
+        ch = subscription_change(sub, ts=ts)
+        if not ch:
+            continue
+        prev = best.get(ch["key"])
+        if prev is None or TIER_RANK[ch["tier"]] > TIER_RANK[prev["tier"]]:
+            if prev and not ch["email"]:
+                ch = dict(ch, email=prev["email"])
+            best[ch["key"]] = ch
+        elif not prev["email"] and ch["email"]:
+            prev["email"] = ch["email"]
+    return list(best.values())
+
+
+def _chunks(items, n):
+    for i in range(0, len(items), n):
+        yield items[i:i + n]
+
+
+def reconcile(conn, client, batch_size: int, dry_run: bool, keep_missing: bool):
+    # Stamped with the listing time: this is Stripe's current state, so it
+    # wins over every event created before it (users.last_event_ts)
+    now = int(time.time())
+    changes = _best_by_customer(iter_subscriptions(client), ts=now)
+    paid_customers = [c["customer"] for c in changes if c["customer"] and c["tier"] != "free"]
+
+    written = 0
+    downgraded = 0
+    if not dry_run:
+        for chunk in _chunks(changes, batch_size):
+            written += apply_changes(conn, chunk)
+            conn.commit()
+
+        if not keep_missing:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                update users set
+                  tier = 'free',
+                  status = 'inactive',
+                  last_event_ts = %s,
+                  ent_version = ent_version + 1,
+                  updated_at = now()
+                where stripe_customer_id is not null
+                  and tier <> 'free'
+                  and last_event_ts <= %s
+                  and not (stripe_customer_id = any(%s))
+                """,
+                (now, now, paid_customers or [""]),
+            )
+            downgraded = cur.rowcount
+            conn.commit()
+
+    return {
+        "subscribed_customers": len(changes),
+        "paid_customers": len(paid_customers),
+        "users_written": written,
+        "downgraded": downgraded,
+        "dry_run": dry_run,
+    }
+
+
+def replay(conn, batch_size: int, since: str, dry_run: bool):
+    cur = conn.cursor()
+    where = "where created >= %s::date" if since else ""
+    cur.execute(
+        f"select id, payload from stripe_events {where} order by created asc, id asc",
+        (since,) if since else (),
+    )
+    rows = cur.fetchall() or []
+
+    written = 0
+    if not dry_run:
+        for chunk in _chunks(rows, batch_size):
+            changes = []
+            for _id, payload in chunk:
+                if isinstance(payload, str):
+                    payload = json.loads(payload)
+                changes.append(change_from_event(payload or {}))
+            written += apply_changes(conn, changes)
+            cur.execute(
+                "update stripe_events set applied_at = now() where id = any(%s)",
+                ([r[0] for r in chunk],),
+            )
+            conn.commit()
+
+    return {"events": len(rows), "users_written": written, "dry_run": dry_run}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("mode", choices=("reconcile", "replay"))
+    ap.add_argument("--batch-size", type=int, default=500)
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--keep-missing", action="store_true", help="reconcile: don't downgrade users without a subscription")
+    ap.add_argument("--stub", help="reconcile: read subscriptions from this JSON file instead of Stripe")
+    ap.add_argument("--since", help="replay: only events created on/after YYYY-MM-DD")
+    args = ap.parse_args(argv)
+
+    batch_size = max(1, args.batch_size)
+
+    conn = db_connect()
+    try:
+        ensure_users_table(conn)
+        ensure_stripe_events_table(conn)
+
+        if args.mode == "replay":
+            result = replay(conn, batch_size, args.since, args.dry_run)
+        else:
+            if args.stub:
+                client = StubStripe.from_file(args.stub)
+            else:
+                import stripe
+
+                stripe.api_key = os.environ["STRIPE_SECRET_KEY"].strip()
+                client = stripe
+            result = reconcile(conn, client, batch_size, args.dry_run, args.keep_missing)
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+Self-hosted runtime: every /api/* handler plus the static site in one
+long-lived process.
+
+  python server.py [--host 0.0.0.0] [--port 8000] [--workers 16]
+
+- Requests are served by a bounded worker pool (HTTP/1.1 keep-alive).
+- /api/<route> runs the same handler classes Vercel runs (via api/router.py),
+  so module caches stay warm and DB connections are pooled across requests.
+- Everything else is served from public/ with the same rewrites as vercel.json.
+- /api/stream (Server-Sent Events) connections are detached from the pool
+  and fed by one publisher thread (api/_stream.py).
+- SIGTERM/SIGINT stop accepting connections, let in-flight requests finish,
+  then close open streams and pooled DB connections.
+
+Env: PORT, HOST, WEB_CONCURRENCY (workers), DB_POOL_SIZE (defaults to workers),
+KEEPALIVE_SECONDS (idle keep-alive timeout, default 5), STREAM_INTERVAL_SECONDS,
+STREAM_HEARTBEAT_SECONDS, STREAM_MAX_SUBSCRIBERS.
+"""
+import argparse
+import mimetypes
+import os
+import signal
+import sys
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlparse, unquote
+
+from api import router
+from api._utils import enable_db_pool, close_db_pool
+from api._stream import close_hub
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_DIR = os.path.join(ROOT, "public")
+
+# Mirrors the page rewrites in vercel.json
+PAGE_PREFIXES = ("pro", "elite", "melt", "vault")
+
+
+def _static_file(path: str):
+    """
+    Maps a URL path to a file under public/, falling back to index.html like Vercel does.
+    """
+    rel = unquote(urlparse(path).path).lstrip("/")
+    first = rel.split("/", 1)[0]
+
+    if first in PAGE_PREFIXES and not os.path.isfile(os.path.join(PUBLIC_DIR, rel)):
+        rel = f"{first}/index.html"
+
+    full = os.path.realpath(os.path.join(PUBLIC_DIR, rel))
+    if os.path.isdir(full):
+        full = os.path.join(full, "index.html")
+
+    # Never serve anything outside public/
+    if not full.startswith(os.path.realpath(PUBLIC_DIR) + os.sep) or not os.path.isfile(full):
+        full = os.path.join(PUBLIC_DIR, "index.html")
+    return full
+
+
+class SelfHostHandler(router.handler):
+    protocol_version = "HTTP/1.1"
+    timeout = float(os.getenv("KEEPALIVE_SECONDS", "5") or "5")
+    # Headers and body go out in separate writes; without TCP_NODELAY a
+    # keep-alive client waits ~40 ms on delayed ACK for the body.
+    disable_nagle_algorithm = True
+
+    def _is_api(self):
+        return urlparse(self.path).path.startswith("/api/")
+
+    def do_GET(self):
+        if self._is_api():
+            return self._dispatch("GET")
+        return self._send_static(head=False)
+
+    def do_HEAD(self):
+        if self._is_api():
+            return self._dispatch("HEAD")
+        return self._send_static(head=True)
+
+    def _send_static(self, head: bool):
+        full = _static_file(self.path)
+        try:
+            with open(full, "rb") as f:
+                body = f.read()
+        except Exception:
+            self.send_error(404)
+            return
+
+        ctype = mimetypes.guess_type(full)[0] or "application/octet-stream"
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        if full.endswith("sw.js"):
+            self.send_header("Cache-Control", "no-cache, no-store, must-revalidate, max-age=0")
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+
+class PooledHTTPServer(ThreadingHTTPServer):
+    """
+    ThreadingHTTPServer with a fixed-size worker pool instead of a thread per connection.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, handler_cls, workers: int):
+        super().__init__(address, handler_cls)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="api")
+        self._detached = weakref.WeakSet()
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self.process_request_thread, request, client_address)
+
+    def detach(self, request):
+        """
+        Hands a connection over to its new owner (the /api/stream hub): the
+        worker returns without shutting the socket down.
+        """
+        self._detached.add(request)
+
+    def shutdown_request(self, request):
+        if request in self._detached:
+            self._detached.discard(request)
+            return
+        super().shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        close_hub()
+        # Let in-flight requests finish; idle keep-alive sockets time out after KEEPALIVE_SECONDS
+        self._pool.shutdown(wait=True)
+
+
+def make_server(host: str, port: int, workers: int):
+    enable_db_pool(int(os.getenv("DB_POOL_SIZE", str(workers)) or workers))
+    return PooledHTTPServer((host, port), SelfHostHandler, workers)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Serve the API and static site from one process")
+    ap.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000") or "8000"))
+    ap.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "16") or "16"))
+    args = ap.parse_args(argv)
+
+    server = make_server(args.host, args.port, args.workers)
+
+    def _stop(signum, _frame):
+        # shutdown() blocks until serve_forever returns, so call it off the main thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers", file=sys.stderr)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        close_db_pool()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,14 @@
+-- Compact gsr_daily layout (api/_schema.py): 8-byte float prices instead of
+-- numeric, and gsr computed by Postgres. Use instead of the gsr_daily table
+-- in README step 1, or convert an existing table with
+-- scripts/migrate_compact.py.
+create table if not exists gsr_daily (
+  d date primary key,
+  gold_usd double precision not null,
+  silver_usd double precision not null,
+  fetched_at_utc timestamptz not null default now(),
+  source text not null default 'gold-api.com',
+  gsr double precision generated always as (gold_usd / silver_usd) stored
+);
+
+create index if not exists gsr_daily_fetched_at_idx on gsr_daily (fetched_at_utc desc);